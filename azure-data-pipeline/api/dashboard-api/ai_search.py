@@ -5,19 +5,29 @@ Azure AI Searchを使用したデータ検索・分析機能
 
 import os
 import json
+import math
 import logging
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Iterator, List, Optional, Tuple, Callable
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
 from azure.search.documents import SearchClient
 from azure.search.documents.indexes import SearchIndexClient
-from azure.search.documents.indexes.models import (
-    SearchIndex,
-    SimpleField,
-    SearchableField,
-    SearchFieldDataType
-)
 from azure.core.credentials import AzureKeyCredential
-from azure.core.exceptions import AzureError
+from azure.core.exceptions import AzureError, ResourceNotFoundError
+
+from local_search import LocalSearchClient
+from search_cache import MISSING, SearchResultCache, search_cache_key
+from search_indexer import SearchBatchIndexer
+from search_schema import SearchReindexJob, build_index, to_document, versioned_index_name
+from search_pagination import (
+    MAX_SEARCH_PAGE_SIZE,
+    MAX_SEARCH_SKIP,
+    TIEBREAKER_FIELD,
+    odata_literal,
+    seek_field,
+    encode_search_token,
+    decode_search_token
+)
 
 logger = logging.getLogger(__name__)
 
@@ -29,31 +39,73 @@ class AISearchManager:
     """初期化"""
     self.search_service_name = os.getenv('SEARCH_SERVICE_NAME')
     self.search_service_key = os.getenv('SEARCH_SERVICE_KEY')
-    self.search_index_name = os.getenv('SEARCH_INDEX_NAME', 'sensor-data-index')
+    self.base_index_name = os.getenv('SEARCH_INDEX_NAME', 'sensor-data-index')
+
+    # インデックスのスキーマバージョン（2以降は {SEARCH_INDEX_NAME}-v{バージョン} のインデックスを使用）
+    self.schema_version = int(os.getenv('SEARCH_SCHEMA_VERSION', 1))
+    self.search_index_name = versioned_index_name(self.base_index_name, self.schema_version)
+
+    # 検索バックエンド（azure: Azure AI Search、local: SQLiteによるローカル検索）
+    self.backend = os.getenv('SEARCH_BACKEND', 'azure').lower()
+
+    if self.backend == 'local':
+      # SearchClient互換のローカル検索（オフラインの負荷試験・エッジ環境用）
+      self.search_client = LocalSearchClient(os.getenv('SEARCH_LOCAL_PATH', 'search-index.db'), self.schema_version)
+      self.index_client = None
+    else:
+      self.endpoint = f"https://{self.search_service_name}.search.windows.net"
+      self.credential = AzureKeyCredential(self.search_service_key)
+
+      self.search_client = SearchClient(
+          endpoint=self.endpoint,
+          index_name=self.search_index_name,
+          credential=self.credential
+      )
 
-    self.endpoint = f"https://{self.search_service_name}.search.windows.net"
-    self.credential = AzureKeyCredential(self.search_service_key)
+      self.index_client = SearchIndexClient(
+          endpoint=self.endpoint,
+          credential=self.credential
+      )
 
-    self.search_client = SearchClient(
-        endpoint=self.endpoint,
-        index_name=self.search_index_name,
-        credential=self.credential
-    )
+    # IDでソートしてシークの同順位を一意にできるか（ローカル検索とスキーマバージョン2以降）
+    self.sortable_key = self.index_client is None or self.schema_version >= 2
 
-    self.index_client = SearchIndexClient(
-        endpoint=self.endpoint,
-        credential=self.credential
+    # 最後に開始したインデックスの移行
+    self.migration: Optional[SearchReindexJob] = None
+    self._migration_indexes: Dict[str, str] = {}
+
+    # 統計情報の平均を求めるファセットの値の種類数（これを超える場合は概算になる）
+    self.stats_facet_count = int(os.getenv('SEARCH_STATS_FACET_COUNT', 1000))
+
+    # 同じ条件の検索・ファセットの結果をキャッシュする（インデックス更新時に無効化）
+    self.search_cache = SearchResultCache(
+        max_entries=int(os.getenv('SEARCH_CACHE_MAX_ENTRIES', 1024)),
+        ttl=float(os.getenv('SEARCH_CACHE_TTL', 30))
     )
 
+    # ドキュメントをバッファし、件数・サイズ・時間の閾値でまとめて登録する
+    self.batch_indexer = None
+    if os.getenv('SEARCH_BATCH_INDEXING', 'true').lower() == 'true':
+      self.batch_indexer = SearchBatchIndexer(
+          self.search_client,
+          max_documents=int(os.getenv('SEARCH_BATCH_MAX_DOCUMENTS', 1000)),
+          max_bytes=int(os.getenv('SEARCH_BATCH_MAX_BYTES', 8 * 1024 * 1024)),
+          flush_interval=float(os.getenv('SEARCH_BATCH_FLUSH_INTERVAL', 5)),
+          max_retries=int(os.getenv('SEARCH_BATCH_MAX_RETRIES', 3)),
+          on_flush=lambda result: self.search_cache.invalidate()
+      )
+
   def upload_document(self, document: Dict[str, Any]) -> bool:
     """
     ドキュメントをAI Searchにアップロード
 
+    バッチ登録が有効な場合はバッファに追加し、閾値に達した時点でまとめて登録する。
+
     Args:
         document: アップロードするドキュメント
 
     Returns:
-        bool: 成功時True
+        bool: 成功時True（バッチ登録時はバッファに追加した時点でTrue）
     """
     try:
       # ドキュメントにメタデータを追加
@@ -69,8 +121,15 @@ class AISearchManager:
           "content": json.dumps(document.get("data", {}), ensure_ascii=False),
           "uploaded_at": datetime.utcnow().isoformat()
       }
+      document_with_metadata = to_document(document_with_metadata, self.schema_version)
+
+      if self.batch_indexer:
+        # バッファに追加し、merge_or_uploadでまとめて登録する
+        self.batch_indexer.append(document_with_metadata)
+        return True
 
-      self.search_client.upload_documents([document_with_metadata])
+      self.search_client.merge_or_upload_documents([document_with_metadata])
+      self.search_cache.invalidate()
       logger.info(f"ドキュメントをアップロードしました: {document_with_metadata['id']}")
       return True
 
@@ -78,8 +137,27 @@ class AISearchManager:
       logger.error(f"AI Searchアップロードエラー: {e}")
       return False
 
+  def flush(self) -> Dict[str, int]:
+    """
+    バッファ中のドキュメントを登録
+
+    Returns:
+        Dict[str, int]: 成功件数・失敗件数・再送待ちの件数
+    """
+    if not self.batch_indexer:
+      return {"succeeded": 0, "failed": 0, "requeued": 0}
+    return self.batch_indexer.flush()
+
+  def close(self):
+    """バッファ中のドキュメントを登録して終了"""
+    if self.batch_indexer:
+      self.batch_indexer.close()
+    if self.backend == 'local':
+      self.search_client.close()
+
   def search_documents(self, search_text: str = "", filters: Optional[str] = None,
-                       order_by: Optional[List[str]] = None, top: int = 50) -> List[Dict[str, Any]]:
+                       order_by: Optional[List[str]] = None, top: int = 50,
+                       select: Optional[List[str]] = None) -> List[Dict[str, Any]]:
     """
     ドキュメントを検索
 
@@ -88,15 +166,24 @@ class AISearchManager:
         filters: フィルター条件
         order_by: ソート条件
         top: 取得件数
+        select: 取得するフィールド（未指定時は全フィールド）
 
     Returns:
         List[Dict[str, Any]]: 検索結果
     """
+    cache_key = search_cache_key("search", search_text, filters, order_by, top, select)
+    # 検索中に無効化された場合に古い結果をキャッシュしないよう、実行前の世代を記録する
+    generation = self.search_cache.generation
+    results = self.search_cache.get(cache_key)
+    if results is not MISSING:
+      return results
+
     try:
       search_results = self.search_client.search(
           search_text=search_text,
           filter=filters,
           order_by=order_by,
+          select=select,
           top=top,
           include_total_count=True
       )
@@ -106,12 +193,236 @@ class AISearchManager:
         results.append(dict(result))
 
       logger.info(f"検索結果: {len(results)}件")
+      self.search_cache.put(cache_key, results, generation)
       return results
 
     except AzureError as e:
       logger.error(f"AI Search検索エラー: {e}")
       return []
 
+  def search_page(self, search_text: str = "", filters: Optional[str] = None, order_by: Optional[List[str]] = None,
+                  select: Optional[List[str]] = None, limit: int = 50, continuation_token: Optional[str] = None,
+                  use_cache: bool = True) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    ドキュメントを1ページ分検索
+
+    ソート条件が1つのソート可能なフィールドで、IDがソート可能なスキーマの場合は、
+    前のページの最後の (値, ID) からシークするためスキップ件数の上限によらず何ページでも取得できる。
+    それ以外はスキップ件数でページングする。
+
+    Args:
+        search_text: 検索テキスト
+        filters: フィルター条件
+        order_by: ソート条件
+        select: 取得するフィールド（未指定時は全フィールド）
+        limit: 1ページの件数（最大1000）
+        continuation_token: 前のページで返された継続トークン
+        use_cache: 検索結果キャッシュを使用する
+
+    Returns:
+        Tuple[List[Dict[str, Any]], Optional[str]]: 検索結果と次のページの継続トークン（最終ページの場合None）
+
+    Raises:
+        ValueError: 不正な継続トークンの場合
+    """
+    limit = max(1, min(limit, MAX_SEARCH_PAGE_SIZE))
+    cache_key = search_cache_key("page", search_text, filters, order_by, limit, select, token=continuation_token)
+    generation = self.search_cache.generation
+    if use_cache:
+      page = self.search_cache.get(cache_key)
+      if page is not MISSING:
+        return page
+
+    try:
+      page = self._search_page(search_text, filters, order_by, select, limit, continuation_token)
+    except AzureError as e:
+      logger.error(f"AI Search検索エラー: {e}")
+      return [], None
+
+    if use_cache:
+      self.search_cache.put(cache_key, page, generation)
+    return page
+
+  def iter_documents(self, search_text: str = "", filters: Optional[str] = None, order_by: Optional[List[str]] = None,
+                     select: Optional[List[str]] = None, page_size: int = MAX_SEARCH_PAGE_SIZE) -> Iterator[Dict[str, Any]]:
+    """
+    検索結果を1件ずつ返す（ページ単位で取得するため、件数によらずメモリ使用量は一定）
+
+    Args:
+        search_text: 検索テキスト
+        filters: フィルター条件
+        order_by: ソート条件
+        select: 取得するフィールド（未指定時は全フィールド）
+        page_size: 1回の検索で取得する件数
+
+    Yields:
+        Dict[str, Any]: 検索結果
+
+    Raises:
+        AzureError: 検索に失敗した場合（途中で終わった結果を全件と区別できるよう送出する）
+        ValueError: スキップ件数でページングする条件で上限を超えた場合
+    """
+    continuation_token = None
+    while True:
+      # 全件の走査でキャッシュを追い出さないよう、キャッシュは使用しない
+      results, continuation_token = self._search_page(search_text, filters, order_by, select, page_size,
+                                                      continuation_token)
+      yield from results
+      if not continuation_token:
+        break
+
+  def _search_page(self, search_text: str, filters: Optional[str], order_by: Optional[List[str]],
+                   select: Optional[List[str]], limit: int,
+                   continuation_token: Optional[str]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """1ページ分を検索（検索エラーはそのまま送出する）"""
+    limit = max(1, min(limit, MAX_SEARCH_PAGE_SIZE))
+    position = decode_search_token(continuation_token)
+    seek = seek_field(order_by) if self.sortable_key else None
+
+    if position and ("o" in position) == bool(seek):
+      raise ValueError("継続トークンが検索条件と一致しません")
+
+    if seek:
+      return self._seek_page(search_text, filters, order_by, select, limit, position, *seek)
+    return self._offset_page(search_text, filters, order_by, select, limit, position)
+
+  def _seek_page(self, search_text: str, filters: Optional[str], order_by: List[str], select: Optional[List[str]],
+                 limit: int, position: Optional[Dict[str, Any]], field_name: str,
+                 descending: bool) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """前のページの最後の (値, ID) より後を検索（同じ値のドキュメントはIDの順で一意に並べる）"""
+    conditions = [f"({filters})"] if filters else []
+    if position:
+      conditions.append(self._seek_condition(field_name, descending, position["v"], position["k"]))
+
+    # 次の位置を求めるためソートキーとIDは常に取得する
+    query_select = select
+    if select:
+      query_select = select + [name for name in (field_name, TIEBREAKER_FIELD) if name not in select]
+
+    results = [dict(result) for result in self.search_client.search(
+        search_text=search_text,
+        filter=" and ".join(conditions) or None,
+        order_by=order_by + [f"{TIEBREAKER_FIELD} {'desc' if descending else 'asc'}"],
+        select=query_select,
+        top=limit + 1
+    )]
+
+    has_more = len(results) > limit
+    results = results[:limit]
+
+    next_token = None
+    if has_more and results:
+      next_token = encode_search_token({"v": results[-1].get(field_name), "k": results[-1][TIEBREAKER_FIELD]})
+
+    if query_select is not select:
+      for result in results:
+        for name in query_select[len(select):]:
+          result.pop(name, None)
+
+    return results, next_token
+
+  @staticmethod
+  def _seek_condition(field_name: str, descending: bool, value: Any, key: str) -> str:
+    """(値, ID) の組で位置より後のドキュメントを選ぶフィルター（nullは昇順で先頭、降順で末尾）"""
+    operator = "lt" if descending else "gt"
+    after_key = f"{TIEBREAKER_FIELD} {operator} {odata_literal(TIEBREAKER_FIELD, key)}"
+
+    if value is None:
+      if descending:
+        return f"({field_name} eq null and {after_key})"
+      return f"({field_name} ne null or {after_key})"
+
+    literal = odata_literal(field_name, value)
+    condition = f"({field_name} {operator} {literal} or ({field_name} eq {literal} and {after_key}))"
+    if descending:
+      # 降順ではnullの値は最後に並ぶ
+      condition = f"({condition} or {field_name} eq null)"
+    return condition
+
+  def _offset_page(self, search_text: str, filters: Optional[str], order_by: Optional[List[str]],
+                   select: Optional[List[str]], limit: int,
+                   position: Optional[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """スキップ件数で1ページ分を検索"""
+    offset = position["o"] if position else 0
+    if offset > MAX_SEARCH_SKIP:
+      raise ValueError(f"{MAX_SEARCH_SKIP}件を超える位置はtimestamp等のソート条件を指定して取得してください")
+
+    results = [dict(result) for result in self.search_client.search(
+        search_text=search_text,
+        filter=filters,
+        order_by=order_by,
+        select=select,
+        skip=offset,
+        top=limit + 1
+    )]
+
+    has_more = len(results) > limit
+    results = results[:limit]
+    return results, encode_search_token({"o": offset + limit}) if has_more else None
+
+  @staticmethod
+  def device_query(device_id: str, start_time: Optional[str] = None, end_time: Optional[str] = None) -> Dict[str, Any]:
+    """
+    デバイスIDで検索する条件を取得
+
+    Args:
+        device_id: デバイスID
+        start_time: 開始時刻
+        end_time: 終了時刻
+
+    Returns:
+        Dict[str, Any]: フィルター条件とソート条件
+    """
+    filter_conditions = [f"deviceId eq {odata_literal('deviceId', device_id)}"]
+
+    if start_time:
+      filter_conditions.append(f"timestamp ge {start_time}")
+    if end_time:
+      filter_conditions.append(f"timestamp le {end_time}")
+
+    return {"filters": " and ".join(filter_conditions), "order_by": ["timestamp desc"]}
+
+  @staticmethod
+  def device_type_query(device_type: str) -> Dict[str, Any]:
+    """
+    デバイスタイプで検索する条件を取得
+
+    Args:
+        device_type: デバイスタイプ
+
+    Returns:
+        Dict[str, Any]: フィルター条件とソート条件
+    """
+    return {"filters": f"deviceType eq {odata_literal('deviceType', device_type)}", "order_by": ["timestamp desc"]}
+
+  @staticmethod
+  def temperature_range_query(min_temp: float, max_temp: float) -> Dict[str, Any]:
+    """
+    温度範囲で検索する条件を取得
+
+    Args:
+        min_temp: 最小温度
+        max_temp: 最大温度
+
+    Returns:
+        Dict[str, Any]: フィルター条件とソート条件
+    """
+    return {"filters": f"temperature ge {min_temp} and temperature le {max_temp}", "order_by": ["temperature desc"]}
+
+  @staticmethod
+  def person_count_query(min_count: int, max_count: int) -> Dict[str, Any]:
+    """
+    人数範囲で検索する条件を取得
+
+    Args:
+        min_count: 最小人数
+        max_count: 最大人数
+
+    Returns:
+        Dict[str, Any]: フィルター条件とソート条件
+    """
+    return {"filters": f"personCount ge {min_count} and personCount le {max_count}", "order_by": ["personCount desc"]}
+
   def search_by_device(self, device_id: str, start_time: Optional[str] = None,
                        end_time: Optional[str] = None) -> List[Dict[str, Any]]:
     """
@@ -126,20 +437,7 @@ class AISearchManager:
         List[Dict[str, Any]]: 検索結果
     """
     try:
-      # フィルター条件を構築
-      filter_conditions = [f"deviceId eq '{device_id}'"]
-
-      if start_time:
-        filter_conditions.append(f"timestamp ge {start_time}")
-      if end_time:
-        filter_conditions.append(f"timestamp le {end_time}")
-
-      filter_string = " and ".join(filter_conditions)
-
-      return self.search_documents(
-          filters=filter_string,
-          order_by=["timestamp desc"]
-      )
+      return self.search_documents(**self.device_query(device_id, start_time, end_time))
 
     except Exception as e:
       logger.error(f"デバイス検索エラー: {e}")
@@ -156,10 +454,7 @@ class AISearchManager:
         List[Dict[str, Any]]: 検索結果
     """
     try:
-      return self.search_documents(
-          filters=f"deviceType eq '{device_type}'",
-          order_by=["timestamp desc"]
-      )
+      return self.search_documents(**self.device_type_query(device_type))
 
     except Exception as e:
       logger.error(f"デバイスタイプ検索エラー: {e}")
@@ -177,10 +472,7 @@ class AISearchManager:
         List[Dict[str, Any]]: 検索結果
     """
     try:
-      return self.search_documents(
-          filters=f"temperature ge {min_temp} and temperature le {max_temp}",
-          order_by=["temperature desc"]
-      )
+      return self.search_documents(**self.temperature_range_query(min_temp, max_temp))
 
     except Exception as e:
       logger.error(f"温度範囲検索エラー: {e}")
@@ -198,10 +490,7 @@ class AISearchManager:
         List[Dict[str, Any]]: 検索結果
     """
     try:
-      return self.search_documents(
-          filters=f"personCount ge {min_count} and personCount le {max_count}",
-          order_by=["personCount desc"]
-      )
+      return self.search_documents(**self.person_count_query(min_count, max_count))
 
     except Exception as e:
       logger.error(f"人数範囲検索エラー: {e}")
@@ -218,6 +507,12 @@ class AISearchManager:
     Returns:
         List[Dict[str, Any]]: ファセット結果
     """
+    cache_key = search_cache_key("facets", facets=field_name, count=count)
+    generation = self.search_cache.generation
+    facets = self.search_cache.get(cache_key)
+    if facets is not MISSING:
+      return facets
+
     try:
       search_results = self.search_client.search(
           search_text="*",
@@ -225,12 +520,8 @@ class AISearchManager:
           top=0
       )
 
-      facets = []
-      for result in search_results.get_facets():
-        if field_name in result:
-          facets = result[field_name]
-          break
-
+      facets = (search_results.get_facets() or {}).get(field_name, [])
+      self.search_cache.put(cache_key, facets, generation)
       return facets
 
     except AzureError as e:
@@ -241,43 +532,140 @@ class AISearchManager:
     """
     統計情報を取得
 
+    ドキュメントはダウンロードせず、件数・ファセット・top=1のソート検索を並行に実行して
+    インデックス全体の統計を求める（問い合わせ回数はインデックスの件数によらず一定）。
+
     Returns:
         Dict[str, Any]: 統計情報
     """
-    try:
-      # デバイスタイプ別の統計
-      device_types = self.get_facets("deviceType")
-
-      # 温度の統計
-      temp_results = self.search_documents("*", top=1000)
-      temperatures = [r.get("temperature", 0) for r in temp_results if r.get("temperature")]
-
-      # 人数の統計
-      person_counts = [r.get("personCount", 0) for r in temp_results if r.get("personCount")]
-
-      stats = {
-          "device_types": device_types,
-          "temperature": {
-              "count": len(temperatures),
-              "average": sum(temperatures) / len(temperatures) if temperatures else 0,
-              "min": min(temperatures) if temperatures else 0,
-              "max": max(temperatures) if temperatures else 0
-          },
-          "person_count": {
-              "count": len(person_counts),
-              "average": sum(person_counts) / len(person_counts) if person_counts else 0,
-              "min": min(person_counts) if person_counts else 0,
-              "max": max(person_counts) if person_counts else 0
-          },
-          "total_documents": len(temp_results)
-      }
+    cache_key = search_cache_key("statistics")
+    generation = self.search_cache.generation
+    stats = self.search_cache.get(cache_key)
+    if stats is not MISSING:
+      return stats
 
+    try:
+      with ThreadPoolExecutor(max_workers=7) as executor:
+        overview = executor.submit(self._search_overview)
+        temperature = self._submit_field_queries(executor, "temperature")
+        person_count = self._submit_field_queries(executor, "personCount")
+
+        total_documents, device_types = overview.result()
+        stats = {
+            "device_types": device_types,
+            "temperature": self._field_statistics(*temperature),
+            "person_count": self._field_statistics(*person_count),
+            "total_documents": total_documents
+        }
+
+      self.search_cache.put(cache_key, stats, generation)
       return stats
 
     except Exception as e:
       logger.error(f"統計情報取得エラー: {e}")
       return {}
 
+  def _search_overview(self) -> Tuple[int, List[Dict[str, Any]]]:
+    """全ドキュメント数とデバイスタイプ別の件数を1回の検索で取得"""
+    results = self.search_client.search(
+        search_text="*",
+        facets=["deviceType,count:10"],
+        top=0,
+        include_total_count=True
+    )
+    return results.get_count() or 0, (results.get_facets() or {}).get("deviceType", [])
+
+  def _submit_field_queries(self, executor: ThreadPoolExecutor, field_name: str) -> Tuple[Future, Future, Future]:
+    """数値フィールドの件数・平均、最小値、最大値の検索を並行に開始"""
+    # 未設定（0）のドキュメントは集計対象外とする
+    filter_string = f"{field_name} ne null and {field_name} ne 0"
+
+    minimum = executor.submit(self._field_extreme, field_name, filter_string, "asc")
+    maximum = executor.submit(self._field_extreme, field_name, filter_string, "desc")
+    return executor.submit(self._field_summary, field_name, filter_string, minimum, maximum), minimum, maximum
+
+  @staticmethod
+  def _field_statistics(summary: Future, minimum: Future, maximum: Future) -> Dict[str, Any]:
+    """数値フィールドの検索結果をまとめる"""
+    count, average, error = summary.result()
+    stats = {
+        "count": count,
+        "average": average,
+        "min": minimum.result(),
+        "max": maximum.result()
+    }
+    if error is not None:
+      stats["approximate"] = True
+      stats["average_error"] = error
+    return stats
+
+  def _field_summary(self, field_name: str, filter_string: str, minimum: Future,
+                     maximum: Future) -> Tuple[int, float, Optional[float]]:
+    """
+    件数と平均を求める
+
+    値の種類がファセット件数以内であれば値ごとのファセットから正確な平均を求める。
+    超える場合は最小値〜最大値を SEARCH_STATS_FACET_COUNT 個の区間に分けたintervalファセットから求める
+    （全ドキュメントがいずれかの区間に含まれ、誤差は区間幅の半分以内）。
+
+    Returns:
+        Tuple[int, float, Optional[float]]: 件数・平均・平均の誤差の上限（正確な場合None）
+    """
+    results = self.search_client.search(
+        search_text="*",
+        filter=filter_string,
+        facets=[f"{field_name},count:{self.stats_facet_count}"],
+        top=0,
+        include_total_count=True
+    )
+    count = results.get_count() or 0
+    buckets = (results.get_facets() or {}).get(field_name, [])
+
+    covered = sum(bucket["count"] for bucket in buckets)
+    if covered >= count:
+      total = sum(bucket["value"] * bucket["count"] for bucket in buckets)
+      return count, total / covered if covered else 0, None
+
+    low, high = minimum.result(), maximum.result()
+    # 整数フィールドの区間幅は整数とし、区間 [value, value + width - 1] の中点を代表値とする
+    integer = isinstance(low, int) and isinstance(high, int)
+    width = (high - low) / self.stats_facet_count
+    if integer:
+      width = max(1, math.ceil(width))
+    if width <= 0:
+      return count, low, 0.0
+    span = width - 1 if integer else width
+
+    results = self.search_client.search(
+        search_text="*",
+        filter=filter_string,
+        facets=[f"{field_name},interval:{width}"],
+        top=0
+    )
+    buckets = (results.get_facets() or {}).get(field_name, [])
+
+    total = 0.0
+    covered = 0
+    for bucket in buckets:
+      # 両端の区間は最小値・最大値で切り詰める
+      lower = max(bucket["value"], low)
+      upper = min(bucket["value"] + span, high)
+      total += (lower + upper) / 2 * bucket["count"]
+      covered += bucket["count"]
+    return count, total / covered if covered else 0, span / 2
+
+  def _field_extreme(self, field_name: str, filter_string: str, direction: str) -> float:
+    """ソートしたtop=1の検索で最小値・最大値を取得"""
+    results = self.search_client.search(
+        search_text="*",
+        filter=filter_string,
+        order_by=[f"{field_name} {direction}"],
+        select=[field_name],
+        top=1
+    )
+    first = next(iter(results), None)
+    return first.get(field_name, 0) if first else 0
+
   def delete_document(self, document_id: str) -> bool:
     """
     ドキュメントを削除
@@ -290,6 +678,7 @@ class AISearchManager:
     """
     try:
       self.search_client.delete_documents([{"id": document_id}])
+      self.search_cache.invalidate()
       logger.info(f"ドキュメントを削除しました: {document_id}")
       return True
 
@@ -304,6 +693,11 @@ class AISearchManager:
     Returns:
         bool: 成功時True
     """
+    if self.index_client is None:
+      # ローカル検索のテーブルは初期化時に作成済み
+      logger.info(f"ローカル検索インデックスを使用します: {self.search_client.path}")
+      return True
+
     try:
       # インデックスが存在するかチェック
       try:
@@ -315,21 +709,7 @@ class AISearchManager:
         pass
 
       # インデックス定義
-      index = SearchIndex(
-          name=self.search_index_name,
-          fields=[
-              SimpleField(name="id", type=SearchFieldDataType.String, key=True),
-              SearchableField(name="deviceId", type=SearchFieldDataType.String, filterable=True, sortable=True, facetable=True),
-              SearchableField(name="deviceType", type=SearchFieldDataType.String, filterable=True, sortable=True, facetable=True),
-              SimpleField(name="timestamp", type=SearchFieldDataType.DateTimeOffset, filterable=True, sortable=True),
-              SimpleField(name="temperature", type=SearchFieldDataType.Double, filterable=True, sortable=True, facetable=True),
-              SimpleField(name="humidity", type=SearchFieldDataType.Double, filterable=True, sortable=True, facetable=True),
-              SimpleField(name="co2", type=SearchFieldDataType.Double, filterable=True, sortable=True, facetable=True),
-              SimpleField(name="personCount", type=SearchFieldDataType.Int32, filterable=True, sortable=True, facetable=True),
-              SearchableField(name="content", type=SearchFieldDataType.String, analyzer="ja.microsoft"),
-              SimpleField(name="uploaded_at", type=SearchFieldDataType.DateTimeOffset, filterable=True, sortable=True)
-          ]
-      )
+      index = build_index(self.search_index_name, self.schema_version)
 
       self.index_client.create_index(index)
       logger.info(f"インデックスを作成しました: {self.search_index_name}")
@@ -338,3 +718,65 @@ class AISearchManager:
     except AzureError as e:
       logger.error(f"インデックス作成エラー: {e}")
       return False
+
+  def migrate_index(self, target_version: int, concurrency: int = 4, batch_size: int = 1000,
+                    progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+                    since: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    現在のインデックスを新しいスキーマバージョンのインデックスにバックグラウンドで再インデックス
+
+    コピー先のインデックスがなければ作成し、ドキュメントを時間区間ごとに並行してコピーした後、
+    開始後に追加されたドキュメントを追い付きでコピーする。進捗は get_migration で取得する。
+    完了後に SEARCH_SCHEMA_VERSION を変更すると読み書きが新しいインデックスに切り替わる
+    （再起動の直前に since を指定して、それ以降に追加されたドキュメントだけを再度コピーする）。
+
+    Args:
+        target_version: コピー先のスキーマバージョン
+        concurrency: 同時に処理する時間区間の数
+        batch_size: 1回の登録要求のドキュメント数
+        progress: 時間区間ごとの進捗を受け取るコールバック
+        since: 指定時はuploaded_atがこの時刻以降のドキュメントのみコピーする
+
+    Returns:
+        Dict[str, Any]: 開始時の進捗（コピー元・コピー先のインデックス名を含む）
+
+    Raises:
+        ValueError: ローカル検索の場合、現在と同じか不明なバージョンの場合、または移行の実行中の場合
+    """
+    if self.index_client is None:
+      raise ValueError("ローカル検索ではスキーマの移行は使用できません")
+    if target_version == self.schema_version:
+      raise ValueError(f"現在のスキーマバージョンと同じです: {target_version}")
+    if self.migration is not None and not self.migration.finished:
+      raise ValueError("インデックスの移行を実行中です")
+
+    target_name = versioned_index_name(self.base_index_name, target_version)
+    index = build_index(target_name, target_version)
+
+    # バッファ中のドキュメントをコピー元に登録してからコピーする
+    self.flush()
+
+    try:
+      self.index_client.get_index(target_name)
+    except ResourceNotFoundError:
+      self.index_client.create_index(index)
+      logger.info(f"インデックスを作成しました: {target_name}")
+
+    target_client = SearchClient(endpoint=self.endpoint, index_name=target_name, credential=self.credential)
+    self.migration = SearchReindexJob(self, target_client, target_version, concurrency=concurrency,
+                                      batch_size=batch_size, progress=progress, since=since)
+    self._migration_indexes = {"source": self.search_index_name, "target": target_name}
+    self.migration.start(on_finish=target_client.close)
+    return self.get_migration()
+
+  def get_migration(self) -> Optional[Dict[str, Any]]:
+    """
+    最後に開始したインデックスの移行の進捗を取得
+
+    Returns:
+        Optional[Dict[str, Any]]: 状態・件数・コピー元とコピー先のインデックス名（未実行の場合None）
+    """
+    if self.migration is None:
+      return None
+    return {**self._migration_indexes, **self.migration.status()}
+
@@ -1,8 +1,9 @@
 import atexit
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, stream_with_context
 from flask_cors import CORS
 import os
-from datetime import datetime, timedelta
+import json
+from datetime import datetime
 import azure.cosmos.cosmos_client as cosmos_client
 import threading
 import logging
@@ -12,11 +13,41 @@ from mqtt_client import KaitekiMQTTClient
 
 # Blob StorageとAI Searchのインポート
 from blob_storage import BlobStorageManager
+from blob_archive import archive_records
+from blob_pagination import parse_page_size
 from ai_search import AISearchManager
+from search_schema import LATEST_SCHEMA_VERSION
+from downsampling import parse_timestamp
 
 # IoT Hub管理のインポート
 from iot_hub_manager import IoTHubManager
 
+# プッシュ配信のインポート
+from event_stream import DashboardEventBroker, build_sensor_delta, infer_device_type
+
+# ダッシュボードレスポンス構築のインポート
+from dashboard_payloads import (
+    AITRIOS_LATEST_QUERY,
+    GEMINI_LATEST_QUERY,
+    KAITEKI_LATEST_QUERY,
+    ANALYSIS_RECENT_QUERY,
+    ANOMALY_RECENT_QUERY,
+    latest_timestamp_query,
+    entrance_hourly_query,
+    room_history_query,
+    history_window,
+    parse_history_points,
+    build_entrance_payload,
+    entrance_error_payload,
+    build_room_payload,
+    room_error_payload,
+    build_summary_payload,
+    summary_error_payload
+)
+
+# 条件付きGETのインポート
+from http_cache import ConditionalResponseCache, compress_response
+
 app = Flask(__name__)
 CORS(app)
 
@@ -31,12 +62,36 @@ COSMOS_DATABASE = 'smart-space-db'
 COSMOS_CONTAINER_SENSOR = 'sensor-data'
 COSMOS_CONTAINER_ANALYSIS = 'analysis-data'
 
+# チャート用履歴データのデフォルト点数（0の場合は全件を返す）
+HISTORY_POINTS = int(os.environ.get('HISTORY_POINTS', 24))
+
 # Cosmos DBクライアントの初期化
 cosmos_client_instance = cosmos_client.CosmosClient(COSMOS_ENDPOINT, COSMOS_KEY)
 database = cosmos_client_instance.get_database_client(COSMOS_DATABASE)
 sensor_container = database.get_container_client(COSMOS_CONTAINER_SENSOR)
 analysis_container = database.get_container_client(COSMOS_CONTAINER_ANALYSIS)
 
+# レスポンスキャッシュの初期化
+MIN_COMPRESS_SIZE = int(os.environ.get('MIN_COMPRESS_SIZE', 1024))
+response_cache = ConditionalResponseCache(
+    max_age=int(os.environ.get('RESPONSE_CACHE_MAX_AGE', 300)),
+    min_compress_size=MIN_COMPRESS_SIZE,
+    enabled=os.environ.get('RESPONSE_CACHE_ENABLED', 'true').lower() == 'true'
+)
+
+
+@app.after_request
+def compress_json_response(response):
+  """Accept-Encodingに応じてレスポンスを圧縮"""
+  return compress_response(response, MIN_COMPRESS_SIZE)
+
+
+def latest_timestamp(container, condition=None):
+  """コンテナ内の最新ドキュメントの更新時刻（_ts）を取得"""
+  items = list(container.query_items(query=latest_timestamp_query(condition), enable_cross_partition_query=True))
+  return items[0] if items else None
+
+
 # Blob StorageとAI Searchの初期化
 blob_storage = BlobStorageManager()
 ai_search = AISearchManager()
@@ -44,16 +99,32 @@ ai_search = AISearchManager()
 # IoT Hub管理の初期化
 iot_hub_manager = IoTHubManager()
 
+# プッシュ配信の初期化
+event_broker = DashboardEventBroker(
+    heartbeat_interval=float(os.environ.get('STREAM_HEARTBEAT_INTERVAL', 15))
+)
+
 # MQTTクライアントの初期化
 mqtt_client = None
 mqtt_thread = None
+mqtt_initialized = False
+mqtt_init_lock = threading.Lock()
+
+
+def publish_sensor_update(document):
+  """新しいセンサーデータの差分をダッシュボードに配信"""
+  try:
+    event_type, delta = build_sensor_delta(document)
+    event_broker.publish(event_type, delta)
+  except Exception as e:
+    logger.error(f"プッシュ配信エラー: {e}")
 
 
 def start_mqtt_client():
   """MQTTクライアントを別スレッドで開始"""
   global mqtt_client
   try:
-    mqtt_client = KaitekiMQTTClient()
+    mqtt_client = KaitekiMQTTClient(on_data_saved=publish_sensor_update)
     mqtt_client.start()
     logger.info("MQTTクライアント開始完了")
   except Exception as e:
@@ -73,18 +144,29 @@ def stop_mqtt_client():
 # アプリケーション起動時にMQTTクライアントを開始
 
 
-@app.before_first_request
+@app.before_request
 def initialize_mqtt():
-  """アプリケーション初期化時にMQTTクライアントを開始"""
-  global mqtt_thread
-  if os.environ.get('ENABLE_MQTT', 'true').lower() == 'true':
-    mqtt_thread = threading.Thread(target=start_mqtt_client, daemon=True)
-    mqtt_thread.start()
-    logger.info("MQTTクライアントスレッド開始")
+  """最初のリクエストの前にMQTTクライアントを開始（Flask 2.3以降は before_first_request が廃止されたため）"""
+  global mqtt_thread, mqtt_initialized
+  if mqtt_initialized:
+    return
+
+  with mqtt_init_lock:
+    if mqtt_initialized:
+      return
+    mqtt_initialized = True
+
+    if os.environ.get('ENABLE_MQTT', 'true').lower() == 'true':
+      mqtt_thread = threading.Thread(target=start_mqtt_client, daemon=True)
+      mqtt_thread.start()
+      logger.info("MQTTクライアントスレッド開始")
 
 
 # アプリケーション終了時のクリーンアップ
 atexit.register(stop_mqtt_client)
+atexit.register(event_broker.close)
+atexit.register(blob_storage.close)
+atexit.register(ai_search.close)
 
 
 @app.route('/api/health', methods=['GET'])
@@ -97,185 +179,78 @@ def health_check():
   })
 
 
+@app.route('/api/stream', methods=['GET'])
+def stream_dashboard_updates():
+  """ダッシュボード更新のプッシュ配信（Server-Sent Events）"""
+  # 再接続時はブラウザがLast-Event-IDを送信する
+  last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+
+  return Response(
+      stream_with_context(event_broker.stream(last_event_id)),
+      mimetype='text/event-stream',
+      headers={
+          "Cache-Control": "no-cache",
+          "X-Accel-Buffering": "no"
+      }
+  )
+
+
 @app.route('/api/entrance/current', methods=['GET'])
+@response_cache.conditional(lambda: latest_timestamp(sensor_container))
 def get_entrance_data():
   """エントランスデータの取得（AITRIOS + Gemini）"""
   try:
-  # 最新のAITRIOSデータを取得
-    aitrios_query = "SELECT * FROM c WHERE c.deviceType = 'aitrios' ORDER BY c.timestamp DESC OFFSET 0 LIMIT 1"
-    aitrios_items = list(sensor_container.query_items(query=aitrios_query, enable_cross_partition_query=True))
+    # 最新のAITRIOSデータを取得
+    aitrios_items = list(sensor_container.query_items(query=AITRIOS_LATEST_QUERY, enable_cross_partition_query=True))
 
     # 最新のGeminiデータを取得
-    gemini_query = "SELECT * FROM c WHERE c.deviceType = 'gemini' ORDER BY c.timestamp DESC OFFSET 0 LIMIT 1"
-    gemini_items = list(sensor_container.query_items(query=gemini_query, enable_cross_partition_query=True))
+    gemini_items = list(sensor_container.query_items(query=GEMINI_LATEST_QUERY, enable_cross_partition_query=True))
 
     # 過去24時間のデータを取得（時間別集計用）
-    yesterday = datetime.utcnow() - timedelta(hours=24)
-    hourly_query = f"""
-        SELECT
-            c.data.deviceType,
-            c.data.personCount,
-            c.data.temperature,
-            c.data.humidity,
-            c.data.co2,
-            c.timestamp
-        FROM c
-        WHERE c.timestamp >= '{yesterday.isoformat()}'
-        ORDER BY c.timestamp
-        """
-    hourly_items = list(sensor_container.query_items(query=hourly_query, enable_cross_partition_query=True))
-
-    # データの統合
-    aitrios_data = aitrios_items[0] if aitrios_items else {}
-    gemini_data = gemini_items[0] if gemini_items else {}
-
-    # レスポンスデータの構築
-    response_data = {
-        "currentVisitors": aitrios_data.get('data', {}).get('personCount', 0),
-        "dailyVisitors": sum(item.get('data', {}).get('personCount', 0) for item in hourly_items if item.get('data', {}).get('deviceType') == 'aitrios'),
-        "ageDistribution": aitrios_data.get('data', {}).get('ageDistribution', [35, 40, 20, 5]),
-        "genderDistribution": aitrios_data.get('data', {}).get('genderDistribution', [55, 40, 5]),
-        "hourlyData": [item.get('data', {}).get('personCount', 0) for item in hourly_items if item.get('data', {}).get('deviceType') == 'aitrios'],
-        "behaviorMetrics": {
-            "interestLevel": gemini_data.get('data', {}).get('behaviorAnalysis', {}).get('interestLevel', 75),
-            "avgMovement": gemini_data.get('data', {}).get('behaviorAnalysis', {}).get('avgMovement', 12.5),
-            "groupBehavior": gemini_data.get('data', {}).get('behaviorAnalysis', {}).get('groupBehavior', 45)
-        },
-        "lastUpdate": aitrios_data.get('timestamp', datetime.utcnow().isoformat())
-    }
-
-    return jsonify(response_data)
+    yesterday, _ = history_window()
+    hourly_items = list(sensor_container.query_items(query=entrance_hourly_query(yesterday), enable_cross_partition_query=True))
+
+    return jsonify(build_entrance_payload(aitrios_items, gemini_items, hourly_items))
 
   except Exception as e:
-    return jsonify({
-        "error": str(e),
-        "currentVisitors": 0,
-        "dailyVisitors": 0,
-        "ageDistribution": [35, 40, 20, 5],
-        "genderDistribution": [55, 40, 5],
-        "hourlyData": [0] * 24,
-        "behaviorMetrics": {
-            "interestLevel": 75,
-            "avgMovement": 12.5,
-            "groupBehavior": 45
-        }
-    }), 500
+    return jsonify(entrance_error_payload(e)), 500
 
 
 @app.route('/api/room/environment', methods=['GET'])
+@response_cache.conditional(lambda: latest_timestamp(sensor_container, "c.deviceType = 'kaiteki'"))
 def get_room_environment():
   """部屋環境データの取得（快適君）"""
   try:
+    points = parse_history_points(request.args.get('points'), HISTORY_POINTS)
+
     # 最新の快適君データを取得
-    kaiteki_query = "SELECT * FROM c WHERE c.deviceType = 'kaiteki' ORDER BY c.timestamp DESC OFFSET 0 LIMIT 1"
-    kaiteki_items = list(sensor_container.query_items(query=kaiteki_query, enable_cross_partition_query=True))
+    kaiteki_items = list(sensor_container.query_items(query=KAITEKI_LATEST_QUERY, enable_cross_partition_query=True))
 
     # 過去24時間のデータを取得
-    yesterday = datetime.utcnow() - timedelta(hours=24)
-    history_query = f"""
-        SELECT
-            c.data.temperature,
-            c.data.humidity,
-            c.data.co2,
-            c.data.occupancy,
-            c.data.illuminance,
-            c.data.pressure,
-            c.data.human,
-            c.timestamp
-        FROM c
-        WHERE c.deviceType = 'kaiteki' AND c.timestamp >= '{yesterday.isoformat()}'
-        ORDER BY c.timestamp
-        """
-    history_items = list(sensor_container.query_items(query=history_query, enable_cross_partition_query=True))
-
-    # 最新データ
-    current_data = kaiteki_items[0] if kaiteki_items else {}
-
-    # 週間使用率の計算（簡易版）
-    weekly_usage = [85, 92, 78, 88, 95, 45, 30]  # モックデータ
-
-    response_data = {
-        "temperature": current_data.get('data', {}).get('temperature', 22.5),
-        "humidity": current_data.get('data', {}).get('humidity', 55),
-        "co2": current_data.get('data', {}).get('co2', 450),
-        "pressure": current_data.get('data', {}).get('pressure', 1013),
-        "illuminance": current_data.get('data', {}).get('illuminance', 300),
-        "isOccupied": current_data.get('data', {}).get('occupancy', True),
-        "human": current_data.get('data', {}).get('human', False),
-        "deviceInfo": {
-            "deviceNo": current_data.get('data', {}).get('deviceNo'),
-            "deviceName": current_data.get('data', {}).get('deviceName'),
-            "version": current_data.get('data', {}).get('version'),
-            "mac": current_data.get('data', {}).get('mac')
-        },
-        "networkInfo": {
-            "rssi": current_data.get('data', {}).get('rssi', 0),
-            "ssid": current_data.get('data', {}).get('ssid'),
-            "voltage": current_data.get('data', {}).get('voltage', 0),
-            "power": current_data.get('data', {}).get('power', 0)
-        },
-        "temperatureHistory": [item.get('data', {}).get('temperature', 22.5) for item in history_items],
-        "humidityHistory": [item.get('data', {}).get('humidity', 55) for item in history_items],
-        "co2History": [item.get('data', {}).get('co2', 450) for item in history_items],
-        "pressureHistory": [item.get('data', {}).get('pressure', 1013) for item in history_items],
-        "illuminanceHistory": [item.get('data', {}).get('illuminance', 300) for item in history_items],
-        "weeklyUsage": weekly_usage,
-        "lastUpdate": current_data.get('timestamp', datetime.utcnow().isoformat())
-    }
-
-    return jsonify(response_data)
+    yesterday, now = history_window()
+    history_items = list(sensor_container.query_items(query=room_history_query(yesterday), enable_cross_partition_query=True))
+
+    return jsonify(build_room_payload(kaiteki_items, history_items, yesterday, now, points))
 
   except Exception as e:
-    return jsonify({
-        "error": str(e),
-        "temperature": 22.5,
-        "humidity": 55,
-        "co2": 450,
-        "isOccupied": True,
-        "temperatureHistory": [22.5] * 24,
-        "humidityHistory": [55] * 24,
-        "co2History": [450] * 24,
-        "weeklyUsage": [85, 92, 78, 88, 95, 45, 30]
-    }), 500
+    return jsonify(room_error_payload(e)), 500
 
 
 @app.route('/api/analytics/summary', methods=['GET'])
+@response_cache.conditional(lambda: latest_timestamp(analysis_container))
 def get_analytics_summary():
   """分析サマリーデータの取得"""
   try:
     # 最新の分析データを取得
-    analysis_query = "SELECT * FROM c WHERE c.collectionName = 'analysis-data' ORDER BY c.windowEnd DESC OFFSET 0 LIMIT 10"
-    analysis_items = list(analysis_container.query_items(query=analysis_query, enable_cross_partition_query=True))
+    analysis_items = list(analysis_container.query_items(query=ANALYSIS_RECENT_QUERY, enable_cross_partition_query=True))
 
     # 異常検知データの取得
-    anomaly_query = "SELECT * FROM c WHERE c.anomalyStatus != 'Normal' ORDER BY c.windowEnd DESC OFFSET 0 LIMIT 5"
-    anomaly_items = list(analysis_container.query_items(query=anomaly_query, enable_cross_partition_query=True))
-
-    response_data = {
-        "recentAnalysis": analysis_items,
-        "recentAnomalies": anomaly_items,
-        "summary": {
-            "totalDevices": 3,  # AITRIOS, Gemini, 快適君
-            "activeDevices": len(set(item.get('deviceType') for item in analysis_items)),
-            "anomalyCount": len(anomaly_items),
-            "lastUpdate": datetime.utcnow().isoformat()
-        }
-    }
+    anomaly_items = list(analysis_container.query_items(query=ANOMALY_RECENT_QUERY, enable_cross_partition_query=True))
 
-    return jsonify(response_data)
+    return jsonify(build_summary_payload(analysis_items, anomaly_items))
 
   except Exception as e:
-    return jsonify({
-        "error": str(e),
-        "recentAnalysis": [],
-        "recentAnomalies": [],
-        "summary": {
-            "totalDevices": 3,
-            "activeDevices": 0,
-            "anomalyCount": 0,
-            "lastUpdate": datetime.utcnow().isoformat()
-        }
-    }), 500
+    return jsonify(summary_error_payload(e)), 500
 
 
 # Blob Storage API エンドポイント
@@ -290,7 +265,19 @@ def upload_sensor_data_to_blob():
     success = blob_storage.upload_sensor_data(sensor_data, device_id)
 
     if success:
-      return jsonify({"status": "success", "message": "センサーデータをアップロードしました"}), 200
+      publish_sensor_update({
+          "deviceType": infer_device_type(device_id, data.get('deviceType')),
+          "timestamp": data.get('timestamp', datetime.utcnow().isoformat()),
+          "data": sensor_data
+      })
+      if blob_storage.segment_writer:
+        # バッファに追加済み（Blobへの書き込みは後で行われ、まだ永続化されていない）
+        return jsonify({
+            "status": "success",
+            "buffered": True,
+            "message": "センサーデータを書き込みバッファに追加しました"
+        }), 200
+      return jsonify({"status": "success", "buffered": False, "message": "センサーデータをアップロードしました"}), 200
     else:
       return jsonify({"status": "error", "message": "アップロードに失敗しました"}), 500
 
@@ -321,11 +308,43 @@ def upload_analysis_data_to_blob():
 
 @app.route('/api/blob/sensor-data/<device_id>', methods=['GET'])
 def get_sensor_data_from_blob(device_id):
-  """Blob Storageからセンサーデータを取得"""
+  """
+  Blob Storageからセンサーデータを取得
+
+  format=ndjson の場合はダウンロードしたデータを時刻順に1行ずつストリーミングし、
+  limit または continuation_token を指定した場合は1ページ分と次の継続トークンを返す。
+  ストリーミングの途中で取得に失敗した場合は、最後の行にエラーを出力して終了する。
+  """
   try:
     start_time = request.args.get('start_time')
     end_time = request.args.get('end_time')
 
+    if request.args.get('format') == 'ndjson':
+      def generate():
+        try:
+          for record in blob_storage.iter_sensor_data(device_id, start_time, end_time):
+            yield json.dumps(record, ensure_ascii=False) + "\n"
+        except Exception as e:
+          logger.error(f"センサーデータのストリーミングエラー: {e}")
+          yield json.dumps({"status": "error", "message": str(e)}, ensure_ascii=False) + "\n"
+
+      return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    continuation_token = request.args.get('continuation_token')
+    if request.args.get('limit') or continuation_token:
+      limit = parse_page_size(request.args.get('limit'))
+      try:
+        data, next_token = blob_storage.get_sensor_data_page(device_id, start_time, end_time, limit, continuation_token)
+      except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+      return jsonify({
+          "status": "success",
+          "data": data,
+          "count": len(data),
+          "continuationToken": next_token
+      }), 200
+
     data = blob_storage.get_sensor_data(device_id, start_time, end_time)
 
     return jsonify({
@@ -339,6 +358,46 @@ def get_sensor_data_from_blob(device_id):
     return jsonify({"status": "error", "message": str(e)}), 500
 
 
+@app.route('/api/blob/sensor-data/<device_id>/daily-stats', methods=['GET'])
+def get_sensor_daily_stats_from_blob(device_id):
+  """センサーデータの日別統計をマニフェストから取得"""
+  try:
+    start_time = request.args.get('start_time')
+    end_time = request.args.get('end_time')
+
+    stats = blob_storage.get_sensor_daily_stats(device_id, start_time, end_time)
+
+    return jsonify({
+        "status": "success",
+        "statistics": stats
+    }), 200
+
+  except ValueError as e:
+    return jsonify({"status": "error", "message": str(e)}), 400
+  except Exception as e:
+    logger.error(f"日別統計取得エラー: {e}")
+    return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route('/api/blob/manifest/rebuild', methods=['POST'])
+def rebuild_blob_manifests():
+  """確定済みの日のマニフェストを一覧取得から再構築"""
+  try:
+    data = request.get_json(silent=True) or {}
+    days = int(data.get('days', 7))
+
+    result = blob_storage.rebuild_manifests(days)
+
+    return jsonify({
+        "status": "success",
+        "result": result
+    }), 200
+
+  except Exception as e:
+    logger.error(f"マニフェスト再構築エラー: {e}")
+    return jsonify({"status": "error", "message": str(e)}), 500
+
+
 @app.route('/api/blob/analysis-data/<analysis_type>', methods=['GET'])
 def get_analysis_data_from_blob(analysis_type):
   """Blob Storageから分析データを取得"""
@@ -359,6 +418,82 @@ def get_analysis_data_from_blob(analysis_type):
     return jsonify({"status": "error", "message": str(e)}), 500
 
 
+@app.route('/api/blob/cache', methods=['GET'])
+def get_blob_cache_stats():
+  """Blob読み取りキャッシュの統計情報を取得"""
+  return jsonify({
+      "status": "success",
+      "statistics": blob_storage.blob_cache.stats()
+  }), 200
+
+
+@app.route('/api/blob/archive', methods=['POST'])
+def archive_sensor_data():
+  """確定済みの日のセンサーデータをParquetにアーカイブ"""
+  try:
+    data = request.get_json(silent=True) or {}
+    days = int(data.get('days', 7))
+    delete_source = bool(data.get('deleteSource', False))
+
+    result = blob_storage.archive_closed_days(days, delete_source)
+
+    return jsonify({
+        "status": "success",
+        "result": result
+    }), 200
+
+  except Exception as e:
+    logger.error(f"アーカイブエラー: {e}")
+    return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route('/api/blob/retention', methods=['POST'])
+def apply_blob_retention():
+  """保持期間を過ぎたBlobを削除"""
+  try:
+    data = request.get_json(silent=True) or {}
+    days = data.get('days')
+
+    results = blob_storage.apply_retention(int(days) if days is not None else None)
+
+    return jsonify({
+        "status": "success",
+        "results": results
+    }), 200
+
+  except Exception as e:
+    logger.error(f"保持期間の適用エラー: {e}")
+    return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route('/api/blob/archive/sensor-data/<device_id>', methods=['GET'])
+def get_sensor_data_from_archive(device_id):
+  """アーカイブからセンサーデータを取得（列を指定可能）"""
+  try:
+    start_time = request.args.get('start_time')
+    end_time = request.args.get('end_time')
+    columns = request.args.get('columns')
+
+    if not start_time:
+      return jsonify({"status": "error", "message": "start_timeを指定してください"}), 400
+
+    if columns:
+      columns = columns.split(',')
+
+    table = blob_storage.read_sensor_archive(device_id, start_time, end_time, columns)
+    data = archive_records(table) if table is not None else []
+
+    return jsonify({
+        "status": "success",
+        "data": data,
+        "count": len(data)
+    }), 200
+
+  except Exception as e:
+    logger.error(f"アーカイブ取得エラー: {e}")
+    return jsonify({"status": "error", "message": str(e)}), 500
+
+
 # AI Search API エンドポイント
 @app.route('/api/search/upload', methods=['POST'])
 def upload_document_to_search():
@@ -378,6 +513,77 @@ def upload_document_to_search():
     return jsonify({"status": "error", "message": str(e)}), 500
 
 
+@app.route('/api/search/flush', methods=['POST'])
+def flush_search_documents():
+  """バッファ中のドキュメントをAI Searchに登録"""
+  try:
+    result = ai_search.flush()
+
+    return jsonify({
+        "status": "success",
+        "result": result
+    }), 200
+
+  except Exception as e:
+    logger.error(f"AI Search登録エラー: {e}")
+    return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route('/api/search/cache', methods=['GET'])
+def get_search_cache_stats():
+  """検索結果キャッシュの統計情報を取得"""
+  return jsonify({
+      "status": "success",
+      "statistics": ai_search.search_cache.stats()
+  }), 200
+
+
+def search_response(search_text="", filters=None, order_by=None, top=50):
+  """
+  検索結果のレスポンスを作成
+
+  select で取得するフィールドを指定でき、format=ndjson の場合は全件を1行ずつストリーミングし、
+  limit または continuation_token を指定した場合は1ページ分と次の継続トークンを返す。
+  ストリーミングの途中で検索に失敗した場合は、最後の行にエラーを出力して終了する。
+  """
+  select = request.args.get('select')
+  select = select.split(',') if select else None
+
+  if request.args.get('format') == 'ndjson':
+    def generate():
+      try:
+        for result in ai_search.iter_documents(search_text, filters, order_by, select):
+          yield json.dumps(result, ensure_ascii=False, default=str) + "\n"
+      except Exception as e:
+        logger.error(f"検索結果のストリーミングエラー: {e}")
+        yield json.dumps({"status": "error", "message": str(e)}, ensure_ascii=False) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+  continuation_token = request.args.get('continuation_token')
+  if request.args.get('limit') or continuation_token:
+    limit = parse_page_size(request.args.get('limit'), default=top)
+    try:
+      results, next_token = ai_search.search_page(search_text, filters, order_by, select, limit, continuation_token)
+    except ValueError as e:
+      return jsonify({"status": "error", "message": str(e)}), 400
+
+    return jsonify({
+        "status": "success",
+        "results": results,
+        "count": len(results),
+        "continuationToken": next_token
+    }), 200
+
+  results = ai_search.search_documents(search_text, filters, order_by, top, select)
+
+  return jsonify({
+      "status": "success",
+      "results": results,
+      "count": len(results)
+  }), 200
+
+
 @app.route('/api/search/query', methods=['GET'])
 def search_documents():
   """AI Searchでドキュメントを検索"""
@@ -390,13 +596,7 @@ def search_documents():
     if order_by:
       order_by = order_by.split(',')
 
-    results = ai_search.search_documents(search_text, filters, order_by, top)
-
-    return jsonify({
-        "status": "success",
-        "results": results,
-        "count": len(results)
-    }), 200
+    return search_response(search_text, filters, order_by, top)
 
   except Exception as e:
     logger.error(f"AI Search検索エラー: {e}")
@@ -410,13 +610,7 @@ def search_by_device(device_id):
     start_time = request.args.get('start_time')
     end_time = request.args.get('end_time')
 
-    results = ai_search.search_by_device(device_id, start_time, end_time)
-
-    return jsonify({
-        "status": "success",
-        "results": results,
-        "count": len(results)
-    }), 200
+    return search_response(**ai_search.device_query(device_id, start_time, end_time))
 
   except Exception as e:
     logger.error(f"AI Searchデバイス検索エラー: {e}")
@@ -427,13 +621,7 @@ def search_by_device(device_id):
 def search_by_device_type(device_type):
   """デバイスタイプで検索"""
   try:
-    results = ai_search.search_by_device_type(device_type)
-
-    return jsonify({
-        "status": "success",
-        "results": results,
-        "count": len(results)
-    }), 200
+    return search_response(**ai_search.device_type_query(device_type))
 
   except Exception as e:
     logger.error(f"AI Searchデバイスタイプ検索エラー: {e}")
@@ -447,13 +635,7 @@ def search_by_temperature_range():
     min_temp = float(request.args.get('min_temp', 0))
     max_temp = float(request.args.get('max_temp', 50))
 
-    results = ai_search.search_by_temperature_range(min_temp, max_temp)
-
-    return jsonify({
-        "status": "success",
-        "results": results,
-        "count": len(results)
-    }), 200
+    return search_response(**ai_search.temperature_range_query(min_temp, max_temp))
 
   except Exception as e:
     logger.error(f"AI Search温度範囲検索エラー: {e}")
@@ -467,13 +649,7 @@ def search_by_person_count_range():
     min_count = int(request.args.get('min_count', 0))
     max_count = int(request.args.get('max_count', 100))
 
-    results = ai_search.search_by_person_count(min_count, max_count)
-
-    return jsonify({
-        "status": "success",
-        "results": results,
-        "count": len(results)
-    }), 200
+    return search_response(**ai_search.person_count_query(min_count, max_count))
 
   except Exception as e:
     logger.error(f"AI Search人数範囲検索エラー: {e}")
@@ -530,6 +706,42 @@ def create_search_index():
     return jsonify({"status": "error", "message": str(e)}), 500
 
 
+@app.route('/api/search/migrate', methods=['POST'])
+def migrate_search_index():
+  """AI Searchインデックスを新しいスキーマバージョンに再インデックス（バックグラウンドで実行）"""
+  try:
+    data = request.get_json(silent=True) or {}
+    since = parse_timestamp(data.get('catchUpFrom'))
+    if data.get('catchUpFrom') and since is None:
+      return jsonify({"status": "error", "message": "catchUpFromが不正です"}), 400
+
+    migration = ai_search.migrate_index(
+        int(data.get('version', LATEST_SCHEMA_VERSION)),
+        concurrency=int(data.get('concurrency', 4)),
+        batch_size=int(data.get('batchSize', 1000)),
+        since=since
+    )
+
+    return jsonify({"status": "success", "migration": migration}), 200
+
+  except ValueError as e:
+    return jsonify({"status": "error", "message": str(e)}), 400
+  except Exception as e:
+    logger.error(f"AI Searchインデックス移行エラー: {e}")
+    return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route('/api/search/migrate', methods=['GET'])
+def get_search_migration():
+  """AI Searchインデックスの移行の進捗を取得"""
+  migration = ai_search.get_migration()
+
+  if migration is None:
+    return jsonify({"status": "error", "message": "インデックスの移行は実行されていません"}), 404
+
+  return jsonify({"status": "success", "migration": migration}), 200
+
+
 # IoT Hub管理 API エンドポイント
 @app.route('/api/iot/devices', methods=['GET'])
 def get_iot_devices():
@@ -572,6 +784,28 @@ def create_iot_device():
     return jsonify({"status": "error", "message": str(e)}), 500
 
 
+@app.route('/api/iot/devices/bulk', methods=['POST'])
+def bulk_iot_devices():
+  """IoT Hubデバイスを一括で作成・更新・削除"""
+  try:
+    data = request.get_json(silent=True) or {}
+    operation = data.get('operation')
+    devices = data.get('devices')
+
+    if not operation or not isinstance(devices, list):
+      return jsonify({"status": "error", "message": "operationとdevicesは必須です"}), 400
+
+    result = iot_hub_manager.bulk_devices(operation, devices, bool(data.get('dryRun', False)))
+
+    return jsonify({"status": "success", "result": result}), 200
+
+  except ValueError as e:
+    return jsonify({"status": "error", "message": str(e)}), 400
+  except Exception as e:
+    logger.error(f"IoT Hubデバイス一括操作エラー: {e}")
+    return jsonify({"status": "error", "message": str(e)}), 500
+
+
 @app.route('/api/iot/devices/<device_id>', methods=['DELETE'])
 def delete_iot_device(device_id):
   """IoT Hubデバイスを削除"""
@@ -712,5 +946,126 @@ def get_iot_statistics():
     return jsonify({"status": "error", "message": str(e)}), 500
 
 
+@app.route('/api/iot/registry', methods=['GET'])
+def get_iot_registry_cache():
+  """デバイスレジストリキャッシュの状態を取得（refresh=trueで次回の読み取り時に全件を再取得）"""
+  try:
+    if request.args.get('refresh', 'false').lower() == 'true':
+      iot_hub_manager.registry_cache.invalidate()
+
+    return jsonify({
+        "status": "success",
+        "registry": iot_hub_manager.registry_cache.stats()
+    }), 200
+
+  except Exception as e:
+    logger.error(f"IoT Hubレジストリキャッシュ取得エラー: {e}")
+    return jsonify({"status": "error", "message": str(e)}), 500
+
+
+def _fleet_deadline(data):
+  """リクエストから操作全体の制限秒数を取得"""
+  deadline = data.get('deadline')
+  return float(deadline) if deadline is not None else None
+
+
+@app.route('/api/iot/fleet/twin', methods=['POST'])
+def fleet_update_twin():
+  """条件に一致するデバイスのツインを一括更新（バックグラウンドで実行）"""
+  try:
+    data = request.get_json(silent=True) or {}
+    properties = data.get('properties')
+
+    if not properties:
+      return jsonify({"status": "error", "message": "propertiesは必須です"}), 400
+
+    operation = iot_hub_manager.fleet_update_twin(data.get('condition'), properties, _fleet_deadline(data))
+
+    return jsonify({"status": "success", "operation": operation}), 200
+
+  except ValueError as e:
+    return jsonify({"status": "error", "message": str(e)}), 400
+  except Exception as e:
+    logger.error(f"IoT Hubフリートツイン更新エラー: {e}")
+    return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route('/api/iot/fleet/telemetry', methods=['PUT'])
+def fleet_configure_telemetry():
+  """条件に一致するデバイスのテレメトリ設定を一括更新（バックグラウンドで実行）"""
+  try:
+    data = request.get_json(silent=True) or {}
+    operation = iot_hub_manager.fleet_configure_telemetry(
+        data.get('condition'),
+        int(data.get('interval', 30)),
+        _fleet_deadline(data)
+    )
+
+    return jsonify({"status": "success", "operation": operation}), 200
+
+  except ValueError as e:
+    return jsonify({"status": "error", "message": str(e)}), 400
+  except Exception as e:
+    logger.error(f"IoT Hubフリートテレメトリ設定エラー: {e}")
+    return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route('/api/iot/fleet/methods', methods=['POST'])
+def fleet_invoke_method():
+  """条件に一致するデバイスのダイレクトメソッドを一括呼び出し（バックグラウンドで実行）"""
+  try:
+    data = request.get_json(silent=True) or {}
+    method_name = data.get('methodName')
+
+    if not method_name:
+      return jsonify({"status": "error", "message": "methodNameは必須です"}), 400
+
+    operation = iot_hub_manager.fleet_invoke_method(
+        data.get('condition'),
+        method_name,
+        data.get('payload'),
+        response_timeout=int(data.get('responseTimeout', 30)),
+        connect_timeout=int(data.get('connectTimeout', 10)),
+        deadline=_fleet_deadline(data)
+    )
+
+    return jsonify({"status": "success", "operation": operation}), 200
+
+  except ValueError as e:
+    return jsonify({"status": "error", "message": str(e)}), 400
+  except Exception as e:
+    logger.error(f"IoT Hubフリートメソッド呼び出しエラー: {e}")
+    return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route('/api/iot/fleet/operations', methods=['GET'])
+def get_fleet_operations():
+  """フリート操作の一覧を取得"""
+  return jsonify({
+      "status": "success",
+      "operations": iot_hub_manager.fleet_operations.summaries()
+  }), 200
+
+
+@app.route('/api/iot/fleet/operations/<operation_id>', methods=['GET'])
+def get_fleet_operation(operation_id):
+  """フリート操作の進捗と結果を取得"""
+  operation = iot_hub_manager.get_fleet_operation(operation_id)
+
+  if operation is None:
+    return jsonify({"status": "error", "message": "操作が見つかりません"}), 404
+
+  return jsonify({"status": "success", "operation": operation}), 200
+
+
+@app.route('/api/iot/fleet/operations/<operation_id>/cancel', methods=['POST'])
+def cancel_fleet_operation(operation_id):
+  """フリート操作の開始前のデバイスを中止"""
+  if not iot_hub_manager.cancel_fleet_operation(operation_id):
+    return jsonify({"status": "error", "message": "操作が見つかりません"}), 404
+
+  return jsonify({"status": "success", "message": "操作を中止しました"}), 200
+
+
 if __name__ == '__main__':
   app.run(debug=True, host='0.0.0.0', port=5000)
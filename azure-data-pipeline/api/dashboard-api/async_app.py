@@ -0,0 +1,380 @@
+"""
+Smart Space Dashboard API（非同期版）
+Quart + 非同期Azure SDKによるASGIアプリケーション
+
+ダッシュボードがポーリングする参照系エンドポイントを非同期I/Oで提供する。
+Cosmos DBは非同期クライアントを使用し、非同期SDKのないIoT Hubと、
+Flask版と共通のBlob Storage・AI Search処理（エスケープ・ページング・キャッシュ）はスレッドで実行する。
+条件付きGET・圧縮もFlask版と同じレスポンスキャッシュを使用する。
+
+起動例:
+    hypercorn async_app:app --workers 4 --bind 0.0.0.0:5000
+"""
+
+import asyncio
+import itertools
+import json
+import os
+import logging
+from datetime import datetime
+
+from quart import Quart, Response, jsonify, request
+from quart_cors import cors
+from azure.cosmos.aio import CosmosClient
+
+from blob_storage import BlobStorageManager
+from blob_pagination import parse_page_size
+from ai_search import AISearchManager
+from iot_hub_manager import IoTHubManager
+from http_cache import ConditionalResponseCache, compress_response_async
+from dashboard_payloads import (
+    AITRIOS_LATEST_QUERY,
+    GEMINI_LATEST_QUERY,
+    KAITEKI_LATEST_QUERY,
+    ANALYSIS_RECENT_QUERY,
+    ANOMALY_RECENT_QUERY,
+    latest_timestamp_query,
+    entrance_hourly_query,
+    room_history_query,
+    history_window,
+    parse_history_points,
+    build_entrance_payload,
+    entrance_error_payload,
+    build_room_payload,
+    room_error_payload,
+    build_summary_payload,
+    summary_error_payload
+)
+
+app = cors(Quart(__name__))
+
+# ログ設定
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Cosmos DB接続設定
+COSMOS_ENDPOINT = os.environ.get('COSMOS_ENDPOINT')
+COSMOS_KEY = os.environ.get('COSMOS_KEY')
+COSMOS_DATABASE = 'smart-space-db'
+COSMOS_CONTAINER_SENSOR = 'sensor-data'
+COSMOS_CONTAINER_ANALYSIS = 'analysis-data'
+
+# チャート用履歴データのデフォルト点数（0の場合は全件を返す）
+HISTORY_POINTS = int(os.environ.get('HISTORY_POINTS', 24))
+
+# NDJSONストリーミングで1回のスレッド呼び出しで取得する件数
+STREAM_BATCH_SIZE = 1000
+
+# レスポンスキャッシュの初期化（Flask版と同じ設定）
+MIN_COMPRESS_SIZE = int(os.environ.get('MIN_COMPRESS_SIZE', 1024))
+response_cache = ConditionalResponseCache(
+    max_age=int(os.environ.get('RESPONSE_CACHE_MAX_AGE', 300)),
+    min_compress_size=MIN_COMPRESS_SIZE,
+    enabled=os.environ.get('RESPONSE_CACHE_ENABLED', 'true').lower() == 'true'
+)
+
+# 非同期クライアント（起動時に初期化）
+cosmos_client_instance = None
+sensor_container = None
+analysis_container = None
+
+# 同期マネージャー（スレッドで実行）
+blob_storage = BlobStorageManager()
+ai_search = AISearchManager()
+iot_hub_manager = IoTHubManager()
+
+
+@app.before_serving
+async def initialize_clients():
+  """非同期クライアントを初期化"""
+  global cosmos_client_instance, sensor_container, analysis_container
+
+  cosmos_client_instance = CosmosClient(COSMOS_ENDPOINT, COSMOS_KEY)
+  database = cosmos_client_instance.get_database_client(COSMOS_DATABASE)
+  sensor_container = database.get_container_client(COSMOS_CONTAINER_SENSOR)
+  analysis_container = database.get_container_client(COSMOS_CONTAINER_ANALYSIS)
+  logger.info("非同期クライアント初期化完了")
+
+
+@app.after_serving
+async def close_clients():
+  """非同期クライアントを終了"""
+  if cosmos_client_instance:
+    await cosmos_client_instance.close()
+  await asyncio.to_thread(blob_storage.close)
+  await asyncio.to_thread(ai_search.close)
+  logger.info("非同期クライアント終了")
+
+
+@app.after_request
+async def compress_json_response(response):
+  """Accept-Encodingに応じてレスポンスを圧縮"""
+  return await compress_response_async(response, request, MIN_COMPRESS_SIZE)
+
+
+async def query_all(container, query):
+  """Cosmos DBクエリの結果を全件取得"""
+  return [item async for item in container.query_items(query=query)]
+
+
+async def latest_timestamp(container, condition=None):
+  """コンテナ内の最新ドキュメントの更新時刻（_ts）を取得"""
+  items = await query_all(container, latest_timestamp_query(condition))
+  return items[0] if items else None
+
+
+@app.route('/api/health', methods=['GET'])
+async def health_check():
+  """ヘルスチェック"""
+  return jsonify({
+      "status": "healthy",
+      "timestamp": datetime.utcnow().isoformat(),
+      "service": "Smart Space Dashboard API (async)"
+  })
+
+
+@app.route('/api/entrance/current', methods=['GET'])
+@response_cache.conditional_async(lambda: latest_timestamp(sensor_container))
+async def get_entrance_data():
+  """エントランスデータの取得（AITRIOS + Gemini）"""
+  try:
+    yesterday, _ = history_window()
+
+    # 3つのクエリを並行して実行
+    aitrios_items, gemini_items, hourly_items = await asyncio.gather(
+        query_all(sensor_container, AITRIOS_LATEST_QUERY),
+        query_all(sensor_container, GEMINI_LATEST_QUERY),
+        query_all(sensor_container, entrance_hourly_query(yesterday))
+    )
+
+    return jsonify(build_entrance_payload(aitrios_items, gemini_items, hourly_items))
+
+  except Exception as e:
+    return jsonify(entrance_error_payload(e)), 500
+
+
+@app.route('/api/room/environment', methods=['GET'])
+@response_cache.conditional_async(lambda: latest_timestamp(sensor_container, "c.deviceType = 'kaiteki'"))
+async def get_room_environment():
+  """部屋環境データの取得（快適君）"""
+  try:
+    points = parse_history_points(request.args.get('points'), HISTORY_POINTS)
+    yesterday, now = history_window()
+
+    kaiteki_items, history_items = await asyncio.gather(
+        query_all(sensor_container, KAITEKI_LATEST_QUERY),
+        query_all(sensor_container, room_history_query(yesterday))
+    )
+
+    return jsonify(build_room_payload(kaiteki_items, history_items, yesterday, now, points))
+
+  except Exception as e:
+    return jsonify(room_error_payload(e)), 500
+
+
+@app.route('/api/analytics/summary', methods=['GET'])
+@response_cache.conditional_async(lambda: latest_timestamp(analysis_container))
+async def get_analytics_summary():
+  """分析サマリーデータの取得"""
+  try:
+    analysis_items, anomaly_items = await asyncio.gather(
+        query_all(analysis_container, ANALYSIS_RECENT_QUERY),
+        query_all(analysis_container, ANOMALY_RECENT_QUERY)
+    )
+
+    return jsonify(build_summary_payload(analysis_items, anomaly_items))
+
+  except Exception as e:
+    return jsonify(summary_error_payload(e)), 500
+
+
+@app.route('/api/blob/sensor-data/<device_id>', methods=['GET'])
+async def get_sensor_data_from_blob(device_id):
+  """Blob Storageからセンサーデータを取得"""
+  try:
+    start_time = request.args.get('start_time')
+    end_time = request.args.get('end_time')
+
+    continuation_token = request.args.get('continuation_token')
+    if request.args.get('limit') or continuation_token:
+      limit = parse_page_size(request.args.get('limit'))
+      try:
+        data, next_token = await asyncio.to_thread(
+            blob_storage.get_sensor_data_page, device_id, start_time, end_time, limit, continuation_token
+        )
+      except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+      return jsonify({
+          "status": "success",
+          "data": data,
+          "count": len(data),
+          "continuationToken": next_token
+      }), 200
+
+    data = await asyncio.to_thread(blob_storage.get_sensor_data, device_id, start_time, end_time)
+
+    return jsonify({
+        "status": "success",
+        "data": data,
+        "count": len(data)
+    }), 200
+
+  except Exception as e:
+    logger.error(f"Blob Storage取得エラー: {e}")
+    return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route('/api/blob/analysis-data/<analysis_type>', methods=['GET'])
+async def get_analysis_data_from_blob(analysis_type):
+  """Blob Storageから分析データを取得"""
+  try:
+    start_time = request.args.get('start_time')
+    end_time = request.args.get('end_time')
+
+    data = await asyncio.to_thread(blob_storage.get_analysis_data, analysis_type, start_time, end_time)
+
+    return jsonify({
+        "status": "success",
+        "data": data,
+        "count": len(data)
+    }), 200
+
+  except Exception as e:
+    logger.error(f"Blob Storage取得エラー: {e}")
+    return jsonify({"status": "error", "message": str(e)}), 500
+
+
+async def search_response(search_text="", filters=None, order_by=None, top=50):
+  """
+  検索結果のレスポンスを作成（Flask版のsearch_responseと同じ処理をスレッドで実行）
+
+  select で取得するフィールドを指定でき、format=ndjson の場合は全件を1行ずつストリーミングし、
+  limit または continuation_token を指定した場合は1ページ分と次の継続トークンを返す。
+  ストリーミングの途中で検索に失敗した場合は、最後の行にエラーを出力して終了する。
+  """
+  select = request.args.get('select')
+  select = select.split(',') if select else None
+
+  if request.args.get('format') == 'ndjson':
+    documents = ai_search.iter_documents(search_text, filters, order_by, select)
+
+    def next_batch():
+      # 失敗前に取得できた結果も出力できるよう、例外は結果とともに返す
+      batch = []
+      try:
+        for result in itertools.islice(documents, STREAM_BATCH_SIZE):
+          batch.append(result)
+      except Exception as e:
+        return batch, e
+      return batch, None
+
+    async def generate():
+      while True:
+        batch, error = await asyncio.to_thread(next_batch)
+        if batch:
+          yield "".join(json.dumps(result, ensure_ascii=False, default=str) + "\n" for result in batch)
+        if error is not None:
+          logger.error(f"検索結果のストリーミングエラー: {error}")
+          yield json.dumps({"status": "error", "message": str(error)}, ensure_ascii=False) + "\n"
+          break
+        if not batch:
+          break
+
+    return Response(generate(), mimetype='application/x-ndjson')
+
+  continuation_token = request.args.get('continuation_token')
+  if request.args.get('limit') or continuation_token:
+    limit = parse_page_size(request.args.get('limit'), default=top)
+    try:
+      results, next_token = await asyncio.to_thread(
+          ai_search.search_page, search_text, filters, order_by, select, limit, continuation_token
+      )
+    except ValueError as e:
+      return jsonify({"status": "error", "message": str(e)}), 400
+
+    return jsonify({
+        "status": "success",
+        "results": results,
+        "count": len(results),
+        "continuationToken": next_token
+    }), 200
+
+  results = await asyncio.to_thread(ai_search.search_documents, search_text, filters, order_by, top, select)
+
+  return jsonify({
+      "status": "success",
+      "results": results,
+      "count": len(results)
+  }), 200
+
+
+@app.route('/api/search/query', methods=['GET'])
+async def search_documents():
+  """AI Searchでドキュメントを検索"""
+  try:
+    search_text = request.args.get('q', '')
+    filters = request.args.get('filters')
+    order_by = request.args.get('order_by')
+    top = int(request.args.get('top', 50))
+
+    if order_by:
+      order_by = order_by.split(',')
+
+    return await search_response(search_text, filters, order_by, top)
+
+  except Exception as e:
+    logger.error(f"AI Search検索エラー: {e}")
+    return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route('/api/search/facets/<field_name>', methods=['GET'])
+async def get_facets(field_name):
+  """ファセット検索"""
+  try:
+    count = int(request.args.get('count', 10))
+
+    facets = await asyncio.to_thread(ai_search.get_facets, field_name, count)
+
+    return jsonify({
+        "status": "success",
+        "facets": facets
+    }), 200
+
+  except Exception as e:
+    logger.error(f"AI Searchファセット検索エラー: {e}")
+    return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route('/api/iot/devices', methods=['GET'])
+async def get_iot_devices():
+  """IoT Hubデバイスリストを取得"""
+  try:
+    max_count = int(request.args.get('max_count', 100))
+    devices = await asyncio.to_thread(iot_hub_manager.get_device_list, max_count)
+
+    return jsonify({
+        "status": "success",
+        "devices": devices,
+        "count": len(devices)
+    }), 200
+
+  except Exception as e:
+    logger.error(f"IoT Hubデバイスリスト取得エラー: {e}")
+    return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route('/api/iot/statistics', methods=['GET'])
+async def get_iot_statistics():
+  """IoT Hub統計情報を取得"""
+  try:
+    stats = await asyncio.to_thread(iot_hub_manager.get_device_statistics)
+
+    return jsonify({
+        "status": "success",
+        "statistics": stats
+    }), 200
+
+  except Exception as e:
+    logger.error(f"IoT Hub統計情報取得エラー: {e}")
+    return jsonify({"status": "error", "message": str(e)}), 500
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Dashboard API 負荷ベンチマーク
+Flask版と非同期版のAPIに同時ポーリングを発生させ、スループットとレイテンシを比較する
+"""
+
+import asyncio
+import os
+import statistics
+import time
+
+import aiohttp
+
+
+class DashboardAPIBenchmark:
+  """Dashboard API ベンチマーククラス"""
+
+  def __init__(self):
+    # ベンチマーク設定
+    self.base_urls = [
+        url.strip() for url in
+        os.environ.get('BENCHMARK_BASE_URLS', 'http://localhost:5000,http://localhost:5001').split(',')
+        if url.strip()
+    ]
+    self.paths = [
+        path.strip() for path in
+        os.environ.get('BENCHMARK_PATHS', '/api/entrance/current,/api/room/environment,/api/analytics/summary').split(',')
+        if path.strip()
+    ]
+    self.concurrency = int(os.environ.get('BENCHMARK_CONCURRENCY', 200))
+    self.total_requests = int(os.environ.get('BENCHMARK_REQUESTS', 2000))
+    self.timeout = float(os.environ.get('BENCHMARK_TIMEOUT', 30))
+
+  async def run_client(self, session, base_url, counter, latencies, errors, validated):
+    """1クライアント分のポーリングを実行"""
+    while True:
+      index = counter[0]
+      if index >= self.total_requests:
+        return
+      counter[0] += 1
+
+      url = base_url + self.paths[index % len(self.paths)]
+      started = time.perf_counter()
+      try:
+        async with session.get(url) as response:
+          await response.read()
+          if response.status >= 500:
+            errors.append(response.status)
+          if 'ETag' in response.headers:
+            validated.append(url)
+      except Exception as e:
+        errors.append(str(e))
+      latencies.append(time.perf_counter() - started)
+
+  async def run_target(self, base_url):
+    """1つのAPIに対してベンチマークを実行"""
+    counter = [0]
+    latencies = []
+    errors = []
+    validated = []
+
+    timeout = aiohttp.ClientTimeout(total=self.timeout)
+    connector = aiohttp.TCPConnector(limit=self.concurrency)
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+      started = time.perf_counter()
+      await asyncio.gather(*[
+          self.run_client(session, base_url, counter, latencies, errors, validated)
+          for _ in range(self.concurrency)
+      ])
+      elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "baseUrl": base_url,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "cached": len(validated),
+        "elapsed": elapsed,
+        "throughput": len(latencies) / elapsed if elapsed else 0,
+        "p50": statistics.median(latencies) * 1000 if latencies else 0,
+        "p95": latencies[int(len(latencies) * 0.95) - 1] * 1000 if latencies else 0,
+        "p99": latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else 0
+    }
+
+  def print_result(self, result):
+    """ベンチマーク結果を出力"""
+    print(f"対象: {result['baseUrl']}")
+    print(f"  リクエスト数: {result['requests']} (エラー: {result['errors']}, ETag付き: {result['cached']})")
+    print(f"  所要時間: {result['elapsed']:.2f}秒")
+    print(f"  スループット: {result['throughput']:.1f} req/s")
+    print(f"  レイテンシ p50/p95/p99: {result['p50']:.1f} / {result['p95']:.1f} / {result['p99']:.1f} ms")
+    print()
+
+  async def run(self):
+    """全対象のベンチマークを順に実行"""
+    print(f"同時接続数: {self.concurrency}, 総リクエスト数: {self.total_requests}")
+    print(f"エンドポイント: {', '.join(self.paths)}")
+    print()
+
+    for base_url in self.base_urls:
+      result = await self.run_target(base_url)
+      self.print_result(result)
+
+
+# 使用例
+if __name__ == "__main__":
+  # Flask版: gunicorn -w 4 -b 0.0.0.0:5000 app:app
+  # 非同期版: hypercorn async_app:app --workers 4 --bind 0.0.0.0:5001
+  # 両方を同じ RESPONSE_CACHE_ENABLED で起動する（false でキャッシュなしの処理性能を比較）
+  benchmark = DashboardAPIBenchmark()
+  asyncio.run(benchmark.run())
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Blob Storage 読み取りベンチマーク
+Azurite（ローカルエミュレーター）上にセンサーデータを用意し、
+逐次ダウンロードと並行ダウンロードの所要時間を比較する
+"""
+
+import json
+import os
+import time
+from datetime import datetime, timedelta
+
+# Azuriteの既定接続文字列（STORAGE_CONNECTION_STRINGで上書き可能）
+AZURITE_CONNECTION_STRING = (
+    "DefaultEndpointsProtocol=http;AccountName=devstoreaccount1;"
+    "AccountKey=Eby8vdM02xNOcqFlqUwJPLlmEtlCDXJ1OUzFT50uSRZ6IFsuFq2UVErCz4I6tq/K1SZFPTOtr/KBHBeksoGMGw==;"
+    "BlobEndpoint=http://127.0.0.1:10000/devstoreaccount1;"
+)
+os.environ.setdefault('STORAGE_CONNECTION_STRING', AZURITE_CONNECTION_STRING)
+
+from azure.core.exceptions import ResourceExistsError  # noqa: E402
+
+from blob_layout import partitioned_blob_name  # noqa: E402
+from blob_storage import BlobStorageManager  # noqa: E402
+
+
+class BlobReadBenchmark:
+  """Blob Storage 読み取りベンチマーククラス"""
+
+  def __init__(self):
+    # ベンチマーク設定
+    self.device_id = os.environ.get('BENCHMARK_DEVICE_ID', 'benchmark-device')
+    self.blob_count = int(os.environ.get('BENCHMARK_BLOB_COUNT', 2880))
+    self.interval = int(os.environ.get('BENCHMARK_INTERVAL', 30))
+    self.concurrency_levels = [int(c) for c in os.environ.get('BENCHMARK_CONCURRENCY', '1,4,16,32').split(',')]
+
+    self.manager = BlobStorageManager()
+    self.start = datetime(2024, 1, 15)
+
+  def prepare(self):
+    """ベンチマーク用のセンサーデータを作成（1日分・30秒間隔）"""
+    try:
+      self.manager.sensor_container_client.create_container()
+    except ResourceExistsError:
+      pass
+
+    existing = sum(1 for _ in self.manager.sensor_container_client.list_blobs(name_starts_with=f"{self.device_id}/"))
+    if existing >= self.blob_count:
+      print(f"既存データを使用: {existing}件")
+      return
+
+    print(f"テストデータ作成中: {self.blob_count}件")
+    for i in range(self.blob_count):
+      timestamp = self.start + timedelta(seconds=self.interval * i)
+      blob_client = self.manager.sensor_container_client.get_blob_client(
+          partitioned_blob_name(self.device_id, timestamp)
+      )
+      blob_client.upload_blob(
+          json.dumps({
+              "device_id": self.device_id,
+              "timestamp": timestamp.isoformat(),
+              "data": {"temperature": 22.5, "humidity": 55, "co2": 450}
+          }),
+          overwrite=True
+      )
+
+  def run(self):
+    """同時ダウンロード数ごとの所要時間を計測"""
+    start_time = self.start.isoformat()
+    end_time = (self.start + timedelta(seconds=self.interval * self.blob_count)).isoformat()
+
+    for concurrency in self.concurrency_levels:
+      started = time.perf_counter()
+      count = sum(1 for _ in self.manager.iter_sensor_data(self.device_id, start_time, end_time, concurrency=concurrency))
+      elapsed = time.perf_counter() - started
+      print(f"同時ダウンロード数 {concurrency:>3}: {count}件 {elapsed:.2f}秒 ({count / elapsed:.1f} blobs/s)")
+
+
+# 使用例
+if __name__ == "__main__":
+  # 事前にAzuriteを起動: docker run -p 10000:10000 mcr.microsoft.com/azure-storage/azurite azurite-blob --blobHost 0.0.0.0
+  benchmark = BlobReadBenchmark()
+  benchmark.prepare()
+  benchmark.run()
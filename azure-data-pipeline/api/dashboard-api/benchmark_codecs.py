@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Blob 圧縮方式ベンチマーク
+センサーデータ・分析データ相当のJSONを圧縮方式ごとに変換し、
+サイズと圧縮・展開のスループットを比較する
+"""
+
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from blob_codecs import available_encodings, decode_blob, encode_blob
+
+
+class CodecBenchmark:
+  """Blob 圧縮方式ベンチマーククラス"""
+
+  def __init__(self):
+    # ベンチマーク設定
+    self.record_count = int(os.environ.get('BENCHMARK_RECORDS', 2880))
+    self.segment_size = int(os.environ.get('BENCHMARK_SEGMENT_SIZE', 500))
+    self.repeat = int(os.environ.get('BENCHMARK_REPEAT', 3))
+
+    self.start = datetime(2024, 1, 15)
+    random.seed(0)
+
+  def sensor_record(self, index):
+    """センサーデータ1件（upload_sensor_dataの保存形式）"""
+    timestamp = (self.start + timedelta(seconds=30 * index)).isoformat()
+    return {
+        "device_id": "kaiteki-001",
+        "timestamp": timestamp,
+        "uploaded_at": timestamp,
+        "data": {
+            "deviceNo": "kaiteki-001",
+            "temperature": round(random.uniform(20.0, 28.0), 1),
+            "humidity": round(random.uniform(40.0, 60.0), 1),
+            "pressure": round(random.uniform(1000.0, 1020.0), 1),
+            "co2": random.randint(400, 1200),
+            "illuminance": random.randint(100, 500),
+            "human": random.random() > 0.5,
+            "location": "会議室A"
+        }
+    }
+
+  def analysis_record(self, index):
+    """分析データ1件（upload_analysis_dataの保存形式）"""
+    timestamp = (self.start + timedelta(minutes=5 * index)).isoformat()
+    return {
+        "analysis_type": "environment",
+        "timestamp": timestamp,
+        "uploaded_at": timestamp,
+        "data": {
+            "windowEnd": timestamp,
+            "avgTemperature": round(random.uniform(20.0, 28.0), 2),
+            "avgHumidity": round(random.uniform(40.0, 60.0), 2),
+            "avgCo2": round(random.uniform(400.0, 1200.0), 2),
+            "anomalyStatus": random.choice(["Normal", "Normal", "Normal", "High CO2"]),
+            "comment": "換気を推奨します" if random.random() > 0.8 else "快適です"
+        }
+    }
+
+  def samples(self):
+    """比較対象のデータ（1件ごとのJSONと時間単位のNDJSONセグメント）"""
+    sensor = [self.sensor_record(i) for i in range(self.record_count)]
+    analysis = [self.analysis_record(i) for i in range(self.record_count)]
+
+    def segments(records):
+      return [
+          "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records[i:i + self.segment_size]).encode('utf-8')
+          for i in range(0, len(records), self.segment_size)
+      ]
+
+    return {
+        "sensor (1件/Blob)": [json.dumps(record, ensure_ascii=False).encode('utf-8') for record in sensor],
+        "sensor (NDJSONセグメント)": segments(sensor),
+        "analysis (1件/Blob)": [json.dumps(record, ensure_ascii=False).encode('utf-8') for record in analysis]
+    }
+
+  def measure(self, blobs, encoding):
+    """1つの圧縮方式のサイズと処理時間を計測"""
+    original = sum(len(blob) for blob in blobs)
+
+    encode_time = decode_time = 0.0
+    for _ in range(self.repeat):
+      started = time.perf_counter()
+      encoded = [encode_blob(blob, encoding) for blob in blobs]
+      encode_time += time.perf_counter() - started
+
+      started = time.perf_counter()
+      for blob in encoded:
+        decode_blob(blob, encoding)
+      decode_time += time.perf_counter() - started
+
+    compressed = sum(len(blob) for blob in encoded)
+    megabytes = original * self.repeat / (1024 * 1024)
+    return {
+        "original": original,
+        "compressed": compressed,
+        "ratio": compressed / original if original else 0,
+        "encode": megabytes / encode_time if encode_time else 0,
+        "decode": megabytes / decode_time if decode_time else 0
+    }
+
+  def run(self):
+    """全データ・全圧縮方式のベンチマークを実行"""
+    encodings = available_encodings()
+    print(f"件数: {self.record_count}, 圧縮方式: {', '.join(encodings)}")
+    print()
+
+    for name, blobs in self.samples().items():
+      print(f"{name}: {len(blobs)} Blob")
+      for encoding in encodings:
+        result = self.measure(blobs, encoding)
+        print(f"  {encoding:>8}: {result['compressed'] / 1024:>9.1f} KiB ({result['ratio'] * 100:5.1f}%)"
+              f"  圧縮 {result['encode']:>7.1f} MB/s  展開 {result['decode']:>7.1f} MB/s")
+      print()
+
+
+# 使用例
+if __name__ == "__main__":
+  benchmark = CodecBenchmark()
+  benchmark.run()
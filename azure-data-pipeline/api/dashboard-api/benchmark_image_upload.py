@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Blob Storage 画像アップロードベンチマーク
+Azurite（ローカルエミュレーター）上に1〜20 MB相当の画像をアップロードし、
+1回のアップロードとブロック分割の並行アップロードのスループットを比較する
+"""
+
+import os
+import time
+
+# Azuriteの既定接続文字列（STORAGE_CONNECTION_STRINGで上書き可能）
+AZURITE_CONNECTION_STRING = (
+    "DefaultEndpointsProtocol=http;AccountName=devstoreaccount1;"
+    "AccountKey=Eby8vdM02xNOcqFlqUwJPLlmEtlCDXJ1OUzFT50uSRZ6IFsuFq2UVErCz4I6tq/K1SZFPTOtr/KBHBeksoGMGw==;"
+    "BlobEndpoint=http://127.0.0.1:10000/devstoreaccount1;"
+)
+os.environ.setdefault('STORAGE_CONNECTION_STRING', AZURITE_CONNECTION_STRING)
+
+from azure.core.exceptions import ResourceExistsError  # noqa: E402
+from azure.storage.blob import ContentSettings  # noqa: E402
+
+from blob_storage import BlobStorageManager  # noqa: E402
+from blob_upload import upload_in_blocks  # noqa: E402
+
+
+class ImageUploadBenchmark:
+  """Blob Storage 画像アップロードベンチマーククラス"""
+
+  def __init__(self):
+    # ベンチマーク設定
+    self.sizes = [int(s) for s in os.environ.get('BENCHMARK_IMAGE_SIZES_MB', '1,5,10,20').split(',')]
+    self.block_size = int(os.environ.get('BENCHMARK_BLOCK_SIZE', 4 * 1024 * 1024))
+    self.concurrency_levels = [int(c) for c in os.environ.get('BENCHMARK_CONCURRENCY', '2,4,8').split(',')]
+    self.repeat = int(os.environ.get('BENCHMARK_REPEAT', 3))
+
+    self.manager = BlobStorageManager()
+    self.content_settings = ContentSettings(content_type='image/jpeg')
+
+  def prepare(self):
+    """ベンチマーク用のコンテナを作成"""
+    try:
+      self.manager.image_container_client.create_container()
+    except ResourceExistsError:
+      pass
+
+  def measure(self, blob_name, data, upload):
+    """1つのアップロード方式のスループット（MB/s）を計測"""
+    blob_client = self.manager.image_container_client.get_blob_client(blob_name)
+
+    started = time.perf_counter()
+    for _ in range(self.repeat):
+      upload(blob_client, data)
+    elapsed = time.perf_counter() - started
+
+    return len(data) * self.repeat / (1024 * 1024) / elapsed
+
+  def run(self):
+    """画像サイズ・アップロード方式ごとのスループットを計測"""
+    print(f"ブロックサイズ: {self.block_size / (1024 * 1024):.1f} MiB, 繰り返し: {self.repeat}回")
+    print()
+
+    for size in self.sizes:
+      data = os.urandom(size * 1024 * 1024)
+      blob_name = f"benchmark/frame_{size}mb.jpg"
+      print(f"{size} MB:")
+
+      single = self.measure(blob_name, data, lambda client, payload: client.upload_blob(
+          payload, overwrite=True, max_concurrency=1, content_settings=self.content_settings
+      ))
+      print(f"  1回のアップロード       : {single:>7.1f} MB/s")
+
+      for concurrency in self.concurrency_levels:
+        chunked = self.measure(blob_name, data, lambda client, payload: upload_in_blocks(
+            client, payload, block_size=self.block_size, concurrency=concurrency,
+            content_settings=self.content_settings
+        ))
+        print(f"  ブロック分割（同時{concurrency:>2}）: {chunked:>7.1f} MB/s ({chunked / single:.2f}倍)")
+      print()
+
+
+# 使用例
+if __name__ == "__main__":
+  # 事前にAzuriteを起動: docker run -p 10000:10000 mcr.microsoft.com/azure-storage/azurite azurite-blob --blobHost 0.0.0.0
+  benchmark = ImageUploadBenchmark()
+  benchmark.prepare()
+  benchmark.run()
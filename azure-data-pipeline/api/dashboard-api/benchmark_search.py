@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+AI Search 検索ベンチマーク
+ローカル検索（SQLite）またはAzure AI Searchにテストドキュメントを登録し、
+バッチ登録のスループットとダッシュボードが使用する検索のレイテンシを計測する
+"""
+
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+# 既定ではローカル検索を使用（SEARCH_BACKEND=azureでAzure AI Searchを計測）
+os.environ.setdefault('SEARCH_BACKEND', 'local')
+os.environ.setdefault('SEARCH_LOCAL_PATH', 'benchmark-search.db')
+# キャッシュの効果を除いて計測する
+os.environ.setdefault('SEARCH_CACHE_TTL', '0')
+
+from ai_search import AISearchManager  # noqa: E402
+
+
+class SearchBenchmark:
+  """AI Search 検索ベンチマーククラス"""
+
+  def __init__(self):
+    # ベンチマーク設定
+    self.document_count = int(os.environ.get('BENCHMARK_DOCUMENTS', 100000))
+    self.device_count = int(os.environ.get('BENCHMARK_DEVICES', 50))
+    self.repeat = int(os.environ.get('BENCHMARK_REPEAT', 20))
+
+    self.manager = AISearchManager()
+    self.start = datetime(2024, 1, 1)
+    random.seed(0)
+
+  def document(self, index):
+    """テストドキュメント1件（upload_documentの入力形式）"""
+    return {
+        "id": f"benchmark-{index}",
+        "deviceId": f"kaiteki-{index % self.device_count:03d}",
+        "deviceType": "aitrios" if index % 5 == 0 else "kaiteki",
+        "timestamp": (self.start + timedelta(seconds=30 * index)).isoformat() + "Z",
+        "temperature": round(random.uniform(18.0, 30.0), 1),
+        "humidity": round(random.uniform(40.0, 60.0), 1),
+        "co2": random.randint(400, 1200),
+        "personCount": random.randint(0, 20),
+        "data": {"comment": "換気を推奨します" if random.random() > 0.8 else "快適です"}
+    }
+
+  def prepare(self):
+    """テストドキュメントを登録し、バッチ登録のスループットを表示"""
+    self.manager.create_index_if_not_exists()
+
+    count = self.manager.search_client.search(search_text="*", top=0, include_total_count=True).get_count() or 0
+    if count >= self.document_count:
+      print(f"既存データを使用: {count}件")
+      return
+
+    print(f"テストデータ登録中: {self.document_count}件")
+    started = time.perf_counter()
+    for i in range(self.document_count):
+      self.manager.upload_document(self.document(i))
+    self.manager.flush()
+    elapsed = time.perf_counter() - started
+    print(f"登録: {elapsed:.2f}秒 ({self.document_count / elapsed:.0f} docs/s)")
+    print()
+
+  def queries(self):
+    """計測する検索（ダッシュボード・APIが使用する条件）"""
+    end = self.start + timedelta(seconds=30 * self.document_count)
+    device_id = f"kaiteki-{self.device_count // 2:03d}"
+    window_start = (end - timedelta(days=1)).strftime('%Y-%m-%dT%H:%M:%SZ')
+    window_end = end.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+    return {
+        "デバイス別（1日・1ページ）": lambda: self.manager.search_page(
+            **self.manager.device_query(device_id, window_start, window_end),
+            select=["timestamp", "temperature", "co2"], limit=100),
+        "デバイスタイプ別（50件）": lambda: self.manager.search_by_device_type("aitrios"),
+        "温度範囲（50件）": lambda: self.manager.search_by_temperature_range(25.0, 26.0),
+        "人数範囲（50件）": lambda: self.manager.search_by_person_count(10, 12),
+        "全文検索（50件）": lambda: self.manager.search_documents("換気"),
+        "ファセット（deviceId）": lambda: self.manager.get_facets("deviceId", 100),
+        "統計情報": self.manager.get_statistics
+    }
+
+  def run(self):
+    """検索ごとのレイテンシを計測"""
+    for name, query in self.queries().items():
+      latencies = []
+      for _ in range(self.repeat):
+        started = time.perf_counter()
+        query()
+        latencies.append((time.perf_counter() - started) * 1000)
+      latencies.sort()
+      p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+      print(f"{name}: 平均 {statistics.mean(latencies):7.2f} ms  p95 {p95:7.2f} ms")
+
+    self.manager.close()
+
+
+# 使用例
+if __name__ == "__main__":
+  benchmark = SearchBenchmark()
+  benchmark.prepare()
+  benchmark.run()
@@ -0,0 +1,295 @@
+"""
+Blobアーカイブモジュール
+確定済みの日のセンサーデータをデバイス・日単位のParquetファイルに変換し、
+列の射影と行グループの統計情報を使って必要な部分だけを読み取る機能
+"""
+
+import io
+import logging
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+try:
+  import pyarrow as pa
+  import pyarrow.compute as pc
+  import pyarrow.parquet as pq
+except ImportError:
+  # pyarrow未インストール時はアーカイブ機能を無効化
+  pa = None
+  pc = None
+  pq = None
+
+from blob_layout import day_prefix
+from downsampling import parse_timestamp
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_EXTENSION = "parquet"
+
+# 数値列（センサーデータのdataフィールド名）
+ARCHIVE_FLOAT_FIELDS = ['temperature', 'humidity', 'co2', 'pressure', 'illuminance']
+ARCHIVE_INT_FIELDS = ['personCount']
+
+
+def archive_available() -> bool:
+  """
+  アーカイブ機能が利用可能か
+
+  Returns:
+      bool: pyarrowがインストールされている場合True
+  """
+  return pa is not None
+
+
+def archive_schema():
+  """
+  アーカイブファイルのスキーマを取得
+
+  Returns:
+      pyarrow.Schema: 時刻・デバイスIDと型付きの数値列
+  """
+  fields = [
+      pa.field('timestamp', pa.timestamp('ms')),
+      pa.field('device_id', pa.string())
+  ]
+  fields += [pa.field(name, pa.float64()) for name in ARCHIVE_FLOAT_FIELDS]
+  fields += [pa.field(name, pa.int64()) for name in ARCHIVE_INT_FIELDS]
+  return pa.schema(fields)
+
+
+def archive_blob_name(key: str, day: datetime) -> str:
+  """
+  デバイス・日単位のアーカイブBlob名を取得
+
+  Args:
+      key: デバイスID
+      day: 対象日（UTC）
+
+  Returns:
+      str: {key}/{yyyy}/{mm}/{dd}/{yyyy-mm-dd}.parquet
+  """
+  return f"{day_prefix(key, day)}{day:%Y-%m-%d}.{ARCHIVE_EXTENSION}"
+
+
+def is_archive_blob(blob_name: str) -> bool:
+  """
+  アーカイブBlobかどうか
+
+  Args:
+      blob_name: Blob名
+
+  Returns:
+      bool: アーカイブBlobの場合True
+  """
+  return blob_name.endswith(f".{ARCHIVE_EXTENSION}")
+
+
+def _number(value, cast):
+  """数値に変換（変換できない場合None）"""
+  if value is None or isinstance(value, bool):
+    return None
+  try:
+    return cast(value)
+  except (TypeError, ValueError):
+    return None
+
+
+def build_archive_table(records: List[Dict[str, Any]]):
+  """
+  センサーデータのリストをアーカイブ用のテーブルに変換
+
+  Args:
+      records: Blobから取得したセンサーデータ（時刻順）
+
+  Returns:
+      pyarrow.Table: アーカイブ用のテーブル（時刻順）
+  """
+  columns: Dict[str, List[Any]] = {name: [] for name in archive_schema().names}
+
+  for record in records:
+    timestamp = parse_timestamp(record.get('timestamp'))
+    if timestamp is None:
+      continue
+    data = record.get('data') or {}
+
+    columns['timestamp'].append(timestamp)
+    columns['device_id'].append(record.get('device_id'))
+    for name in ARCHIVE_FLOAT_FIELDS:
+      columns[name].append(_number(data.get(name), float))
+    for name in ARCHIVE_INT_FIELDS:
+      columns[name].append(_number(data.get(name), int))
+
+  table = pa.Table.from_pydict(columns, schema=archive_schema())
+  return table.sort_by('timestamp')
+
+
+def write_archive(table, row_group_size: int = 4096) -> bytes:
+  """
+  テーブルをParquet形式に変換
+
+  時刻順のテーブルを一定行数の行グループに分けて書き込むため、
+  各行グループの時刻の最小値・最大値で読み取り範囲を絞り込める。
+
+  Args:
+      table: アーカイブ用のテーブル
+      row_group_size: 1行グループあたりの行数
+
+  Returns:
+      bytes: Parquetファイルの内容
+  """
+  sink = io.BytesIO()
+  pq.write_table(table, sink, row_group_size=row_group_size, compression='zstd', write_statistics=True)
+  return sink.getvalue()
+
+
+class BlobRangeFile(io.RawIOBase):
+  """
+  Blobを範囲指定ダウンロードで読み取るファイルオブジェクト
+
+  Parquetリーダーがフッターと必要な列チャンクだけを読み取れるよう、
+  readのたびに該当範囲のみをダウンロードする。
+  """
+
+  def __init__(self, blob_client, size: int):
+    """
+    初期化
+
+    Args:
+        blob_client: 読み取るBlobのクライアント
+        size: Blobのサイズ（バイト）
+    """
+    super().__init__()
+    self.blob_client = blob_client
+    self.size = size
+    self.position = 0
+
+  def readable(self) -> bool:
+    return True
+
+  def seekable(self) -> bool:
+    return True
+
+  def tell(self) -> int:
+    return self.position
+
+  def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+    if whence == io.SEEK_CUR:
+      offset += self.position
+    elif whence == io.SEEK_END:
+      offset += self.size
+    self.position = max(0, min(offset, self.size))
+    return self.position
+
+  def readinto(self, buffer) -> int:
+    length = min(len(buffer), self.size - self.position)
+    if length <= 0:
+      return 0
+
+    content = self.blob_client.download_blob(offset=self.position, length=length).readall()
+    buffer[:len(content)] = content
+    self.position += len(content)
+    return len(content)
+
+
+def _statistics_range(row_group, column_index: int) -> Optional[Tuple[Any, Any]]:
+  """行グループの列の最小値・最大値を取得（統計情報がない場合None）"""
+  statistics = row_group.column(column_index).statistics
+  if statistics is None or not statistics.has_min_max:
+    return None
+  return statistics.min, statistics.max
+
+
+def _row_group_matches(row_group, column_indexes: Dict[str, int], ranges: Dict[str, Tuple[Any, Any]]) -> bool:
+  """行グループの統計情報が全ての条件と重なるか"""
+  for name, (low, high) in ranges.items():
+    stats = _statistics_range(row_group, column_indexes[name])
+    if stats is None:
+      continue
+    minimum, maximum = stats
+    if low is not None and maximum < low:
+      return False
+    if high is not None and minimum > high:
+      return False
+  return True
+
+
+def read_archive(source, columns: Optional[List[str]] = None,
+                 ranges: Optional[Dict[str, Tuple[Any, Any]]] = None) -> Tuple[Any, int, int]:
+  """
+  アーカイブファイルから条件に合う行を読み取る
+
+  行グループの統計情報が条件と重ならない行グループは読み取らず、
+  読み取った行グループも指定列のみを取得する。
+
+  Args:
+      source: Parquetファイル（ファイルオブジェクト）
+      columns: 取得する列（未指定時は全列）
+      ranges: 列名ごとの (最小値, 最大値) の条件（Noneは制限なし）
+
+  Returns:
+      Tuple[pyarrow.Table, int, int]: 条件に合う行、読み取った行グループ数、全行グループ数
+  """
+  ranges = ranges or {}
+  parquet_file = pq.ParquetFile(source)
+  metadata = parquet_file.metadata
+  schema = parquet_file.schema_arrow
+  column_indexes = {name: schema.get_field_index(name) for name in ranges}
+
+  unknown = [name for name, index in column_indexes.items() if index < 0]
+  if unknown:
+    raise ValueError(f"存在しない列が指定されました: {', '.join(unknown)}")
+
+  # 条件の判定に使う列も読み取り、絞り込み後に射影する
+  projection = list(columns) if columns else schema.names
+  read_columns = projection + [name for name in ranges if name not in projection]
+
+  row_groups = [
+      index for index in range(metadata.num_row_groups)
+      if _row_group_matches(metadata.row_group(index), column_indexes, ranges)
+  ]
+
+  if not row_groups:
+    return schema.empty_table().select(projection), 0, metadata.num_row_groups
+
+  table = parquet_file.read_row_groups(row_groups, columns=read_columns)
+
+  mask = None
+  for name, (low, high) in ranges.items():
+    for condition in ((pc.greater_equal(table[name], low) if low is not None else None),
+                      (pc.less_equal(table[name], high) if high is not None else None)):
+      if condition is not None:
+        mask = condition if mask is None else pc.and_(mask, condition)
+  if mask is not None:
+    table = table.filter(mask)
+
+  return table.select(projection), len(row_groups), metadata.num_row_groups
+
+
+def concat_archives(tables: List[Any]):
+  """
+  日ごとに読み取ったテーブルを結合
+
+  Args:
+      tables: 時刻順に並んだテーブルのリスト
+
+  Returns:
+      pyarrow.Table: 結合したテーブル
+  """
+  return pa.concat_tables(tables)
+
+
+def archive_records(table) -> List[Dict[str, Any]]:
+  """
+  テーブルをJSONに変換可能な辞書のリストに変換
+
+  Args:
+      table: アーカイブから読み取ったテーブル
+
+  Returns:
+      List[Dict[str, Any]]: 行のリスト（時刻はISO形式）
+  """
+  rows = table.to_pylist()
+  for row in rows:
+    if isinstance(row.get('timestamp'), datetime):
+      row['timestamp'] = row['timestamp'].isoformat()
+  return rows
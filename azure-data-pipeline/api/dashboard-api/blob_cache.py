@@ -0,0 +1,148 @@
+"""
+Blob読み取りキャッシュモジュール
+確定済み（更新されない時間帯）のBlobの内容をBlob名とETagをキーにメモリ上に保持する機能
+"""
+
+import threading
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+
+from blob_layout import blob_timestamp
+from blob_segments import is_segment_blob, segment_time_range
+
+logger = logging.getLogger(__name__)
+
+
+def blob_closed_at(blob_name: str) -> Optional[datetime]:
+  """
+  Blobが対象とする時間帯の終了時刻を取得
+
+  Args:
+      blob_name: Blob名
+
+  Returns:
+      Optional[datetime]: 終了時刻（UTC、時刻を取得できない場合None）
+  """
+  timestamp = blob_timestamp(blob_name)
+  if timestamp is None:
+    return None
+  if is_segment_blob(blob_name):
+    return segment_time_range(timestamp)[1]
+  return timestamp
+
+
+class BlobRecordCache:
+  """確定済みBlobのLRUキャッシュクラス"""
+
+  def __init__(self, max_bytes: int = 64 * 1024 * 1024, close_delay: float = 300.0):
+    """
+    初期化
+
+    Args:
+        max_bytes: 保持するBlobの合計サイズの上限（バイト）
+        close_delay: 時間帯の終了後、確定済みとみなすまでの秒数
+    """
+    self.max_bytes = max_bytes
+    self.close_delay = close_delay
+
+    self._lock = threading.Lock()
+    self._entries: "OrderedDict[Tuple[str, str, str], Tuple[List[Dict[str, Any]], int]]" = OrderedDict()
+    self._size = 0
+    self._hits = 0
+    self._misses = 0
+
+  def is_cacheable(self, blob_name: str, now: Optional[datetime] = None) -> bool:
+    """
+    キャッシュ対象（確定済みの時間帯）のBlobかどうか
+
+    Args:
+        blob_name: Blob名
+        now: 基準時刻（UTC、未指定時は現在時刻）
+
+    Returns:
+        bool: キャッシュ対象の場合True
+    """
+    if self.max_bytes <= 0:
+      return False
+    closed_at = blob_closed_at(blob_name)
+    if closed_at is None:
+      return False
+    return closed_at + timedelta(seconds=self.close_delay) <= (now or datetime.utcnow())
+
+  def get(self, container: str, blob_name: str, etag: Optional[str]) -> Optional[List[Dict[str, Any]]]:
+    """
+    キャッシュからデータを取得
+
+    Args:
+        container: コンテナ名
+        blob_name: Blob名
+        etag: 一覧取得時のETag
+
+    Returns:
+        Optional[List[Dict[str, Any]]]: データのリスト（キャッシュにない場合None）
+    """
+    if not etag:
+      return None
+
+    key = (container, blob_name, etag)
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is None:
+        self._misses += 1
+        return None
+      self._entries.move_to_end(key)
+      self._hits += 1
+      return entry[0]
+
+  def put(self, container: str, blob_name: str, etag: Optional[str], records: List[Dict[str, Any]], size: int):
+    """
+    データをキャッシュに追加
+
+    Args:
+        container: コンテナ名
+        blob_name: Blob名
+        etag: ダウンロードしたBlobのETag
+        records: データのリスト
+        size: Blobの展開後のサイズ（バイト）
+    """
+    if not etag or size > self.max_bytes:
+      return
+
+    key = (container, blob_name, etag)
+    with self._lock:
+      previous = self._entries.pop(key, None)
+      if previous:
+        self._size -= previous[1]
+
+      self._entries[key] = (records, size)
+      self._size += size
+
+      while self._size > self.max_bytes:
+        _, (_, evicted_size) = self._entries.popitem(last=False)
+        self._size -= evicted_size
+
+  def clear(self):
+    """キャッシュを全て削除"""
+    with self._lock:
+      self._entries.clear()
+      self._size = 0
+
+  def stats(self) -> Dict[str, Any]:
+    """
+    キャッシュの統計情報を取得
+
+    Returns:
+        Dict[str, Any]: 件数・サイズ・ヒット率
+    """
+    with self._lock:
+      requests = self._hits + self._misses
+      return {
+          "entries": len(self._entries),
+          "bytes": self._size,
+          "maxBytes": self.max_bytes,
+          "hits": self._hits,
+          "misses": self._misses,
+          "hitRate": self._hits / requests if requests else 0.0
+      }
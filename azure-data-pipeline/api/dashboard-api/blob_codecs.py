@@ -0,0 +1,123 @@
+"""
+Blob圧縮モジュール
+JSON/NDJSONのBlobをgzipまたはzstdで圧縮して保存し、読み取り時に透過的に展開する機能
+"""
+
+import gzip
+import io
+import logging
+from typing import List, Optional
+
+try:
+  import zstandard
+except ImportError:
+  # zstandard未インストール時はgzipのみ対応
+  zstandard = None
+
+logger = logging.getLogger(__name__)
+
+IDENTITY = "identity"
+GZIP = "gzip"
+ZSTD = "zstd"
+
+# 圧縮データの先頭バイト（転送時に展開済みかどうかの判定に使用）
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+
+def available_encodings() -> List[str]:
+  """
+  利用可能な圧縮方式を取得
+
+  Returns:
+      List[str]: 圧縮方式のリスト
+  """
+  encodings = [IDENTITY, GZIP]
+  if zstandard is not None:
+    encodings.append(ZSTD)
+  return encodings
+
+
+def resolve_encoding(name: Optional[str]) -> str:
+  """
+  設定値から使用する圧縮方式を決定
+
+  未対応の方式やzstandard未インストール時のzstdはgzipまたは無圧縮に置き換える。
+
+  Args:
+      name: 圧縮方式（identity / gzip / zstd）
+
+  Returns:
+      str: 使用する圧縮方式
+  """
+  name = (name or IDENTITY).lower()
+  if name in ("", "none"):
+    return IDENTITY
+  if name == ZSTD and zstandard is None:
+    logger.warning("zstandardがインストールされていないためgzipで圧縮します")
+    return GZIP
+  if name not in (IDENTITY, GZIP, ZSTD):
+    logger.warning(f"未対応の圧縮方式です: {name}（無圧縮で保存します）")
+    return IDENTITY
+  return name
+
+
+def content_encoding(encoding: str) -> Optional[str]:
+  """
+  BlobのContent-Encodingに設定する値を取得
+
+  Args:
+      encoding: 圧縮方式
+
+  Returns:
+      Optional[str]: Content-Encoding（無圧縮の場合None）
+  """
+  return None if encoding == IDENTITY else encoding
+
+
+def encode_blob(data: bytes, encoding: str) -> bytes:
+  """
+  Blobの内容を圧縮
+
+  gzipメンバーとzstdフレームはそれぞれ連結しても1つのデータとして展開できるため、
+  追記Blobのブロックごとに圧縮してもよい。
+
+  Args:
+      data: 圧縮前の内容
+      encoding: 圧縮方式
+
+  Returns:
+      bytes: 圧縮後の内容
+  """
+  if encoding == GZIP:
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+  if encoding == ZSTD:
+    return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+  return data
+
+
+def decode_blob(content: bytes, encoding: Optional[str] = None) -> bytes:
+  """
+  Blobの内容を展開
+
+  Content-Encodingに従って展開する。転送時に展開済みの場合など、
+  内容が圧縮データでなければそのまま返す。
+
+  Args:
+      content: Blobの内容
+      encoding: BlobのContent-Encoding
+
+  Returns:
+      bytes: 展開後の内容
+  """
+  if encoding == GZIP and content.startswith(GZIP_MAGIC):
+    return gzip.decompress(content)
+  if encoding == ZSTD and content.startswith(ZSTD_MAGIC):
+    if zstandard is None:
+      raise ValueError("zstdで圧縮されたBlobを展開するにはzstandardが必要です")
+    reader = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(content), read_across_frames=True)
+    return reader.read()
+  return content
@@ -0,0 +1,166 @@
+"""
+Blobレイアウトモジュール
+日付階層（{key}/{yyyy}/{mm}/{dd}/{hh}/...）のBlob名と範囲読み取り用プレフィックスの計算機能
+"""
+
+import re
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from downsampling import parse_timestamp
+
+TIMESTAMP_PATTERN = re.compile(r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(\.\d+)?')
+
+
+def hour_prefix(key: str, timestamp: datetime) -> str:
+  """
+  時間単位のパーティションプレフィックスを取得
+
+  Args:
+      key: デバイスIDまたは分析タイプ
+      timestamp: 時刻（UTC）
+
+  Returns:
+      str: {key}/{yyyy}/{mm}/{dd}/{hh}/ 形式のプレフィックス
+  """
+  return f"{key}/{timestamp:%Y/%m/%d/%H}/"
+
+
+def day_prefix(key: str, timestamp: datetime) -> str:
+  """
+  日単位のパーティションプレフィックスを取得
+
+  Args:
+      key: デバイスIDまたは分析タイプ
+      timestamp: 時刻（UTC）
+
+  Returns:
+      str: {key}/{yyyy}/{mm}/{dd}/ 形式のプレフィックス
+  """
+  return f"{key}/{timestamp:%Y/%m/%d}/"
+
+
+def partitioned_blob_name(key: str, timestamp: datetime, extension: str = "json") -> str:
+  """
+  日付階層レイアウトのBlob名を生成
+
+  Args:
+      key: デバイスIDまたは分析タイプ
+      timestamp: 時刻（UTC）
+      extension: 拡張子
+
+  Returns:
+      str: {key}/{yyyy}/{mm}/{dd}/{hh}/{timestamp}.{extension}
+  """
+  return f"{hour_prefix(key, timestamp)}{timestamp.isoformat()}.{extension}"
+
+
+def blob_timestamp(blob_name: str) -> Optional[datetime]:
+  """
+  Blob名のファイル名部分から時刻を取得
+
+  Args:
+      blob_name: Blob名
+
+  Returns:
+      Optional[datetime]: 時刻（UTC、取得できない場合None）
+  """
+  match = TIMESTAMP_PATTERN.match(blob_name.rsplit('/', 1)[-1])
+  return parse_timestamp(match.group(0)) if match else None
+
+
+def day_range(start: datetime, end: datetime) -> List[datetime]:
+  """
+  [start, end]に含まれる日の一覧を取得
+
+  Args:
+      start: 開始時刻（UTC）
+      end: 終了時刻（UTC）
+
+  Returns:
+      List[datetime]: 各日の0時
+  """
+  days = []
+  day = start.replace(hour=0, minute=0, second=0, microsecond=0)
+  while day <= end:
+    days.append(day)
+    day += timedelta(days=1)
+  return days
+
+
+def _next_boundary(cursor: datetime, unit: str) -> datetime:
+  """指定単位の次の区切り時刻を取得"""
+  if unit == "year":
+    return cursor.replace(year=cursor.year + 1, month=1, day=1, hour=0)
+  if unit == "month":
+    if cursor.month == 12:
+      return cursor.replace(year=cursor.year + 1, month=1, day=1, hour=0)
+    return cursor.replace(month=cursor.month + 1, day=1, hour=0)
+  if unit == "day":
+    return cursor.replace(hour=0) + timedelta(days=1)
+  return cursor + timedelta(hours=1)
+
+
+def _is_aligned(cursor: datetime, unit: str) -> bool:
+  """時刻が指定単位の先頭かどうか"""
+  if unit == "year":
+    return cursor.month == 1 and cursor.day == 1 and cursor.hour == 0
+  if unit == "month":
+    return cursor.day == 1 and cursor.hour == 0
+  return cursor.hour == 0
+
+
+def _range_units(start: datetime, end: datetime) -> List[tuple]:
+  """[start, end]を年・月・日・時の単位に分割"""
+  units = []
+  cursor = start.replace(minute=0, second=0, microsecond=0)
+
+  while cursor <= end:
+    for unit in ("year", "month", "day"):
+      boundary = _next_boundary(cursor, unit)
+      # 範囲に完全に含まれる単位はまとめて1プレフィックスにする
+      if _is_aligned(cursor, unit) and boundary - timedelta(microseconds=1) <= end:
+        units.append((unit, cursor))
+        cursor = boundary
+        break
+    else:
+      units.append(("hour", cursor))
+      cursor = _next_boundary(cursor, "hour")
+
+  return units
+
+
+def covering_prefixes(key: str, start: datetime, end: datetime, include_legacy: bool = False,
+                      include_partitioned: bool = True) -> List[str]:
+  """
+  [start, end]を覆う最小限のプレフィックス集合を計算
+
+  範囲の中間は年・月・日単位のプレフィックスにまとめ、端だけ時間単位とするため、
+  一覧取得の回数と件数は要求範囲の長さに比例する。
+
+  Args:
+      key: デバイスIDまたは分析タイプ
+      start: 開始時刻（UTC）
+      end: 終了時刻（UTC）
+      include_legacy: 旧レイアウト（{key}/{timestamp}.json）のプレフィックスも含める
+      include_partitioned: 日付階層レイアウトのプレフィックスを含める
+
+  Returns:
+      List[str]: プレフィックスのリスト
+  """
+  formats = {
+      "year": ("%Y/", "%Y-"),
+      "month": ("%Y/%m/", "%Y-%m-"),
+      "day": ("%Y/%m/%d/", "%Y-%m-%dT"),
+      "hour": ("%Y/%m/%d/%H/", "%Y-%m-%dT%H:")
+  }
+
+  prefixes = []
+  for unit, cursor in _range_units(start, end):
+    partitioned_format, legacy_format = formats[unit]
+    if include_partitioned:
+      prefixes.append(f"{key}/{cursor.strftime(partitioned_format)}")
+    if include_legacy:
+      prefixes.append(f"{key}/{cursor.strftime(legacy_format)}")
+
+  return prefixes
@@ -0,0 +1,295 @@
+"""
+Blobマニフェストモジュール
+キー（デバイスID・分析タイプ）・日単位のマニフェストに書き込んだBlobの一覧を記録し、
+一覧取得なしで読み取り対象の解決と日別の統計を行う機能
+"""
+
+import json
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+from azure.core import MatchConditions
+from azure.core.exceptions import AzureError, ResourceExistsError, ResourceModifiedError, ResourceNotFoundError
+from azure.storage.blob import ContentSettings
+
+from blob_layout import day_prefix, day_range
+from downsampling import parse_timestamp
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILENAME = "_manifest.json"
+
+
+def manifest_blob_name(key: str, day: datetime) -> str:
+  """
+  キー・日単位のマニフェストBlob名を取得
+
+  Args:
+      key: デバイスIDまたは分析タイプ
+      day: 対象日（UTC）
+
+  Returns:
+      str: {key}/{yyyy}/{mm}/{dd}/_manifest.json
+  """
+  return f"{day_prefix(key, day)}{MANIFEST_FILENAME}"
+
+
+def _is_complete(manifest: Dict[str, Any]) -> bool:
+  """マニフェストがその日の全Blobを記録しているかどうか（記録に失敗した日・作成前のBlobがある日はFalse）"""
+  return manifest.get("complete", True)
+
+
+def _merge_entry(entry: Optional[Dict[str, Any]], update: Dict[str, Any]) -> Dict[str, Any]:
+  """
+  マニフェストのBlobエントリに書き込み結果を反映
+
+  件数とサイズは加算し、ETagは追記ブロック数が最も大きい書き込みのものを採用する
+  （複数ワーカーの更新順序が前後しても最新のETagが残る）。
+  """
+  if entry is None:
+    return dict(update)
+
+  merged = dict(entry)
+  merged["records"] = entry.get("records", 0) + update.get("records", 0)
+  merged["bytes"] = entry.get("bytes", 0) + update.get("bytes", 0)
+  merged["first"] = min(entry["first"], update["first"])
+  merged["last"] = max(entry["last"], update["last"])
+  if update.get("sequence", 0) >= entry.get("sequence", 0):
+    merged["etag"] = update.get("etag")
+    merged["sequence"] = update.get("sequence", 0)
+  return merged
+
+
+class ManifestStore:
+  """Blobマニフェスト管理クラス"""
+
+  def __init__(self, container_client, max_retries: int = 10, concurrency: int = 8):
+    """
+    初期化
+
+    Args:
+        container_client: マニフェストを保存するコンテナクライアント
+        max_retries: 同時更新が競合した場合の再試行回数
+        concurrency: 複数日のマニフェストを並行に取得する数
+    """
+    self.container_client = container_client
+    self.max_retries = max_retries
+    self.concurrency = concurrency
+
+    # 不完全の記録も保存できなかったマニフェスト（このプロセスでは一覧取得で補う）
+    self._lock = threading.Lock()
+    self._incomplete: set = set()
+
+  def load(self, key: str, day: datetime) -> Optional[Dict[str, Any]]:
+    """
+    マニフェストを取得
+
+    Args:
+        key: デバイスIDまたは分析タイプ
+        day: 対象日（UTC）
+
+    Returns:
+        Optional[Dict[str, Any]]: マニフェスト（存在しない場合None）
+    """
+    manifest, _ = self._download(key, day)
+    return manifest
+
+  def record(self, key: str, day: datetime, blob_name: str, first: datetime, last: datetime,
+             records: int, size: int, etag: Optional[str] = None, sequence: int = 0,
+             existing: Optional[Callable[[], List[str]]] = None):
+    """
+    書き込み結果をマニフェストに反映
+
+    ETagによる楽観的同時実行制御で更新し、他のワーカーと競合した場合は再読み込みして再試行する。
+    再試行しても更新できない場合や保存に失敗した場合は、その日のマニフェストを不完全として記録する。
+
+    Args:
+        key: デバイスIDまたは分析タイプ
+        day: 対象日（UTC）
+        blob_name: 書き込んだBlob名
+        first: 書き込んだデータの最初の時刻（UTC）
+        last: 書き込んだデータの最後の時刻（UTC）
+        records: 書き込んだ件数
+        size: 書き込んだバイト数
+        etag: 書き込み後のBlobのETag
+        sequence: 書き込み後の追記ブロック数（ETagの新旧の判定に使用）
+        existing: その日のマニフェストを作成する際に、既存のBlob名を返す関数
+                  （マニフェスト導入前・他の書き込み元のBlobがある場合は不完全として作成する）
+    """
+    update = {
+        "first": first.isoformat(),
+        "last": last.isoformat(),
+        "records": records,
+        "bytes": size,
+        "etag": etag,
+        "sequence": sequence
+    }
+
+    try:
+      for _ in range(self.max_retries):
+        manifest, manifest_etag = self._download(key, day)
+        if manifest is None:
+          manifest = {"key": key, "day": day.strftime('%Y-%m-%d'), "blobs": {}}
+          if existing is not None and any(name != blob_name for name in existing()):
+            manifest["complete"] = False
+
+        manifest["blobs"][blob_name] = _merge_entry(manifest["blobs"].get(blob_name), update)
+
+        if self._upload(key, day, manifest, manifest_etag):
+          return
+
+      logger.error(f"マニフェストの更新が競合により失敗しました: {manifest_blob_name(key, day)}")
+    except AzureError as e:
+      logger.error(f"マニフェスト更新エラー: {blob_name}: {e}")
+
+    self.mark_incomplete(key, day)
+
+  def mark_incomplete(self, key: str, day: datetime):
+    """
+    マニフェストを不完全として記録（その日の読み取りは一覧取得で行う）
+
+    保存にも失敗した場合は、このプロセス内でのみ不完全として扱う。
+    rebuild_manifests による再構築で完全な状態に戻る。
+
+    Args:
+        key: デバイスIDまたは分析タイプ
+        day: 対象日（UTC）
+    """
+    with self._lock:
+      self._incomplete.add((key, day))
+
+    try:
+      for _ in range(self.max_retries):
+        manifest, manifest_etag = self._download(key, day)
+        if manifest is None:
+          manifest = {"key": key, "day": day.strftime('%Y-%m-%d'), "blobs": {}}
+        elif not _is_complete(manifest):
+          return
+        manifest["complete"] = False
+
+        if self._upload(key, day, manifest, manifest_etag):
+          return
+      logger.error(f"マニフェストを不完全として記録できませんでした: {manifest_blob_name(key, day)}")
+    except AzureError as e:
+      logger.error(f"マニフェストを不完全として記録できませんでした: {manifest_blob_name(key, day)}: {e}")
+
+  def replace(self, key: str, day: datetime, blobs: Dict[str, Dict[str, Any]]):
+    """
+    マニフェストを置き換える（再構築用）
+
+    Args:
+        key: デバイスIDまたは分析タイプ
+        day: 対象日（UTC）
+        blobs: Blob名ごとのエントリ
+    """
+    manifest = {"key": key, "day": day.strftime('%Y-%m-%d'), "blobs": blobs}
+    self.container_client.get_blob_client(manifest_blob_name(key, day)).upload_blob(
+        json.dumps(manifest, ensure_ascii=False, separators=(',', ':')),
+        overwrite=True,
+        content_settings=ContentSettings(content_type='application/json')
+    )
+    with self._lock:
+      self._incomplete.discard((key, day))
+
+  def resolve(self, key: str, start: datetime, end: datetime,
+              open_from: Optional[datetime] = None) -> Tuple[List[Tuple[datetime, str, Optional[str]]], List[datetime]]:
+    """
+    マニフェストから時刻範囲に含まれるBlobを解決
+
+    各日のマニフェストは並行に取得する。
+
+    Args:
+        key: デバイスIDまたは分析タイプ
+        start: 開始時刻（UTC）
+        end: 終了時刻（UTC）
+        open_from: この時刻以降の日は書き込み中としてマニフェストを使用しない
+
+    Returns:
+        Tuple[List[Tuple[datetime, str, Optional[str]]], List[datetime]]:
+            (最初の時刻, Blob名, ETag) のリストと、一覧取得が必要な日
+            （マニフェストがない・不完全・書き込み中の日）のリスト
+    """
+    blobs = []
+    missing_days = []
+
+    days = day_range(start, end)
+    closed_days = [day for day in days if open_from is None or day + timedelta(days=1) <= open_from]
+    with ThreadPoolExecutor(max_workers=max(1, min(self.concurrency, len(closed_days)))) as executor:
+      manifests = dict(zip(closed_days, executor.map(lambda day: self.load(key, day), closed_days)))
+
+    for day in days:
+      manifest = manifests.get(day)
+      if manifest is None or not self._complete(key, day, manifest):
+        missing_days.append(day)
+        continue
+
+      for blob_name, entry in manifest["blobs"].items():
+        first = parse_timestamp(entry["first"])
+        last = parse_timestamp(entry["last"])
+        if last < start or first > end:
+          continue
+        blobs.append((first, blob_name, entry.get("etag")))
+
+    return blobs, missing_days
+
+  def daily_stats(self, key: str, start: datetime, end: datetime) -> List[Dict[str, Any]]:
+    """
+    日別の統計をマニフェストから取得（データはダウンロードしない）
+
+    Args:
+        key: デバイスIDまたは分析タイプ
+        start: 開始時刻（UTC）
+        end: 終了時刻（UTC）
+
+    Returns:
+        List[Dict[str, Any]]: 日ごとの件数・サイズ・Blob数・時刻範囲
+    """
+    stats = []
+    for day in day_range(start, end):
+      manifest = self.load(key, day)
+      entries = list(manifest["blobs"].values()) if manifest else []
+      stats.append({
+          "day": day.strftime('%Y-%m-%d'),
+          "indexed": manifest is not None and self._complete(key, day, manifest),
+          "blobs": len(entries),
+          "records": sum(entry.get("records", 0) for entry in entries),
+          "bytes": sum(entry.get("bytes", 0) for entry in entries),
+          "first": min((entry["first"] for entry in entries), default=None),
+          "last": max((entry["last"] for entry in entries), default=None)
+      })
+    return stats
+
+  def _complete(self, key: str, day: datetime, manifest: Dict[str, Any]) -> bool:
+    """マニフェストが完全かどうか（保存できなかった不完全の記録を含めて判定）"""
+    with self._lock:
+      if (key, day) in self._incomplete:
+        return False
+    return _is_complete(manifest)
+
+  def _download(self, key: str, day: datetime) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """マニフェストとETagを取得"""
+    blob_client = self.container_client.get_blob_client(manifest_blob_name(key, day))
+    try:
+      downloader = blob_client.download_blob()
+      return json.loads(downloader.readall()), downloader.properties.etag
+    except ResourceNotFoundError:
+      return None, None
+
+  def _upload(self, key: str, day: datetime, manifest: Dict[str, Any], etag: Optional[str]) -> bool:
+    """マニフェストを条件付きで保存（競合した場合False）"""
+    blob_client = self.container_client.get_blob_client(manifest_blob_name(key, day))
+    content = json.dumps(manifest, ensure_ascii=False, separators=(',', ':'))
+    content_settings = ContentSettings(content_type='application/json')
+
+    try:
+      if etag:
+        blob_client.upload_blob(content, overwrite=True, content_settings=content_settings,
+                                etag=etag, match_condition=MatchConditions.IfNotModified)
+      else:
+        blob_client.upload_blob(content, overwrite=False, content_settings=content_settings)
+      return True
+    except (ResourceModifiedError, ResourceExistsError):
+      return False
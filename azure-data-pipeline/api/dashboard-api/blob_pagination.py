@@ -0,0 +1,73 @@
+"""
+Blobページングモジュール
+時刻順の読み取り位置（Blob名と行番号）を継続トークンとして表現する機能
+"""
+
+import base64
+import binascii
+import json
+from typing import Optional, Tuple
+
+# 1ページあたりの件数の上限
+MAX_PAGE_SIZE = 5000
+
+
+def encode_continuation_token(blob_name: str, index: int) -> str:
+  """
+  読み取り位置を継続トークンに変換
+
+  Args:
+      blob_name: 次に読み取るBlob名
+      index: Blob内の次に読み取るデータの位置
+
+  Returns:
+      str: URLセーフな継続トークン
+  """
+  payload = json.dumps({"b": blob_name, "i": index}, separators=(',', ':')).encode('utf-8')
+  return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+
+def decode_continuation_token(token: Optional[str]) -> Optional[Tuple[str, int]]:
+  """
+  継続トークンを読み取り位置に変換
+
+  Args:
+      token: 継続トークン
+
+  Returns:
+      Optional[Tuple[str, int]]: (Blob名, Blob内の位置)（トークン未指定時None）
+
+  Raises:
+      ValueError: 不正なトークンの場合
+  """
+  if not token:
+    return None
+
+  try:
+    padded = token + '=' * (-len(token) % 4)
+    payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    blob_name, index = payload["b"], int(payload["i"])
+  except (binascii.Error, UnicodeError, ValueError, KeyError, TypeError):
+    raise ValueError("不正な継続トークンです")
+
+  if not isinstance(blob_name, str) or index < 0:
+    raise ValueError("不正な継続トークンです")
+  return blob_name, index
+
+
+def parse_page_size(value: Optional[str], default: int = 1000) -> int:
+  """
+  ページサイズを解析
+
+  Args:
+      value: リクエストパラメータの値
+      default: 未指定時の件数
+
+  Returns:
+      int: 1〜MAX_PAGE_SIZEの件数
+  """
+  try:
+    size = int(value) if value else default
+  except ValueError:
+    size = default
+  return max(1, min(size, MAX_PAGE_SIZE))
@@ -0,0 +1,223 @@
+"""
+Blob保持期間管理モジュール
+保持期間を過ぎたデータを日付プレフィックス単位で一覧取得し、バッチ削除する機能
+"""
+
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Callable
+
+from blob_archive import is_archive_blob
+from blob_layout import covering_prefixes
+
+logger = logging.getLogger(__name__)
+
+# 1回のバッチ要求で削除できるBlobの上限
+MAX_BATCH_DELETE = 256
+
+
+class RetentionPolicy:
+  """コンテナごとの保持ポリシー"""
+
+  def __init__(self, name: str, container_client, days: int, key_depth: int = 1,
+               partitioned: bool = True, legacy: bool = True, keep_archives: bool = False):
+    """
+    初期化
+
+    Args:
+        name: ポリシー名（進捗報告に使用）
+        container_client: 対象のコンテナクライアント
+        days: 保持日数
+        key_depth: Blob名の時刻部分より前の階層数（センサーデータは1、画像は2）
+        partitioned: 日付階層レイアウト（{key}/{yyyy}/{mm}/...）のBlobを対象とする
+        legacy: 旧レイアウト（{key}/{timestamp}...）のBlobを対象とする
+        keep_archives: Parquetアーカイブを削除しない
+    """
+    self.name = name
+    self.container_client = container_client
+    self.days = days
+    self.key_depth = key_depth
+    self.partitioned = partitioned
+    self.legacy = legacy
+    self.keep_archives = keep_archives
+
+  def cutoff(self, now: Optional[datetime] = None) -> datetime:
+    """
+    削除対象の境界時刻を取得
+
+    Args:
+        now: 基準時刻（UTC、未指定時は現在時刻）
+
+    Returns:
+        datetime: この日時より前のデータを削除する（日の0時）
+    """
+    today = (now or datetime.utcnow()).replace(hour=0, minute=0, second=0, microsecond=0)
+    return today - timedelta(days=self.days)
+
+
+class RetentionEngine:
+  """保持期間を過ぎたBlobの削除を管理するクラス"""
+
+  def __init__(self, policies: List[RetentionPolicy], concurrency: int = 8,
+               batch_size: int = MAX_BATCH_DELETE, progress: Optional[Callable[[Dict[str, Any]], None]] = None):
+    """
+    初期化
+
+    Args:
+        policies: コンテナごとの保持ポリシー
+        concurrency: 同時に実行するバッチ削除の数
+        batch_size: 1回のバッチ要求で削除する件数（最大256）
+        progress: プレフィックスごとの進捗を受け取るコールバック
+    """
+    self.policies = policies
+    self.concurrency = max(1, concurrency)
+    self.batch_size = max(1, min(batch_size, MAX_BATCH_DELETE))
+    self.progress = progress
+
+  def run(self, now: Optional[datetime] = None) -> Dict[str, Dict[str, int]]:
+    """
+    全ポリシーの削除を実行
+
+    Args:
+        now: 基準時刻（UTC、未指定時は現在時刻）
+
+    Returns:
+        Dict[str, Dict[str, int]]: ポリシーごとの削除件数・失敗件数・プレフィックス数
+    """
+    results = {}
+    with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+      for policy in self.policies:
+        results[policy.name] = self.apply(policy, executor, now)
+    return results
+
+  def apply(self, policy: RetentionPolicy, executor: ThreadPoolExecutor,
+            now: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    1つのポリシーの削除を実行
+
+    期限切れの範囲を年・月・日単位のプレフィックスにまとめて一覧取得し、
+    一覧取得と並行してバッチ削除を行う。
+
+    Args:
+        policy: 保持ポリシー
+        executor: バッチ削除を実行するスレッドプール
+        now: 基準時刻（UTC、未指定時は現在時刻）
+
+    Returns:
+        Dict[str, int]: 削除件数・失敗件数・プレフィックス数
+    """
+    cutoff = policy.cutoff(now)
+    prefixes = self.expired_prefixes(policy, cutoff)
+    result = {"deleted": 0, "failed": 0, "prefixes": len(prefixes)}
+
+    logger.info(f"保持期間の適用開始: {policy.name} ({cutoff:%Y-%m-%d}より前, {len(prefixes)}プレフィックス)")
+
+    def collect(future):
+      deleted, failed = future.result()
+      result["deleted"] += deleted
+      result["failed"] += failed
+
+    for index, prefix in enumerate(prefixes, start=1):
+      pending = deque()
+      for batch in self._batches(policy, prefix):
+        pending.append(executor.submit(self._delete_batch, policy.container_client, batch))
+        # 一覧取得が削除より先行しすぎないよう、実行中のバッチ数を制限する
+        if len(pending) >= self.concurrency * 2:
+          collect(pending.popleft())
+      while pending:
+        collect(pending.popleft())
+
+      self._report({
+          "policy": policy.name,
+          "prefix": prefix,
+          "completed": index,
+          "total": len(prefixes),
+          "deleted": result["deleted"],
+          "failed": result["failed"]
+      })
+
+    logger.info(f"保持期間の適用完了: {policy.name} ({result['deleted']}件削除, {result['failed']}件失敗)")
+    return result
+
+  def expired_prefixes(self, policy: RetentionPolicy, cutoff: datetime) -> List[str]:
+    """
+    期限切れの範囲を覆うプレフィックスを取得
+
+    キーごとに最も古いBlobの年から境界時刻までを、年・月・日単位のプレフィックスにまとめる。
+
+    Args:
+        policy: 保持ポリシー
+        cutoff: 削除対象の境界時刻
+
+    Returns:
+        List[str]: プレフィックスのリスト
+    """
+    end = cutoff - timedelta(microseconds=1)
+    prefixes = []
+
+    for key in self._list_keys(policy.container_client, policy.key_depth):
+      oldest = self._oldest_year(policy.container_client, key)
+      if oldest is None or oldest > end.year:
+        continue
+      prefixes.extend(covering_prefixes(key, datetime(oldest, 1, 1), end,
+                                        include_legacy=policy.legacy, include_partitioned=policy.partitioned))
+
+    return prefixes
+
+  def _batches(self, policy: RetentionPolicy, prefix: str):
+    """プレフィックス配下のBlob名をバッチ単位で返す"""
+    batch = []
+    for blob in policy.container_client.list_blobs(name_starts_with=prefix):
+      if policy.keep_archives and is_archive_blob(blob.name):
+        continue
+      batch.append(blob.name)
+      if len(batch) >= self.batch_size:
+        yield batch
+        batch = []
+    if batch:
+      yield batch
+
+  @staticmethod
+  def _delete_batch(container_client, blob_names: List[str]) -> tuple:
+    """1回のバッチ要求で削除し、成功件数と失敗件数を返す"""
+    deleted = failed = 0
+    for response in container_client.delete_blobs(*blob_names, raise_on_any_failure=False):
+      # 202: 削除成功、404: 削除済み
+      if response.status_code in (202, 404):
+        deleted += 1
+      else:
+        failed += 1
+    return deleted, failed
+
+  @staticmethod
+  def _list_keys(container_client, depth: int) -> List[str]:
+    """指定階層までのキーを一覧取得"""
+    keys = [""]
+    for _ in range(depth):
+      keys = [
+          item.name.rstrip('/')
+          for key in keys
+          for item in container_client.walk_blobs(name_starts_with=f"{key}/" if key else None, delimiter='/')
+          if item.name.endswith('/')
+      ]
+    return keys
+
+  @staticmethod
+  def _oldest_year(container_client, key: str) -> Optional[int]:
+    """キー配下で最も古いBlobの年を取得（名前順の先頭1件のみ参照）"""
+    first = next(iter(container_client.walk_blobs(name_starts_with=f"{key}/", delimiter='/')), None)
+    if first is None:
+      return None
+    year = first.name[len(key) + 1:len(key) + 5]
+    return int(year) if year.isdigit() else None
+
+  def _report(self, progress: Dict[str, Any]):
+    """進捗を報告"""
+    logger.info(
+        f"保持期間の適用中: {progress['policy']} {progress['completed']}/{progress['total']} "
+        f"({progress['prefix']}, 累計{progress['deleted']}件削除)"
+    )
+    if self.progress:
+      self.progress(progress)
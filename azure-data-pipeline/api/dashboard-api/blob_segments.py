@@ -0,0 +1,338 @@
+"""
+Blobセグメント書き込みモジュール
+読み取りデータをデバイス・時間単位でバッファし、追記BlobのNDJSONセグメントにまとめて書き込む機能
+"""
+
+import json
+import threading
+import time
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Tuple, Callable
+
+from azure.core import MatchConditions
+from azure.core.exceptions import AzureError, ResourceExistsError, ResourceNotFoundError
+from azure.storage.blob import ContentSettings
+
+from blob_codecs import IDENTITY, GZIP, ZSTD, content_encoding, encode_blob
+from blob_layout import hour_prefix
+
+logger = logging.getLogger(__name__)
+
+# 追記Blobの1ブロックの上限（4 MiB）
+MAX_APPEND_BLOCK_SIZE = 4 * 1024 * 1024
+
+SEGMENT_EXTENSION = "ndjson"
+
+# 圧縮方式ごとの拡張子（方式の異なるブロックが同じセグメントに混在しないようにする）
+SEGMENT_SUFFIXES = {IDENTITY: "", GZIP: ".gz", ZSTD: ".zst"}
+
+
+def segment_blob_name(key: str, timestamp: datetime, encoding: str = IDENTITY) -> str:
+  """
+  時間単位のセグメントBlob名を取得
+
+  Args:
+      key: デバイスID
+      timestamp: 時刻（UTC）
+      encoding: 圧縮方式
+
+  Returns:
+      str: {key}/{yyyy}/{mm}/{dd}/{hh}/{yyyy-mm-ddThh}:00:00.ndjson[.gz|.zst]
+  """
+  hour_start = timestamp.replace(minute=0, second=0, microsecond=0)
+  return f"{hour_prefix(key, timestamp)}{hour_start.isoformat()}.{SEGMENT_EXTENSION}{SEGMENT_SUFFIXES[encoding]}"
+
+
+def is_segment_blob(blob_name: str) -> bool:
+  """
+  セグメントBlobかどうか
+
+  Args:
+      blob_name: Blob名
+
+  Returns:
+      bool: セグメントBlobの場合True
+  """
+  return f".{SEGMENT_EXTENSION}" in blob_name.rsplit('/', 1)[-1]
+
+
+class SegmentWriter:
+  """NDJSONセグメント書き込み管理クラス"""
+
+  def __init__(self, container_client, max_records: int = 500, max_bytes: int = 1024 * 1024,
+               flush_interval: float = 60.0, encoding: str = IDENTITY,
+               on_append: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+               max_pending_bytes: int = 64 * 1024 * 1024, spill_path: Optional[str] = None):
+    """
+    初期化
+
+    Args:
+        container_client: 書き込み先のコンテナクライアント
+        max_records: 1セグメントあたりのバッファ件数の上限
+        max_bytes: 1セグメントあたりのバッファサイズの上限（バイト）
+        flush_interval: バッファを保持する最大秒数
+        encoding: ブロックの圧縮方式
+        on_append: 書き込み後に (Blob名, 書き込み結果) を受け取るコールバック
+        max_pending_bytes: 書き込みに失敗して再送待ちのデータを含むバッファ全体の上限（バイト）
+        spill_path: 上限を超えて破棄するデータの退避先ファイル（未指定時は破棄のみ）
+    """
+    self.container_client = container_client
+    self.max_records = max_records
+    self.max_bytes = max_bytes
+    self.flush_interval = flush_interval
+    self.encoding = encoding
+    self.on_append = on_append
+    self.max_pending_bytes = max_pending_bytes
+    self.spill_path = spill_path
+
+    self._lock = threading.Lock()
+    self._buffers: Dict[str, Dict[str, Any]] = {}
+    self._dropped = 0
+    self._stop_event = threading.Event()
+
+    self._flush_thread = threading.Thread(target=self._flush_loop, daemon=True)
+    self._flush_thread.start()
+
+  def append(self, key: str, timestamp: datetime, record: Dict[str, Any]) -> str:
+    """
+    読み取りデータをバッファに追加
+
+    件数またはサイズの上限に達したセグメントは即座に書き込む。
+
+    Args:
+        key: デバイスID
+        timestamp: 読み取り時刻（UTC）
+        record: 保存するデータ
+
+    Returns:
+        str: 書き込み先のセグメントBlob名
+    """
+    blob_name = segment_blob_name(key, timestamp, self.encoding)
+    line = json.dumps(record, ensure_ascii=False) + "\n"
+
+    with self._lock:
+      buffer = self._buffers.setdefault(blob_name, {
+          "key": key, "lines": [], "bytes": 0, "first": timestamp, "last": timestamp, "created": time.monotonic()
+      })
+      buffer["lines"].append(line)
+      buffer["bytes"] += len(line.encode('utf-8'))
+      buffer["first"] = min(buffer["first"], timestamp)
+      buffer["last"] = max(buffer["last"], timestamp)
+      full = len(buffer["lines"]) >= self.max_records or buffer["bytes"] >= self.max_bytes
+
+    if full:
+      self.flush(blob_name)
+
+    return blob_name
+
+  def flush(self, blob_name: Optional[str] = None) -> int:
+    """
+    バッファをセグメントBlobに書き込む
+
+    Args:
+        blob_name: 対象のセグメント（未指定時は全セグメント）
+
+    Returns:
+        int: 書き込んだ件数
+    """
+    with self._lock:
+      names = [blob_name] if blob_name else list(self._buffers)
+      pending = [(name, self._buffers.pop(name)) for name in names if name in self._buffers]
+
+    written = 0
+    for name, buffer in pending:
+      size, response, committed, error = self._append_lines(name, buffer["lines"])
+      written += committed
+
+      if error is not None:
+        # 書き込み済みのブロックの行は再送せず、残りの行のみを戻す
+        logger.error(f"セグメント書き込みエラー ({committed}/{len(buffer['lines'])}件書き込み済み): {error}")
+        remaining = buffer["lines"][committed:]
+        self._requeue(name, dict(buffer, lines=remaining, bytes=sum(len(line.encode('utf-8')) for line in remaining)))
+      else:
+        logger.info(f"セグメントに書き込みました: {name} ({committed}件)")
+
+      if committed and self.on_append:
+        try:
+          self.on_append(name, {
+              "key": buffer["key"],
+              "first": buffer["first"],
+              "last": buffer["last"],
+              "records": committed,
+              "bytes": size,
+              "etag": response.get("etag"),
+              "sequence": response.get("blob_committed_block_count") or 0
+          })
+        except AzureError as e:
+          # データは書き込み済みのため再送しない
+          logger.error(f"セグメント書き込み後の処理エラー: {e}")
+
+    return written
+
+  def pending_count(self) -> int:
+    """
+    未書き込みの件数を取得
+
+    Returns:
+        int: バッファ内の件数
+    """
+    with self._lock:
+      return sum(len(buffer["lines"]) for buffer in self._buffers.values())
+
+  def dropped_count(self) -> int:
+    """
+    バッファの上限を超えて破棄（または退避）した件数を取得
+
+    Returns:
+        int: 破棄した件数
+    """
+    with self._lock:
+      return self._dropped
+
+  def close(self):
+    """定期書き込みを停止し、残りのバッファを書き込む"""
+    self._stop_event.set()
+    self._flush_thread.join(timeout=self.flush_interval)
+    self.flush()
+
+  def _flush_loop(self):
+    """保持時間を超えたバッファを定期的に書き込む"""
+    check_interval = max(1.0, self.flush_interval / 4)
+    while not self._stop_event.wait(check_interval):
+      now = time.monotonic()
+      with self._lock:
+        expired = [name for name, buffer in self._buffers.items() if now - buffer["created"] >= self.flush_interval]
+      for name in expired:
+        self.flush(name)
+
+  def _append_lines(self, blob_name: str, lines: List[str]) -> Tuple[int, Dict[str, Any], int, Optional[AzureError]]:
+    """
+    行を4 MiB以下のブロックにまとめて追記Blobに書き込む
+
+    Returns:
+        Tuple: 書き込んだバイト数・最後の応答・書き込んだ行数・途中で失敗した場合のエラー
+    """
+    blob_client = self.container_client.get_blob_client(blob_name)
+    size = 0
+    committed = 0
+    response: Dict[str, Any] = {}
+
+    for block, line_count in self._blocks(lines):
+      # ブロックごとに圧縮する（連結したgzipメンバー・zstdフレームとして展開できる）
+      block = encode_blob(block, self.encoding)
+      try:
+        try:
+          response = blob_client.append_block(block)
+        except ResourceNotFoundError:
+          # その時間の最初の書き込みで追記Blobを作成する（他ワーカーが作成済みなら上書きしない）
+          try:
+            blob_client.create_append_blob(
+                content_settings=ContentSettings(
+                    content_type='application/x-ndjson',
+                    content_encoding=content_encoding(self.encoding)
+                ),
+                match_condition=MatchConditions.IfMissing
+            )
+          except ResourceExistsError:
+            pass
+          response = blob_client.append_block(block)
+      except AzureError as e:
+        return size, response, committed, e
+
+      size += len(block)
+      committed += line_count
+
+    return size, response, committed, None
+
+  @staticmethod
+  def _blocks(lines: List[str]) -> List[Tuple[bytes, int]]:
+    """行の境界を保ったままブロックに分割し、ブロックと行数の組を返す"""
+    blocks = []
+    current: List[bytes] = []
+    size = 0
+    for line in lines:
+      encoded = line.encode('utf-8')
+      if current and size + len(encoded) > MAX_APPEND_BLOCK_SIZE:
+        blocks.append((b"".join(current), len(current)))
+        current, size = [], 0
+      current.append(encoded)
+      size += len(encoded)
+    if current:
+      blocks.append((b"".join(current), len(current)))
+    return blocks
+
+  def _requeue(self, blob_name: str, buffer: Dict[str, Any]):
+    """
+    書き込みに失敗した行を先頭に戻して次回再送する
+
+    バッファ全体が max_pending_bytes を超える場合は、戻す行のうち古いものから破棄する
+    （spill_path の指定時はファイルに退避する）。
+    """
+    with self._lock:
+      pending_bytes = sum(current["bytes"] for current in self._buffers.values())
+      overflow = pending_bytes + buffer["bytes"] - self.max_pending_bytes
+      dropped: List[str] = []
+      while overflow > 0 and buffer["lines"]:
+        line = buffer["lines"].pop(0)
+        line_bytes = len(line.encode('utf-8'))
+        buffer["bytes"] -= line_bytes
+        overflow -= line_bytes
+        dropped.append(line)
+      self._dropped += len(dropped)
+
+      if buffer["lines"]:
+        current = self._buffers.get(blob_name)
+        if current:
+          buffer["lines"].extend(current["lines"])
+          buffer["bytes"] += current["bytes"]
+          buffer["first"] = min(buffer["first"], current["first"])
+          buffer["last"] = max(buffer["last"], current["last"])
+        self._buffers[blob_name] = buffer
+
+    if dropped:
+      self._spill(blob_name, dropped)
+
+  def _spill(self, blob_name: str, lines: List[str]):
+    """上限を超えた行をファイルに退避（未指定時はエラーログのみ）"""
+    if not self.spill_path:
+      logger.error(f"セグメントのバッファが上限を超えたため{len(lines)}件を破棄しました: {blob_name}")
+      return
+
+    try:
+      with open(self.spill_path, "a", encoding="utf-8") as spill_file:
+        for line in lines:
+          spill_file.write(f'{{"blob": {json.dumps(blob_name)}, "record": {line.rstrip()}}}\n')
+      logger.error(f"セグメントのバッファが上限を超えたため{len(lines)}件を退避しました: {self.spill_path} ({blob_name})")
+    except OSError as e:
+      logger.error(f"セグメントのバッファが上限を超えたため{len(lines)}件を破棄しました: {blob_name} (退避エラー: {e})")
+
+
+def parse_segment(content: bytes) -> List[Dict[str, Any]]:
+  """
+  NDJSONセグメントを解析
+
+  Args:
+      content: セグメントの内容
+
+  Returns:
+      List[Dict[str, Any]]: データのリスト
+  """
+  records = []
+  for line in content.decode('utf-8').splitlines():
+    if line.strip():
+      records.append(json.loads(line))
+  return records
+
+
+def segment_time_range(timestamp: datetime) -> Tuple[datetime, datetime]:
+  """
+  セグメントが対象とする時間範囲を取得
+
+  Args:
+      timestamp: セグメントBlob名の時刻（時間の先頭）
+
+  Returns:
+      Tuple[datetime, datetime]: 開始時刻と終了時刻（終了時刻は含まない）
+  """
+  return timestamp, timestamp + timedelta(hours=1)
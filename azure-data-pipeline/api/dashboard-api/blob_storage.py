@@ -6,10 +6,31 @@ Azure Blob Storageを使用したデータ保存・取得機能
 import os
 import json
 import logging
-from datetime import datetime
-from typing import Dict, Any, Optional, List
-from azure.storage.blob import BlobServiceClient
-from azure.core.exceptions import AzureError
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, List, Iterator, Tuple, Callable
+from azure.storage.blob import BlobServiceClient, ContentSettings
+from azure.core.exceptions import AzureError, ResourceExistsError, ResourceNotFoundError
+
+from blob_archive import (
+    BlobRangeFile,
+    archive_available,
+    archive_blob_name,
+    build_archive_table,
+    concat_archives,
+    read_archive,
+    write_archive
+)
+from blob_cache import BlobRecordCache
+from blob_codecs import content_encoding, decode_blob, encode_blob, resolve_encoding
+from blob_layout import partitioned_blob_name, blob_timestamp, covering_prefixes, day_range
+from blob_manifest import ManifestStore, manifest_blob_name
+from blob_pagination import decode_continuation_token, encode_continuation_token
+from blob_retention import RetentionEngine, RetentionPolicy
+from blob_segments import SegmentWriter, is_segment_blob, parse_segment, segment_time_range
+from blob_upload import DEFAULT_BLOCK_SIZE, upload_in_blocks
+from downsampling import parse_timestamp
 
 logger = logging.getLogger(__name__)
 
@@ -21,7 +42,8 @@ class BlobStorageManager:
     """初期化"""
     self.storage_account_name = os.getenv('STORAGE_ACCOUNT_NAME')
     self.storage_account_key = os.getenv('STORAGE_ACCOUNT_KEY')
-    self.connection_string = f"DefaultEndpointsProtocol=https;AccountName={self.storage_account_name};AccountKey={self.storage_account_key};EndpointSuffix=core.windows.net"
+    # STORAGE_CONNECTION_STRINGが指定された場合はそれを優先（Azurite等のローカル環境用）
+    self.connection_string = os.getenv('STORAGE_CONNECTION_STRING') or f"DefaultEndpointsProtocol=https;AccountName={self.storage_account_name};AccountKey={self.storage_account_key};EndpointSuffix=core.windows.net"
 
     self.blob_service_client = BlobServiceClient.from_connection_string(self.connection_string)
 
@@ -35,20 +57,70 @@ class BlobStorageManager:
     self.analysis_container_client = self.blob_service_client.get_container_client(self.analysis_container)
     self.image_container_client = self.blob_service_client.get_container_client(self.image_container)
 
+    # 旧レイアウト（{key}/{timestamp}.json）のBlobも読み取り対象とするか
+    self.read_legacy_layout = os.getenv('BLOB_READ_LEGACY_LAYOUT', 'true').lower() == 'true'
+
+    # 画像アップロードのブロックサイズ・同時ステージ数・ブロックごとの再試行回数
+    self.upload_block_size = int(os.getenv('BLOB_UPLOAD_BLOCK_SIZE', DEFAULT_BLOCK_SIZE))
+    self.upload_concurrency = int(os.getenv('BLOB_UPLOAD_CONCURRENCY', 8))
+    self.upload_max_retries = int(os.getenv('BLOB_UPLOAD_MAX_RETRIES', 3))
+
+    # 読み取り時の同時ダウンロード数
+    self.download_concurrency = int(os.getenv('BLOB_DOWNLOAD_CONCURRENCY', 16))
+
+    # JSON/NDJSONの保存時の圧縮方式（identity / gzip / zstd）
+    self.content_encoding = resolve_encoding(os.getenv('BLOB_CONTENT_ENCODING', 'identity'))
+
+    # 書き込み時にキー・日単位のマニフェストを更新し、読み取り時に一覧取得の代わりに使用するか
+    self.manifests = {}
+    if os.getenv('BLOB_MANIFEST', 'true').lower() == 'true':
+      self.manifests = {
+          self.sensor_container: ManifestStore(self.sensor_container_client, concurrency=self.download_concurrency),
+          self.analysis_container: ManifestStore(self.analysis_container_client, concurrency=self.download_concurrency)
+      }
+
+    # センサーデータをデバイス・時間単位のNDJSONセグメントにまとめて書き込むか
+    self.segment_writer = None
+    if os.getenv('BLOB_SEGMENT_WRITES', 'true').lower() == 'true':
+      self.segment_writer = SegmentWriter(
+          self.sensor_container_client,
+          max_records=int(os.getenv('BLOB_SEGMENT_MAX_RECORDS', 500)),
+          max_bytes=int(os.getenv('BLOB_SEGMENT_MAX_BYTES', 1024 * 1024)),
+          flush_interval=float(os.getenv('BLOB_SEGMENT_FLUSH_INTERVAL', 60)),
+          encoding=self.content_encoding,
+          on_append=self._record_segment if self.manifests else None,
+          max_pending_bytes=int(os.getenv('BLOB_SEGMENT_MAX_PENDING_BYTES', 64 * 1024 * 1024)),
+          spill_path=os.getenv('BLOB_SEGMENT_SPILL_PATH') or None
+      )
+
+    # 確定済みの時間帯のBlobの読み取りキャッシュ
+    self.blob_cache = BlobRecordCache(
+        max_bytes=int(os.getenv('BLOB_CACHE_MAX_BYTES', 64 * 1024 * 1024)),
+        close_delay=float(os.getenv('BLOB_CACHE_CLOSE_DELAY', 300))
+    )
+
+    # アーカイブ（Parquet）の1行グループあたりの行数
+    self.archive_row_group_size = int(os.getenv('BLOB_ARCHIVE_ROW_GROUP_SIZE', 4096))
+
   def upload_sensor_data(self, data: Dict[str, Any], device_id: str) -> bool:
     """
     センサーデータをBlob Storageにアップロード
 
+    セグメント書き込みが有効な場合はバッファへの追加のみを行い、Blobへの書き込みは
+    閾値（件数・サイズ・BLOB_SEGMENT_FLUSH_INTERVAL 秒）に達した時点で非同期に行われる。
+    このためTrueを返した時点ではデータはまだ永続化されていない（プロセス停止時は失われうる）。
+
     Args:
         data: センサーデータ
         device_id: デバイスID
 
     Returns:
-        bool: 成功時True
+        bool: 成功時True（セグメント書き込み時はバッファへの追加の成功）
     """
     try:
-      timestamp = datetime.utcnow().isoformat()
-      blob_name = f"{device_id}/{timestamp}.json"
+      now = datetime.utcnow()
+      timestamp = now.isoformat()
+      blob_name = partitioned_blob_name(device_id, now)
 
       # データにメタデータを追加
       data_with_metadata = {
@@ -58,11 +130,13 @@ class BlobStorageManager:
           "data": data
       }
 
-      blob_client = self.sensor_container_client.get_blob_client(blob_name)
-      blob_client.upload_blob(
-          json.dumps(data_with_metadata, ensure_ascii=False),
-          overwrite=True
-      )
+      if self.segment_writer:
+        # バッファに追加し、件数・サイズ・時間の閾値でセグメントに書き込む
+        self.segment_writer.append(device_id, now, data_with_metadata)
+        return True
+
+      size, response = self._upload_json(self.sensor_container_client, blob_name, data_with_metadata)
+      self._record_manifest(self.sensor_container_client, device_id, blob_name, now, now, 1, size, response)
 
       logger.info(f"センサーデータをアップロードしました: {blob_name}")
       return True
@@ -83,8 +157,9 @@ class BlobStorageManager:
         bool: 成功時True
     """
     try:
-      timestamp = datetime.utcnow().isoformat()
-      blob_name = f"{analysis_type}/{timestamp}.json"
+      now = datetime.utcnow()
+      timestamp = now.isoformat()
+      blob_name = partitioned_blob_name(analysis_type, now)
 
       # データにメタデータを追加
       data_with_metadata = {
@@ -94,11 +169,8 @@ class BlobStorageManager:
           "data": data
       }
 
-      blob_client = self.analysis_container_client.get_blob_client(blob_name)
-      blob_client.upload_blob(
-          json.dumps(data_with_metadata, ensure_ascii=False),
-          overwrite=True
-      )
+      size, response = self._upload_json(self.analysis_container_client, blob_name, data_with_metadata)
+      self._record_manifest(self.analysis_container_client, analysis_type, blob_name, now, now, 1, size, response)
 
       logger.info(f"分析データをアップロードしました: {blob_name}")
       return True
@@ -124,9 +196,15 @@ class BlobStorageManager:
       blob_name = f"{device_id}/{image_type}/{timestamp}.jpg"
 
       blob_client = self.image_container_client.get_blob_client(blob_name)
-      blob_client.upload_blob(image_data, overwrite=True)
-
-      blob_url = blob_client.url
+      # 大きな画像はブロックに分割して並行アップロードする
+      blob_url = upload_in_blocks(
+          blob_client,
+          image_data,
+          block_size=self.upload_block_size,
+          concurrency=self.upload_concurrency,
+          max_retries=self.upload_max_retries,
+          content_settings=ContentSettings(content_type='image/jpeg')
+      )
       logger.info(f"画像データをアップロードしました: {blob_name}")
       return blob_url
 
@@ -147,22 +225,7 @@ class BlobStorageManager:
         List[Dict[str, Any]]: センサーデータのリスト
     """
     try:
-      data_list = []
-
-      # デバイスIDでフィルタリング
-      blobs = self.sensor_container_client.list_blobs(name_starts_with=f"{device_id}/")
-
-      for blob in blobs:
-        # 時刻フィルタリング
-        if start_time and blob.name < f"{device_id}/{start_time}":
-          continue
-        if end_time and blob.name > f"{device_id}/{end_time}":
-          continue
-
-        blob_client = self.sensor_container_client.get_blob_client(blob.name)
-        blob_data = blob_client.download_blob()
-        data = json.loads(blob_data.readall().decode('utf-8'))
-        data_list.append(data)
+      data_list = list(self.iter_sensor_data(device_id, start_time, end_time))
 
       # 時刻順にソート
       data_list.sort(key=lambda x: x.get('timestamp', ''))
@@ -186,22 +249,7 @@ class BlobStorageManager:
         List[Dict[str, Any]]: 分析データのリスト
     """
     try:
-      data_list = []
-
-      # 分析タイプでフィルタリング
-      blobs = self.analysis_container_client.list_blobs(name_starts_with=f"{analysis_type}/")
-
-      for blob in blobs:
-        # 時刻フィルタリング
-        if start_time and blob.name < f"{analysis_type}/{start_time}":
-          continue
-        if end_time and blob.name > f"{analysis_type}/{end_time}":
-          continue
-
-        blob_client = self.analysis_container_client.get_blob_client(blob.name)
-        blob_data = blob_client.download_blob()
-        data = json.loads(blob_data.readall().decode('utf-8'))
-        data_list.append(data)
+      data_list = list(self.iter_analysis_data(analysis_type, start_time, end_time))
 
       # 時刻順にソート
       data_list.sort(key=lambda x: x.get('timestamp', ''))
@@ -212,6 +260,681 @@ class BlobStorageManager:
       logger.error(f"Blob Storage取得エラー: {e}")
       return []
 
+  def iter_sensor_data(self, device_id: str, start_time: Optional[str] = None, end_time: Optional[str] = None,
+                       concurrency: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """
+    センサーデータを時刻順に順次取得
+
+    Args:
+        device_id: デバイスID
+        start_time: 開始時刻（ISO形式）
+        end_time: 終了時刻（ISO形式）
+        concurrency: 同時ダウンロード数（未指定時は設定値）
+
+    Returns:
+        Iterator[Dict[str, Any]]: センサーデータ
+    """
+    # 要求範囲を覆うプレフィックスのみ一覧取得
+    blobs = self._list_blobs(self.sensor_container_client, device_id, start_time, end_time)
+    return self._iter_downloads(self.sensor_container_client, blobs, concurrency, start_time, end_time)
+
+  def iter_analysis_data(self, analysis_type: str, start_time: Optional[str] = None, end_time: Optional[str] = None,
+                         concurrency: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """
+    分析データを時刻順に順次取得
+
+    Args:
+        analysis_type: 分析タイプ
+        start_time: 開始時刻（ISO形式）
+        end_time: 終了時刻（ISO形式）
+        concurrency: 同時ダウンロード数（未指定時は設定値）
+
+    Returns:
+        Iterator[Dict[str, Any]]: 分析データ
+    """
+    # 要求範囲を覆うプレフィックスのみ一覧取得
+    blobs = self._list_blobs(self.analysis_container_client, analysis_type, start_time, end_time)
+    return self._iter_downloads(self.analysis_container_client, blobs, concurrency, start_time, end_time)
+
+  def get_sensor_data_page(self, device_id: str, start_time: Optional[str] = None, end_time: Optional[str] = None,
+                           limit: int = 1000, continuation_token: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    センサーデータを時刻順に1ページ分取得
+
+    継続トークンが示すBlob以降のみを一覧取得・ダウンロードするため、
+    ページ数によらず1ページあたりの処理量とメモリ使用量は一定に保たれる。
+
+    Args:
+        device_id: デバイスID
+        start_time: 開始時刻（ISO形式）
+        end_time: 終了時刻（ISO形式）
+        limit: 1ページの件数
+        continuation_token: 前のページで返された継続トークン
+
+    Returns:
+        Tuple[List[Dict[str, Any]], Optional[str]]: センサーデータと次のページの継続トークン（最終ページの場合None）
+
+    Raises:
+        ValueError: 不正な継続トークンの場合
+    """
+    position = decode_continuation_token(continuation_token)
+    list_start = start_time
+
+    if position:
+      # 継続位置のBlobの時間帯から一覧取得する
+      resume_at = blob_timestamp(position[0])
+      if resume_at is None:
+        raise ValueError("不正な継続トークンです")
+      if is_segment_blob(position[0]):
+        resume_at = segment_time_range(resume_at)[0]
+      start = parse_timestamp(start_time)
+      if start is None or resume_at > start:
+        list_start = resume_at.isoformat()
+
+    blobs = self._list_blobs(self.sensor_container_client, device_id, list_start, end_time)
+
+    if position:
+      resume_key = (blob_timestamp(position[0]), position[0])
+      blobs = [blob for blob in blobs if (blob_timestamp(blob[0]), blob[0]) >= resume_key]
+
+    data = []
+    batches = self._iter_blob_records(self.sensor_container_client, blobs, None, start_time, end_time)
+    try:
+      for blob_name, records in batches:
+        offset = position[1] if position and blob_name == position[0] else 0
+        for index in range(offset, len(records)):
+          if len(data) >= limit:
+            return data, encode_continuation_token(blob_name, index)
+          data.append(records[index])
+    finally:
+      batches.close()
+
+    return data, None
+
+  def archive_closed_days(self, days: int = 7, delete_source: bool = False) -> Dict[str, int]:
+    """
+    確定済みの日のセンサーデータをParquetにアーカイブ
+
+    前日までのdays日分について、未アーカイブのデバイス・日ごとに変換する。
+
+    Args:
+        days: 対象とする日数（前日から遡る）
+        delete_source: アーカイブ後に元のBlobを削除する
+
+    Returns:
+        Dict[str, int]: アーカイブした日数・件数と失敗した日数
+    """
+    result = {"archived": 0, "records": 0, "failed": 0}
+
+    if not archive_available():
+      logger.error("pyarrowがインストールされていないためアーカイブできません")
+      return result
+
+    # 前日分のバッファが残っていれば先に書き込む
+    if self.segment_writer:
+      self.segment_writer.flush()
+
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    for device_id in self._list_keys(self.sensor_container_client):
+      for offset in range(days, 0, -1):
+        day = today - timedelta(days=offset)
+        try:
+          count = self.archive_day(device_id, day, delete_source)
+          if count:
+            result["archived"] += 1
+            result["records"] += count
+        except AzureError as e:
+          logger.error(f"アーカイブエラー: {device_id} {day:%Y-%m-%d}: {e}")
+          result["failed"] += 1
+
+    logger.info(f"アーカイブ完了: {result['archived']}日分 ({result['records']}件)")
+    return result
+
+  def archive_day(self, device_id: str, day: datetime, delete_source: bool = False) -> int:
+    """
+    1デバイス・1日分のセンサーデータをParquetにアーカイブ
+
+    Args:
+        device_id: デバイスID
+        day: 対象日（UTC）
+        delete_source: アーカイブ後に元のBlobを削除する
+
+    Returns:
+        int: アーカイブした件数（アーカイブ済みまたはデータがない場合0）
+    """
+    blob_client = self.sensor_container_client.get_blob_client(archive_blob_name(device_id, day))
+    if blob_client.exists():
+      return 0
+
+    start_time = day.isoformat()
+    end_time = (day + timedelta(days=1) - timedelta(microseconds=1)).isoformat()
+    source_blobs = self._list_blobs(self.sensor_container_client, device_id, start_time, end_time)
+    if not source_blobs:
+      return 0
+
+    records = list(self._iter_downloads(self.sensor_container_client, source_blobs, None, start_time, end_time))
+    table = build_archive_table(records)
+
+    try:
+      blob_client.upload_blob(write_archive(table, self.archive_row_group_size), overwrite=False)
+    except ResourceExistsError:
+      # 他のワーカーがアーカイブ済み
+      return 0
+
+    logger.info(f"アーカイブしました: {blob_client.blob_name} ({table.num_rows}件)")
+
+    if delete_source:
+      # マニフェストも削除し、以降の読み取りは一覧取得に切り替える
+      source_names = [blob_name for blob_name, _ in source_blobs]
+      if self.manifests:
+        source_names.append(manifest_blob_name(device_id, day))
+      self._delete_blobs(self.sensor_container_client, source_names)
+
+    return table.num_rows
+
+  def read_sensor_archive(self, device_id: str, start_time: str, end_time: Optional[str] = None,
+                          columns: Optional[List[str]] = None,
+                          ranges: Optional[Dict[str, Tuple[Any, Any]]] = None):
+    """
+    アーカイブからセンサーデータを取得
+
+    日ごとのParquetファイルから、時刻範囲と条件に重なる行グループの指定列のみを読み取る。
+
+    Args:
+        device_id: デバイスID
+        start_time: 開始時刻（ISO形式）
+        end_time: 終了時刻（ISO形式）
+        columns: 取得する列（未指定時は全列）
+        ranges: 列名ごとの (最小値, 最大値) の条件（例: {"co2": (1000, None)}）
+
+    Returns:
+        Optional[pyarrow.Table]: 時刻順のセンサーデータ（pyarrow未インストール時None）
+    """
+    if not archive_available():
+      logger.error("pyarrowがインストールされていないためアーカイブを読み取れません")
+      return None
+
+    start = parse_timestamp(start_time)
+    end = parse_timestamp(end_time) or datetime.utcnow()
+    if start is None:
+      raise ValueError("start_timeを指定してください")
+
+    conditions = dict(ranges or {})
+    conditions['timestamp'] = (start, end)
+
+    def read_day(day):
+      blob_client = self.sensor_container_client.get_blob_client(archive_blob_name(device_id, day))
+      try:
+        size = blob_client.get_blob_properties().size
+      except ResourceNotFoundError:
+        return None
+      return read_archive(BlobRangeFile(blob_client, size), columns, conditions)
+
+    with ThreadPoolExecutor(max_workers=self.download_concurrency) as executor:
+      results = [result for result in executor.map(read_day, day_range(start, end)) if result]
+
+    read_groups = sum(result[1] for result in results)
+    total_groups = sum(result[2] for result in results)
+    logger.info(f"アーカイブ読み取り: {device_id} {len(results)}ファイル 行グループ {read_groups}/{total_groups}")
+
+    if not results:
+      return None
+    return concat_archives([result[0] for result in results])
+
+  def get_sensor_daily_stats(self, device_id: str, start_time: Optional[str] = None,
+                             end_time: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    センサーデータの日別統計をマニフェストから取得（データはダウンロードしない）
+
+    Args:
+        device_id: デバイスID
+        start_time: 開始時刻（ISO形式、未指定時は7日前）
+        end_time: 終了時刻（ISO形式、未指定時は現在時刻）
+
+    Returns:
+        List[Dict[str, Any]]: 日ごとの件数・サイズ・Blob数・時刻範囲（マニフェストがない日はindexed=False）
+    """
+    manifest = self.manifests.get(self.sensor_container)
+    if manifest is None:
+      raise ValueError("マニフェストが無効です（BLOB_MANIFEST=false）")
+
+    end = parse_timestamp(end_time) or datetime.utcnow()
+    start = parse_timestamp(start_time) or end - timedelta(days=7)
+    return manifest.daily_stats(device_id, start, end)
+
+  def rebuild_manifests(self, days: int = 7) -> Dict[str, int]:
+    """
+    前日までのdays日分のマニフェストを一覧取得から再構築
+
+    マニフェスト導入前のデータや旧レイアウトのBlobを読み取り対象に含めるために使用する。
+
+    Args:
+        days: 対象とする日数（前日から遡る）
+
+    Returns:
+        Dict[str, int]: 再構築したマニフェスト数とBlob数
+    """
+    result = {"manifests": 0, "blobs": 0}
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    for container_client in (self.sensor_container_client, self.analysis_container_client):
+      if container_client.container_name not in self.manifests:
+        continue
+
+      for key in self._list_keys(container_client):
+        for offset in range(days, 0, -1):
+          count = self.rebuild_manifest(container_client, key, today - timedelta(days=offset))
+          if count:
+            result["manifests"] += 1
+            result["blobs"] += count
+
+    logger.info(f"マニフェスト再構築完了: {result['manifests']}件 ({result['blobs']} Blob)")
+    return result
+
+  def rebuild_manifest(self, container_client, key: str, day: datetime) -> int:
+    """
+    1キー・1日分のマニフェストを一覧取得から再構築
+
+    Args:
+        container_client: コンテナクライアント
+        key: デバイスIDまたは分析タイプ
+        day: 対象日（UTC）
+
+    Returns:
+        int: マニフェストに記録したBlob数
+    """
+    day_end = day + timedelta(days=1) - timedelta(microseconds=1)
+    entries = {}
+
+    for prefix in covering_prefixes(key, day, day_end, self.read_legacy_layout):
+      for blob in container_client.list_blobs(name_starts_with=prefix):
+        timestamp = blob_timestamp(blob.name)
+        if timestamp is None:
+          continue
+
+        if is_segment_blob(blob.name):
+          # セグメントは件数と時刻範囲を内容から求める
+          times = [parse_timestamp(record.get('timestamp')) for record in self._fetch_records(container_client, blob.name, blob.etag)]
+          times = [time for time in times if time]
+          if not times:
+            continue
+          first, last, records = min(times), max(times), len(times)
+        else:
+          first, last, records = timestamp, timestamp, 1
+
+        entries[blob.name] = {
+            "first": first.isoformat(),
+            "last": last.isoformat(),
+            "records": records,
+            "bytes": blob.size,
+            "etag": blob.etag,
+            "sequence": 0
+        }
+
+    if entries:
+      self.manifests[container_client.container_name].replace(key, day, entries)
+    return len(entries)
+
+  def close(self):
+    """バッファ中のセンサーデータを書き込んで終了"""
+    if self.segment_writer:
+      self.segment_writer.close()
+
+  def _upload_json(self, container_client, blob_name: str, data: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+    """
+    JSONを設定した圧縮方式で保存
+
+    Args:
+        container_client: コンテナクライアント
+        blob_name: Blob名
+        data: 保存するデータ
+
+    Returns:
+        Tuple[int, Dict[str, Any]]: 保存したバイト数とアップロードの応答
+    """
+    content = encode_blob(json.dumps(data, ensure_ascii=False).encode('utf-8'), self.content_encoding)
+
+    blob_client = container_client.get_blob_client(blob_name)
+    response = blob_client.upload_blob(
+        content,
+        overwrite=True,
+        content_settings=ContentSettings(
+            content_type='application/json',
+            content_encoding=content_encoding(self.content_encoding)
+        )
+    )
+    return len(content), response
+
+  def _record_manifest(self, container_client, key: str, blob_name: str, first: datetime, last: datetime,
+                       records: int, size: int, response: Optional[Dict[str, Any]]):
+    """
+    書き込み結果をキー・日単位のマニフェストに反映
+
+    データは書き込み済みのため、マニフェストの更新に失敗してもエラーにしない
+    （その日のマニフェストは不完全として記録され、読み取り時は一覧取得で補う）。
+
+    Args:
+        container_client: コンテナクライアント
+        key: デバイスIDまたは分析タイプ
+        blob_name: 書き込んだBlob名
+        first: 書き込んだデータの最初の時刻（UTC）
+        last: 書き込んだデータの最後の時刻（UTC）
+        records: 書き込んだ件数
+        size: 書き込んだバイト数
+        response: 書き込みの応答（ETag・追記ブロック数）
+    """
+    manifest = self.manifests.get(container_client.container_name)
+    if manifest is None:
+      return
+
+    response = response or {}
+    day = first.replace(hour=0, minute=0, second=0, microsecond=0)
+    day_end = day + timedelta(days=1) - timedelta(microseconds=1)
+
+    def existing() -> List[str]:
+      # マニフェスト作成時に、導入前・旧レイアウト・他の書き込み元のBlobがないか確認する
+      return [
+          blob.name
+          for prefix in covering_prefixes(key, day, day_end, self.read_legacy_layout)
+          for blob in container_client.list_blobs(name_starts_with=prefix)
+          if blob_timestamp(blob.name) is not None
+      ]
+
+    manifest.record(key, day, blob_name, first, last, records, size,
+                    etag=response.get('etag'), sequence=response.get('blob_committed_block_count') or 0,
+                    existing=existing)
+
+  def _record_segment(self, blob_name: str, result: Dict[str, Any]):
+    """セグメントへの書き込み結果をマニフェストに反映"""
+    self._record_manifest(
+        self.sensor_container_client, result["key"], blob_name, result["first"], result["last"],
+        result["records"], result["bytes"], {"etag": result["etag"], "blob_committed_block_count": result["sequence"]}
+    )
+
+  def _fetch_records(self, container_client, blob_name: str, etag: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Blobのデータを取得
+
+    確定済みの時間帯のBlobはBlob名とETagをキーにキャッシュし、
+    キャッシュにない場合のみダウンロードする。圧縮されたBlobはContent-Encodingに従って展開する。
+
+    Args:
+        container_client: コンテナクライアント
+        blob_name: Blob名
+        etag: 一覧取得時のETag
+
+    Returns:
+        List[Dict[str, Any]]: データのリスト
+    """
+    cacheable = self.blob_cache.is_cacheable(blob_name)
+    if cacheable:
+      records = self.blob_cache.get(container_client.container_name, blob_name, etag)
+      if records is not None:
+        return records
+
+    try:
+      downloader = container_client.get_blob_client(blob_name).download_blob()
+    except ResourceNotFoundError:
+      # 一覧取得・マニフェスト解決の後に削除されたBlob
+      logger.warning(f"Blobが見つかりません: {blob_name}")
+      return []
+    encoding = downloader.properties.content_settings.content_encoding
+    content = decode_blob(downloader.readall(), encoding)
+
+    if is_segment_blob(blob_name):
+      records = parse_segment(content)
+    else:
+      records = [json.loads(content.decode('utf-8'))]
+
+    if cacheable:
+      # ダウンロードした内容のETagで保存する（一覧取得後に更新された場合も不整合にならない）
+      self.blob_cache.put(container_client.container_name, blob_name, downloader.properties.etag, records, len(content))
+
+    return records
+
+  def _download_records(self, container_client, blob_name: str, etag: Optional[str] = None,
+                        start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """
+    Blobのデータを取得し、NDJSONセグメントは時間範囲外の行を除外する
+
+    Args:
+        container_client: コンテナクライアント
+        blob_name: Blob名
+        etag: 一覧取得時のETag
+        start: 開始時刻（UTC）
+        end: 終了時刻（UTC）
+
+    Returns:
+        List[Dict[str, Any]]: データのリスト
+    """
+    records = self._fetch_records(container_client, blob_name, etag)
+
+    if not is_segment_blob(blob_name):
+      return records
+
+    filtered = []
+    for record in records:
+      timestamp = parse_timestamp(record.get('timestamp'))
+      if timestamp and start and timestamp < start:
+        continue
+      if timestamp and end and timestamp > end:
+        continue
+      filtered.append(record)
+    return filtered
+
+  def _iter_downloads(self, container_client, blobs: List[Tuple[str, Optional[str]]], concurrency: Optional[int] = None,
+                      start_time: Optional[str] = None, end_time: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Blobを並行ダウンロードし、Blob名の順序を保って順次返す
+
+    先読みは同時ダウンロード数の2倍までに制限し、メモリ使用量を抑える。
+
+    Args:
+        container_client: コンテナクライアント
+        blobs: (Blob名, ETag) のリスト（返却順）
+        concurrency: 同時ダウンロード数
+        start_time: 開始時刻（ISO形式、セグメント内の行の絞り込みに使用）
+        end_time: 終了時刻（ISO形式、セグメント内の行の絞り込みに使用）
+
+    Returns:
+        Iterator[Dict[str, Any]]: ダウンロードしたデータ
+    """
+    for _, records in self._iter_blob_records(container_client, blobs, concurrency, start_time, end_time):
+      yield from records
+
+  def _iter_blob_records(self, container_client, blobs: List[Tuple[str, Optional[str]]],
+                         concurrency: Optional[int] = None, start_time: Optional[str] = None,
+                         end_time: Optional[str] = None) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+    """
+    Blobを並行ダウンロードし、Blobごとのデータを順序を保って返す
+
+    Args:
+        container_client: コンテナクライアント
+        blobs: (Blob名, ETag) のリスト（返却順）
+        concurrency: 同時ダウンロード数
+        start_time: 開始時刻（ISO形式、セグメント内の行の絞り込みに使用）
+        end_time: 終了時刻（ISO形式、セグメント内の行の絞り込みに使用）
+
+    Returns:
+        Iterator[Tuple[str, List[Dict[str, Any]]]]: Blob名とデータのリスト
+    """
+    concurrency = max(1, concurrency or self.download_concurrency)
+    start = parse_timestamp(start_time)
+    end = parse_timestamp(end_time)
+    remaining = iter(blobs)
+    pending = deque()
+
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    try:
+      for blob_name, etag in remaining:
+        pending.append((blob_name, executor.submit(self._download_records, container_client, blob_name, etag, start, end)))
+        if len(pending) >= concurrency * 2:
+          break
+
+      while pending:
+        blob_name, future = pending.popleft()
+        records = future.result()
+
+        blob = next(remaining, None)
+        if blob is not None:
+          pending.append((blob[0], executor.submit(self._download_records, container_client, blob[0], blob[1], start, end)))
+
+        yield blob_name, records
+
+    finally:
+      # 途中で読み取りを終えた場合は未開始のダウンロードを取り消す
+      executor.shutdown(wait=False, cancel_futures=True)
+
+  def _list_blobs(self, container_client, key: str, start_time: Optional[str] = None,
+                  end_time: Optional[str] = None) -> List[Tuple[str, Optional[str]]]:
+    """
+    時刻範囲に含まれるBlobを一覧取得
+
+    開始時刻が指定された場合、完全なマニフェストがある日はマニフェストのみから解決し、
+    マニフェストがない日・不完全な日・書き込み中の日（終了後 BLOB_CACHE_CLOSE_DELAY 秒以内を含む）は
+    範囲を覆う日付プレフィックスごとに一覧取得する（キー配下の全Blobを列挙しない）。
+
+    Args:
+        container_client: コンテナクライアント
+        key: デバイスIDまたは分析タイプ
+        start_time: 開始時刻（ISO形式）
+        end_time: 終了時刻（ISO形式）
+
+    Returns:
+        List[Tuple[str, Optional[str]]]: 時刻順の (Blob名, ETag) のリスト
+    """
+    start = parse_timestamp(start_time)
+    end = parse_timestamp(end_time)
+    manifest = self.manifests.get(container_client.container_name)
+
+    if not start:
+      blobs = self._list_prefixes(container_client, [f"{key}/"], start, end)
+    elif manifest:
+      now = datetime.utcnow()
+      range_end = end or now
+      open_from = (now - timedelta(seconds=self.blob_cache.close_delay)).replace(hour=0, minute=0, second=0, microsecond=0)
+      resolved, missing_days = manifest.resolve(key, start, range_end, open_from=open_from)
+      blobs = [(blob_timestamp(blob_name), blob_name, etag) for _, blob_name, etag in resolved]
+
+      for day in missing_days:
+        day_start = max(start, day)
+        day_end = min(range_end, day + timedelta(days=1) - timedelta(microseconds=1))
+        prefixes = covering_prefixes(key, day_start, day_end, self.read_legacy_layout)
+        blobs += self._list_prefixes(container_client, prefixes, start, end)
+    else:
+      prefixes = covering_prefixes(key, start, end or datetime.utcnow(), self.read_legacy_layout)
+      blobs = self._list_prefixes(container_client, prefixes, start, end)
+
+    # 新旧レイアウトが混在しても時刻順になるよう並べ替える
+    blobs.sort(key=lambda blob: blob[:2])
+    return [(blob_name, etag) for _, blob_name, etag in blobs]
+
+  def _list_prefixes(self, container_client, prefixes: List[str], start: Optional[datetime] = None,
+                     end: Optional[datetime] = None) -> List[Tuple[datetime, str, Optional[str]]]:
+    """
+    プレフィックスごとに一覧取得し、時刻範囲に含まれるBlobを返す
+
+    Args:
+        container_client: コンテナクライアント
+        prefixes: プレフィックスのリスト
+        start: 開始時刻（UTC）
+        end: 終了時刻（UTC）
+
+    Returns:
+        List[Tuple[datetime, str, Optional[str]]]: (時刻, Blob名, ETag) のリスト
+    """
+    blobs = []
+    for prefix in prefixes:
+      for blob in container_client.list_blobs(name_starts_with=prefix):
+        # 範囲端のプレフィックスに含まれる範囲外のBlobを除外
+        timestamp = blob_timestamp(blob.name)
+        if timestamp is None:
+          continue
+
+        # セグメントは1時間分を含むため、時間範囲が重なれば対象とする
+        first, last = segment_time_range(timestamp) if is_segment_blob(blob.name) else (timestamp, timestamp)
+        if start and last < start:
+          continue
+        if end and first > end:
+          continue
+        blobs.append((timestamp, blob.name, blob.etag))
+    return blobs
+
+  def _list_keys(self, container_client) -> List[str]:
+    """
+    コンテナ直下のキー（デバイスIDまたは分析タイプ）を一覧取得
+
+    Args:
+        container_client: コンテナクライアント
+
+    Returns:
+        List[str]: キーのリスト
+    """
+    return [item.name.rstrip('/') for item in container_client.walk_blobs(delimiter='/') if item.name.endswith('/')]
+
+  def _delete_blobs(self, container_client, blob_names: List[str], batch_size: int = 256) -> int:
+    """
+    Blobを一括削除
+
+    Args:
+        container_client: コンテナクライアント
+        blob_names: 削除するBlob名のリスト
+        batch_size: 1回のバッチ要求で削除する件数（最大256）
+
+    Returns:
+        int: 削除要求した件数
+    """
+    for index in range(0, len(blob_names), batch_size):
+      # 存在しないBlob（削除済み）は無視する
+      container_client.delete_blobs(*blob_names[index:index + batch_size], raise_on_any_failure=False)
+    return len(blob_names)
+
+  def retention_policies(self, days: Optional[int] = None) -> List[RetentionPolicy]:
+    """
+    コンテナごとの保持ポリシーを取得
+
+    Args:
+        days: 全コンテナ共通の保持日数（未指定時はコンテナごとの設定値）
+
+    Returns:
+        List[RetentionPolicy]: 保持ポリシーのリスト
+    """
+    def retention_days(name):
+      return days if days is not None else int(os.getenv(name, 30))
+
+    return [
+        # アーカイブ（Parquet）は長期分析用に残す
+        RetentionPolicy("sensor", self.sensor_container_client, retention_days('BLOB_RETENTION_DAYS_SENSOR'),
+                        legacy=self.read_legacy_layout, keep_archives=True),
+        RetentionPolicy("analysis", self.analysis_container_client, retention_days('BLOB_RETENTION_DAYS_ANALYSIS'),
+                        legacy=self.read_legacy_layout),
+        # 画像は {device_id}/{image_type}/{timestamp}.jpg
+        RetentionPolicy("image", self.image_container_client, retention_days('BLOB_RETENTION_DAYS_IMAGE'),
+                        key_depth=2, partitioned=False, legacy=True)
+    ]
+
+  def apply_retention(self, days: Optional[int] = None,
+                      progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Dict[str, int]]:
+    """
+    保持期間を過ぎたデータを削除
+
+    期限切れの範囲を日付プレフィックス単位で一覧取得し、最大256件ずつのバッチ削除を並行して行う。
+
+    Args:
+        days: 全コンテナ共通の保持日数（未指定時はコンテナごとの設定値）
+        progress: プレフィックスごとの進捗を受け取るコールバック
+
+    Returns:
+        Dict[str, Dict[str, int]]: コンテナごとの削除件数・失敗件数・プレフィックス数
+    """
+    engine = RetentionEngine(
+        self.retention_policies(days),
+        concurrency=int(os.getenv('BLOB_RETENTION_CONCURRENCY', 8)),
+        progress=progress
+    )
+    return engine.run()
+
   def delete_old_data(self, days: int = 30) -> bool:
     """
     古いデータを削除
@@ -223,32 +946,11 @@ class BlobStorageManager:
         bool: 成功時True
     """
     try:
-      cutoff_date = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-      cutoff_date = cutoff_date.replace(day=cutoff_date.day - days)
-
-      deleted_count = 0
-
-      # センサーデータの削除
-      for container_client in [self.sensor_container_client, self.analysis_container_client, self.image_container_client]:
-        blobs = container_client.list_blobs()
-
-        for blob in blobs:
-          # Blob名から時刻を抽出（簡易的な実装）
-          try:
-            blob_date_str = blob.name.split('/')[-1].split('.')[0]
-            blob_date = datetime.fromisoformat(blob_date_str.replace('Z', '+00:00'))
-
-            if blob_date < cutoff_date:
-              blob_client = container_client.get_blob_client(blob.name)
-              blob_client.delete_blob()
-              deleted_count += 1
-              logger.info(f"古いデータを削除しました: {blob.name}")
-          except Exception:
-            # 日付解析に失敗した場合はスキップ
-            continue
+      results = self.apply_retention(days)
 
+      deleted_count = sum(result["deleted"] for result in results.values())
       logger.info(f"合計 {deleted_count} 個の古いデータを削除しました")
-      return True
+      return all(result["failed"] == 0 for result in results.values())
 
     except AzureError as e:
       logger.error(f"Blob Storage削除エラー: {e}")
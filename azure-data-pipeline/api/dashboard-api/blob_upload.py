@@ -0,0 +1,86 @@
+"""
+Blob分割アップロードモジュール
+大きなデータをブロックに分割して並行にステージし、最後にまとめてコミットする機能
+"""
+
+import base64
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Optional
+
+from azure.core.exceptions import AzureError
+from azure.storage.blob import BlobBlock
+
+logger = logging.getLogger(__name__)
+
+# ブロックサイズの既定値（4 MiB）
+DEFAULT_BLOCK_SIZE = 4 * 1024 * 1024
+
+
+def block_id(index: int) -> str:
+  """
+  ブロックIDを生成
+
+  Blob内の全ブロックIDは同じ長さである必要があるため、固定桁の番号をBase64化する。
+
+  Args:
+      index: ブロック番号
+
+  Returns:
+      str: ブロックID
+  """
+  return base64.b64encode(f"block-{index:08d}".encode('ascii')).decode('ascii')
+
+
+def _stage_block(blob_client, index: int, chunk: bytes, max_retries: int) -> str:
+  """1ブロックをステージ（失敗時はそのブロックのみ再試行）"""
+  current_id = block_id(index)
+  for attempt in range(max_retries + 1):
+    try:
+      blob_client.stage_block(current_id, chunk)
+      return current_id
+    except AzureError as e:
+      if attempt >= max_retries:
+        raise
+      wait = 0.5 * (2 ** attempt)
+      logger.warning(f"ブロックのステージに失敗しました（{wait:.1f}秒後に再試行）: ブロック{index}: {e}")
+      time.sleep(wait)
+
+
+def upload_in_blocks(blob_client, data: bytes, block_size: int = DEFAULT_BLOCK_SIZE, concurrency: int = 8,
+                     max_retries: int = 3, content_settings: Optional[Any] = None) -> str:
+  """
+  データをブロックに分割して並行アップロード
+
+  ブロックサイズ以下のデータは1回のアップロードで保存する。
+  それより大きいデータは各ブロックを並行にステージし、失敗したブロックだけを再試行してから
+  ブロックリストをコミットするため、途中で失敗しても最初からやり直さない。
+
+  Args:
+      blob_client: アップロード先のBlobクライアント
+      data: アップロードするデータ
+      block_size: 1ブロックのサイズ（バイト）
+      concurrency: 同時にステージするブロック数
+      max_retries: 1ブロックあたりの再試行回数
+      content_settings: BlobのContentSettings
+
+  Returns:
+      str: アップロードしたBlobのURL
+  """
+  if len(data) <= block_size:
+    blob_client.upload_blob(data, overwrite=True, content_settings=content_settings)
+    return blob_client.url
+
+  chunks: List[bytes] = [data[offset:offset + block_size] for offset in range(0, len(data), block_size)]
+
+  with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+    block_ids = list(executor.map(
+        lambda item: _stage_block(blob_client, item[0], item[1], max_retries),
+        enumerate(chunks)
+    ))
+
+  # ステージした順序でコミットする（コミットまでは既存のBlobの内容は変わらない）
+  blob_client.commit_block_list([BlobBlock(block_id=current_id) for current_id in block_ids],
+                                content_settings=content_settings)
+  return blob_client.url
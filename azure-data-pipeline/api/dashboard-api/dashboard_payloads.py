@@ -0,0 +1,299 @@
+"""
+ダッシュボードレスポンス構築モジュール
+Flask版・非同期版の両APIで共有するクエリ定義とレスポンス構築機能
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, Any, List
+
+from downsampling import bucket_average
+
+HISTORY_FIELDS = ['temperature', 'humidity', 'co2', 'pressure', 'illuminance']
+MAX_HISTORY_POINTS = 1440
+
+AITRIOS_LATEST_QUERY = "SELECT * FROM c WHERE c.deviceType = 'aitrios' ORDER BY c.timestamp DESC OFFSET 0 LIMIT 1"
+GEMINI_LATEST_QUERY = "SELECT * FROM c WHERE c.deviceType = 'gemini' ORDER BY c.timestamp DESC OFFSET 0 LIMIT 1"
+KAITEKI_LATEST_QUERY = "SELECT * FROM c WHERE c.deviceType = 'kaiteki' ORDER BY c.timestamp DESC OFFSET 0 LIMIT 1"
+ANALYSIS_RECENT_QUERY = "SELECT * FROM c WHERE c.collectionName = 'analysis-data' ORDER BY c.windowEnd DESC OFFSET 0 LIMIT 10"
+ANOMALY_RECENT_QUERY = "SELECT * FROM c WHERE c.anomalyStatus != 'Normal' ORDER BY c.windowEnd DESC OFFSET 0 LIMIT 5"
+
+
+def latest_timestamp_query(condition: str = None) -> str:
+  """
+  最新ドキュメントの更新時刻（_ts）を取得するクエリを構築
+
+  Args:
+      condition: WHERE条件
+
+  Returns:
+      str: クエリ
+  """
+  query = "SELECT VALUE MAX(c._ts) FROM c"
+  if condition:
+    query += f" WHERE {condition}"
+  return query
+
+
+def entrance_hourly_query(since: datetime) -> str:
+  """
+  エントランスの時間別集計用クエリを構築
+
+  Args:
+      since: 取得開始時刻
+
+  Returns:
+      str: クエリ
+  """
+  return f"""
+        SELECT
+            c.data.deviceType,
+            c.data.personCount,
+            c.data.temperature,
+            c.data.humidity,
+            c.data.co2,
+            c.timestamp
+        FROM c
+        WHERE c.timestamp >= '{since.isoformat()}'
+        ORDER BY c.timestamp
+        """
+
+
+def room_history_query(since: datetime) -> str:
+  """
+  部屋環境の履歴取得用クエリを構築
+
+  Args:
+      since: 取得開始時刻
+
+  Returns:
+      str: クエリ
+  """
+  return f"""
+        SELECT
+            c.data.temperature,
+            c.data.humidity,
+            c.data.co2,
+            c.data.occupancy,
+            c.data.illuminance,
+            c.data.pressure,
+            c.data.human,
+            c.timestamp
+        FROM c
+        WHERE c.deviceType = 'kaiteki' AND c.timestamp >= '{since.isoformat()}'
+        ORDER BY c.timestamp
+        """
+
+
+def history_window(hours: int = 24):
+  """
+  履歴取得の時間窓を取得
+
+  Args:
+      hours: 時間窓の長さ
+
+  Returns:
+      Tuple[datetime, datetime]: 開始時刻と終了時刻（UTC）
+  """
+  now = datetime.utcnow()
+  return now - timedelta(hours=hours), now
+
+
+def parse_history_points(value: Any, default: int) -> int:
+  """
+  履歴の点数パラメータを解析
+
+  Args:
+      value: リクエストパラメータの値
+      default: 未指定時の点数
+
+  Returns:
+      int: 0〜MAX_HISTORY_POINTSの点数
+  """
+  points = default if value is None else int(value)
+  return max(0, min(points, MAX_HISTORY_POINTS))
+
+
+def build_entrance_payload(aitrios_items: List[Dict[str, Any]], gemini_items: List[Dict[str, Any]],
+                           hourly_items: List[Dict[str, Any]]) -> Dict[str, Any]:
+  """
+  エントランスデータのレスポンスを構築
+
+  Args:
+      aitrios_items: 最新のAITRIOSデータ
+      gemini_items: 最新のGeminiデータ
+      hourly_items: 過去24時間のデータ
+
+  Returns:
+      Dict[str, Any]: レスポンスデータ
+  """
+  # データの統合
+  aitrios_data = aitrios_items[0] if aitrios_items else {}
+  gemini_data = gemini_items[0] if gemini_items else {}
+
+  return {
+      "currentVisitors": aitrios_data.get('data', {}).get('personCount', 0),
+      "dailyVisitors": sum(item.get('data', {}).get('personCount', 0) for item in hourly_items if item.get('data', {}).get('deviceType') == 'aitrios'),
+      "ageDistribution": aitrios_data.get('data', {}).get('ageDistribution', [35, 40, 20, 5]),
+      "genderDistribution": aitrios_data.get('data', {}).get('genderDistribution', [55, 40, 5]),
+      "hourlyData": [item.get('data', {}).get('personCount', 0) for item in hourly_items if item.get('data', {}).get('deviceType') == 'aitrios'],
+      "behaviorMetrics": {
+          "interestLevel": gemini_data.get('data', {}).get('behaviorAnalysis', {}).get('interestLevel', 75),
+          "avgMovement": gemini_data.get('data', {}).get('behaviorAnalysis', {}).get('avgMovement', 12.5),
+          "groupBehavior": gemini_data.get('data', {}).get('behaviorAnalysis', {}).get('groupBehavior', 45)
+      },
+      "lastUpdate": aitrios_data.get('timestamp', datetime.utcnow().isoformat())
+  }
+
+
+def entrance_error_payload(error: Exception) -> Dict[str, Any]:
+  """
+  エントランスデータ取得失敗時のレスポンスを構築
+
+  Args:
+      error: 発生した例外
+
+  Returns:
+      Dict[str, Any]: レスポンスデータ
+  """
+  return {
+      "error": str(error),
+      "currentVisitors": 0,
+      "dailyVisitors": 0,
+      "ageDistribution": [35, 40, 20, 5],
+      "genderDistribution": [55, 40, 5],
+      "hourlyData": [0] * 24,
+      "behaviorMetrics": {
+          "interestLevel": 75,
+          "avgMovement": 12.5,
+          "groupBehavior": 45
+      }
+  }
+
+
+def build_room_payload(kaiteki_items: List[Dict[str, Any]], history_items: List[Dict[str, Any]],
+                       start: datetime, end: datetime, points: int) -> Dict[str, Any]:
+  """
+  部屋環境データのレスポンスを構築
+
+  Args:
+      kaiteki_items: 最新の快適君データ
+      history_items: 時間窓内の履歴データ
+      start: 時間窓の開始時刻
+      end: 時間窓の終了時刻
+      points: 履歴の点数（0の場合は全件）
+
+  Returns:
+      Dict[str, Any]: レスポンスデータ
+  """
+  # 最新データ
+  current_data = kaiteki_items[0] if kaiteki_items else {}
+
+  # 履歴データ（points指定時は時間バケット平均で間引く）
+  if points > 0:
+    history = bucket_average(history_items, HISTORY_FIELDS, start, end, points)
+  else:
+    history = {field: [item.get(field) for item in history_items] for field in HISTORY_FIELDS}
+    history['timestamps'] = [item.get('timestamp') for item in history_items]
+
+  # 週間使用率の計算（簡易版）
+  weekly_usage = [85, 92, 78, 88, 95, 45, 30]  # モックデータ
+
+  return {
+      "temperature": current_data.get('data', {}).get('temperature', 22.5),
+      "humidity": current_data.get('data', {}).get('humidity', 55),
+      "co2": current_data.get('data', {}).get('co2', 450),
+      "pressure": current_data.get('data', {}).get('pressure', 1013),
+      "illuminance": current_data.get('data', {}).get('illuminance', 300),
+      "isOccupied": current_data.get('data', {}).get('occupancy', True),
+      "human": current_data.get('data', {}).get('human', False),
+      "deviceInfo": {
+          "deviceNo": current_data.get('data', {}).get('deviceNo'),
+          "deviceName": current_data.get('data', {}).get('deviceName'),
+          "version": current_data.get('data', {}).get('version'),
+          "mac": current_data.get('data', {}).get('mac')
+      },
+      "networkInfo": {
+          "rssi": current_data.get('data', {}).get('rssi', 0),
+          "ssid": current_data.get('data', {}).get('ssid'),
+          "voltage": current_data.get('data', {}).get('voltage', 0),
+          "power": current_data.get('data', {}).get('power', 0)
+      },
+      "temperatureHistory": history['temperature'],
+      "humidityHistory": history['humidity'],
+      "co2History": history['co2'],
+      "pressureHistory": history['pressure'],
+      "illuminanceHistory": history['illuminance'],
+      "historyTimestamps": history['timestamps'],
+      "weeklyUsage": weekly_usage,
+      "lastUpdate": current_data.get('timestamp', datetime.utcnow().isoformat())
+  }
+
+
+def room_error_payload(error: Exception) -> Dict[str, Any]:
+  """
+  部屋環境データ取得失敗時のレスポンスを構築
+
+  Args:
+      error: 発生した例外
+
+  Returns:
+      Dict[str, Any]: レスポンスデータ
+  """
+  return {
+      "error": str(error),
+      "temperature": 22.5,
+      "humidity": 55,
+      "co2": 450,
+      "isOccupied": True,
+      "temperatureHistory": [22.5] * 24,
+      "humidityHistory": [55] * 24,
+      "co2History": [450] * 24,
+      "weeklyUsage": [85, 92, 78, 88, 95, 45, 30]
+  }
+
+
+def build_summary_payload(analysis_items: List[Dict[str, Any]],
+                          anomaly_items: List[Dict[str, Any]]) -> Dict[str, Any]:
+  """
+  分析サマリーのレスポンスを構築
+
+  Args:
+      analysis_items: 最新の分析データ
+      anomaly_items: 最新の異常検知データ
+
+  Returns:
+      Dict[str, Any]: レスポンスデータ
+  """
+  return {
+      "recentAnalysis": analysis_items,
+      "recentAnomalies": anomaly_items,
+      "summary": {
+          "totalDevices": 3,  # AITRIOS, Gemini, 快適君
+          "activeDevices": len(set(item.get('deviceType') for item in analysis_items)),
+          "anomalyCount": len(anomaly_items),
+          "lastUpdate": datetime.utcnow().isoformat()
+      }
+  }
+
+
+def summary_error_payload(error: Exception) -> Dict[str, Any]:
+  """
+  分析サマリー取得失敗時のレスポンスを構築
+
+  Args:
+      error: 発生した例外
+
+  Returns:
+      Dict[str, Any]: レスポンスデータ
+  """
+  return {
+      "error": str(error),
+      "recentAnalysis": [],
+      "recentAnomalies": [],
+      "summary": {
+          "totalDevices": 3,
+          "activeDevices": 0,
+          "anomalyCount": 0,
+          "lastUpdate": datetime.utcnow().isoformat()
+      }
+  }
@@ -0,0 +1,158 @@
+"""
+IoT Hubデバイス一括操作モジュール
+レジストリの一括操作（1回最大100デバイス）をチャンクに分割して並行に実行し、
+デバイスごとの結果を返す機能
+"""
+
+import re
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from azure.iot.hub.models import AuthenticationMechanism, ExportImportDevice, PropertyContainer
+
+logger = logging.getLogger(__name__)
+
+# 1回の一括操作で指定できるデバイス数の上限
+BULK_CHUNK_SIZE = 100
+
+# デバイスIDに使用できる文字（最大128文字）
+DEVICE_ID_PATTERN = re.compile(r"^[A-Za-z0-9\-.%_*?!(),:=@$']{1,128}$")
+
+# 操作ごとのインポートモード
+IMPORT_MODES = {
+    "create": "create",
+    "update": "updateTwin",
+    "delete": "delete"
+}
+
+
+def bulk_device_id(device: Any) -> Optional[str]:
+  """入力（デバイスIDの文字列または辞書）からデバイスIDを取得"""
+  if isinstance(device, str):
+    return device
+  if isinstance(device, dict):
+    return device.get("deviceId")
+  return None
+
+
+def build_entry(operation: str, device: Any) -> ExportImportDevice:
+  """
+  一括操作の1デバイス分のエントリを作成
+
+  Args:
+      operation: create・update・delete
+      device: create は {"deviceId", "deviceType"}、update は {"deviceId", "tags", "properties"}、
+              delete はデバイスIDまたは {"deviceId"}
+
+  Returns:
+      ExportImportDevice: 一括操作のエントリ
+  """
+  device_id = bulk_device_id(device)
+
+  if operation == "create":
+    # create_device と同じ初期設定（キーはIoT Hubが生成する）
+    return ExportImportDevice(
+        id=device_id,
+        import_mode=IMPORT_MODES[operation],
+        status="enabled",
+        authentication=AuthenticationMechanism(type="sas"),
+        tags={
+            "deviceType": device.get("deviceType", "sensor") if isinstance(device, dict) else "sensor",
+            "createdAt": datetime.utcnow().isoformat(),
+            "status": "active"
+        },
+        properties=PropertyContainer(desired={
+            "telemetryInterval": 30,
+            "reportingEnabled": True
+        })
+    )
+
+  if operation == "update":
+    return ExportImportDevice(
+        id=device_id,
+        import_mode=IMPORT_MODES[operation],
+        tags=device.get("tags"),
+        properties=PropertyContainer(desired=device["properties"]) if device.get("properties") else None
+    )
+
+  return ExportImportDevice(id=device_id, import_mode=IMPORT_MODES[operation])
+
+
+def validate_devices(operation: str, devices: List[Any], existing: Optional[set] = None) -> Dict[int, str]:
+  """
+  一括操作の入力を検証
+
+  Args:
+      operation: create・update・delete
+      devices: 入力のリスト
+      existing: 登録済みのデバイスID（指定時は作成の重複・更新と削除の対象の有無も確認）
+
+  Returns:
+      Dict[int, str]: 操作できない入力の位置とその理由（同じデバイスIDの入力はすべて不正とする）
+  """
+  errors = {}
+  positions: Dict[str, List[int]] = {}
+
+  for index, device in enumerate(devices):
+    device_id = bulk_device_id(device)
+    if not isinstance(device_id, str) or not DEVICE_ID_PATTERN.match(device_id):
+      errors[index] = "デバイスIDが不正です"
+      continue
+    positions.setdefault(device_id, []).append(index)
+
+    if operation == "update" and not (isinstance(device, dict) and (device.get("tags") or device.get("properties"))):
+      errors[index] = "更新するtagsまたはpropertiesがありません"
+    elif existing is not None and operation == "create" and device_id in existing:
+      errors[index] = "デバイスは既に存在します"
+    elif existing is not None and operation != "create" and device_id not in existing:
+      errors[index] = "デバイスが存在しません"
+
+  for indexes in positions.values():
+    if len(indexes) > 1:
+      for index in indexes:
+        errors[index] = "デバイスIDが重複しています"
+
+  return errors
+
+
+def run_bulk_operation(registry_manager, entries: List[ExportImportDevice],
+                       concurrency: int = 4) -> Dict[str, Optional[str]]:
+  """
+  一括操作をチャンクに分割して並行に実行
+
+  Args:
+      registry_manager: IoTHubRegistryManager
+      entries: 一括操作のエントリ
+      concurrency: 同時に実行する一括操作の数
+
+  Returns:
+      Dict[str, Optional[str]]: デバイスIDごとのエラー（成功時None）
+  """
+  chunks = [entries[start:start + BULK_CHUNK_SIZE] for start in range(0, len(entries), BULK_CHUNK_SIZE)]
+  results: Dict[str, Optional[str]] = {}
+  if not chunks:
+    return results
+
+  with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(chunks)))) as executor:
+    for chunk_results in executor.map(lambda chunk: _run_chunk(registry_manager, chunk), chunks):
+      results.update(chunk_results)
+
+  return results
+
+
+def _run_chunk(registry_manager, chunk: List[ExportImportDevice]) -> Dict[str, Optional[str]]:
+  """1回の一括操作を実行し、デバイスごとのエラーを返す（失敗したチャンクのデバイスのみ失敗とする）"""
+  try:
+    result = registry_manager.bulk_create_or_update_devices(chunk)
+  except Exception as e:
+    # SDKはmsrestの例外（HttpOperationError等）も送出するため、種類によらずこのチャンクの失敗として扱う
+    logger.error(f"IoT Hub一括操作エラー ({len(chunk)}件): {e}")
+    return {entry.id: str(e) for entry in chunk}
+
+  errors = {
+      error.device_id: f"{error.error_code}: {error.error_status}"
+      for error in (result.errors or [])
+  }
+  return {entry.id: errors.get(entry.id) for entry in chunk}
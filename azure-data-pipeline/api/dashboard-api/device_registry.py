@@ -0,0 +1,189 @@
+"""
+IoT Hubデバイスレジストリキャッシュモジュール
+デバイスツインの一覧をメモリ上に保持し、ツインのバージョン・etagの比較で差分更新する機能
+"""
+
+import threading
+import time
+import logging
+from typing import Dict, Any, Callable, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 差分確認用のクエリ（変更の判定に必要な項目のみ取得）
+VERSION_QUERY = "SELECT deviceId, etag, version, status FROM devices"
+
+# 全件取得用のクエリ
+FULL_QUERY = "SELECT * FROM devices"
+
+# 1回のクエリで再取得するデバイス数
+REFRESH_CHUNK_SIZE = 50
+
+
+def _isoformat(value: Any) -> Optional[str]:
+  """日時（datetimeまたは文字列）をISO形式の文字列に変換"""
+  if value is None:
+    return None
+  return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+
+def twin_entry(twin: Any) -> Dict[str, Any]:
+  """
+  デバイスツインをキャッシュのエントリに変換
+
+  Args:
+      twin: クエリ結果のデバイスツイン
+
+  Returns:
+      Dict[str, Any]: デバイスID・状態・タグ・バージョン情報
+  """
+  return {
+      "deviceId": twin.device_id,
+      "status": twin.status,
+      "authenticationType": getattr(twin, "authentication_type", None),
+      "lastActivityTime": _isoformat(getattr(twin, "last_activity_time", None)),
+      "cloudToDeviceMessageCount": getattr(twin, "cloud_to_device_message_count", None),
+      "tags": twin.tags or {},
+      "etag": twin.etag,
+      "version": twin.version
+  }
+
+
+class DeviceRegistryCache:
+  """デバイスレジストリのスナップショットを保持するクラス"""
+
+  def __init__(self, query: Callable[[str], Iterable[Any]], max_staleness: float = 60.0,
+               full_reload_interval: float = 3600.0):
+    """
+    初期化
+
+    Args:
+        query: IoT Hubクエリを実行し、デバイスツインを返す関数（IoTHubManager.query_twins）
+        max_staleness: スナップショットを再確認せずに使用する秒数（0の場合毎回確認）
+        full_reload_interval: 差分更新ではなく全件を再取得する間隔（秒）
+    """
+    self.query = query
+    self.max_staleness = max_staleness
+    self.full_reload_interval = full_reload_interval
+
+    self._lock = threading.RLock()
+    self._devices: Dict[str, Dict[str, Any]] = {}
+    self._dirty: set = set()
+    self._loaded_at: Optional[float] = None
+    self._checked_at: Optional[float] = None
+    self._full_loads = 0
+    self._incremental_refreshes = 0
+    self._refetched = 0
+
+  def devices(self) -> List[Dict[str, Any]]:
+    """
+    デバイスの一覧を取得（期限切れの場合は先に更新する）
+
+    Returns:
+        List[Dict[str, Any]]: デバイスID順のエントリのリスト
+    """
+    with self._lock:
+      self._ensure_fresh()
+      return [dict(self._devices[device_id]) for device_id in sorted(self._devices)]
+
+  def invalidate(self, device_id: Optional[str] = None):
+    """
+    キャッシュを無効化（本APIからデバイスを変更した後に呼び出す）
+
+    Args:
+        device_id: 変更したデバイスID（省略時は次回の読み取りで全件を再取得）
+    """
+    with self._lock:
+      if device_id is None:
+        self._loaded_at = None
+      else:
+        self._dirty.add(device_id)
+
+  def remove(self, device_id: str):
+    """
+    削除したデバイスをキャッシュから除く
+
+    Args:
+        device_id: デバイスID
+    """
+    with self._lock:
+      self._devices.pop(device_id, None)
+      self._dirty.discard(device_id)
+
+  def stats(self) -> Dict[str, Any]:
+    """
+    キャッシュの統計情報を取得
+
+    Returns:
+        Dict[str, Any]: デバイス数・経過秒数・更新回数
+    """
+    with self._lock:
+      now = time.monotonic()
+      return {
+          "devices": len(self._devices),
+          "maxStaleness": self.max_staleness,
+          "ageSeconds": round(now - self._checked_at, 1) if self._checked_at is not None else None,
+          "fullLoads": self._full_loads,
+          "incrementalRefreshes": self._incremental_refreshes,
+          "refetchedDevices": self._refetched
+      }
+
+  def _ensure_fresh(self):
+    """スナップショットが期限切れであれば更新"""
+    now = time.monotonic()
+    if self._loaded_at is None or now - self._loaded_at >= self.full_reload_interval:
+      self._full_load()
+    elif self._dirty or now - self._checked_at >= self.max_staleness:
+      self._refresh()
+
+  def _full_load(self):
+    """全デバイスのツインをページングで取得"""
+    started = time.monotonic()
+    devices = {}
+    for twin in self.query(FULL_QUERY):
+      devices[twin.device_id] = twin_entry(twin)
+
+    self._devices = devices
+    self._dirty.clear()
+    self._loaded_at = self._checked_at = time.monotonic()
+    self._full_loads += 1
+    logger.info(f"デバイスレジストリを取得しました: {len(devices)}件 ({self._loaded_at - started:.1f}秒)")
+
+  def _refresh(self):
+    """
+    差分更新
+
+    デバイスID・etag・バージョン・状態のみを取得して比較し、
+    追加・変更されたデバイスのツインだけを再取得、存在しないデバイスを除く。
+    """
+    current = {}
+    changed = set(self._dirty)
+    for twin in self.query(VERSION_QUERY):
+      current[twin.device_id] = twin
+      cached = self._devices.get(twin.device_id)
+      if (cached is None or cached["etag"] != twin.etag or cached["version"] != twin.version
+          or cached["status"] != twin.status):
+        changed.add(twin.device_id)
+
+    for device_id in set(self._devices) - set(current):
+      del self._devices[device_id]
+    changed &= set(current)
+
+    # IN句に含められないデバイスIDがある場合や変更が多い場合は全件取得
+    if any("'" in device_id for device_id in changed) or len(changed) > len(current) // 2 > 0:
+      self._full_load()
+      return
+
+    ordered = sorted(changed)
+    for start in range(0, len(ordered), REFRESH_CHUNK_SIZE):
+      chunk = ordered[start:start + REFRESH_CHUNK_SIZE]
+      ids = ", ".join(f"'{device_id}'" for device_id in chunk)
+      for twin in self.query(f"{FULL_QUERY} WHERE deviceId IN [{ids}]"):
+        self._devices[twin.device_id] = twin_entry(twin)
+
+    self._dirty.clear()
+    self._checked_at = time.monotonic()
+    self._incremental_refreshes += 1
+    self._refetched += len(changed)
+    if changed:
+      logger.info(f"デバイスレジストリを差分更新しました: {len(changed)}件")
@@ -0,0 +1,87 @@
+"""
+時系列ダウンサンプリングモジュール
+チャート表示用に履歴データを時間バケット平均で間引く機能
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List, Optional, Iterable
+
+
+def parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+  """
+  ISO形式の時刻文字列をUTCのnaive datetimeに変換
+
+  Args:
+      value: ISO形式の時刻文字列
+
+  Returns:
+      Optional[datetime]: 変換結果（解析できない場合None）
+  """
+  if not value:
+    return None
+
+  try:
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+  except ValueError:
+    return None
+
+  if parsed.tzinfo is not None:
+    parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+  return parsed
+
+
+def bucket_average(items: Iterable[Dict[str, Any]], fields: List[str], start: datetime,
+                   end: datetime, points: int) -> Dict[str, Any]:
+  """
+  履歴データを等間隔の時間バケットごとに平均化
+
+  全フィールドを1回の走査で集計するため、計算量は読み取り件数に比例し、
+  出力サイズはpointsのみで決まる。
+
+  Args:
+      items: 履歴データ（timestampと各フィールドを持つクエリ結果）
+      fields: 集計するフィールド名
+      start: 集計開始時刻（UTC）
+      end: 集計終了時刻（UTC）
+      points: バケット数
+
+  Returns:
+      Dict[str, Any]: フィールドごとの平均値リストとバケット開始時刻
+  """
+  span = (end - start).total_seconds()
+  width = span / points if points > 0 and span > 0 else 0
+
+  sums = {field: [0.0] * points for field in fields}
+  counts = {field: [0] * points for field in fields}
+
+  for item in items:
+    timestamp = parse_timestamp(item.get('timestamp'))
+    if timestamp is None or width == 0:
+      continue
+
+    index = int((timestamp - start).total_seconds() // width)
+    if index < 0 or index >= points:
+      # 終了時刻ちょうどのデータは最終バケットに含める
+      if index == points and timestamp <= end:
+        index = points - 1
+      else:
+        continue
+
+    for field in fields:
+      value = item.get(field)
+      if isinstance(value, bool) or not isinstance(value, (int, float)):
+        continue
+      sums[field][index] += value
+      counts[field][index] += 1
+
+  series = {}
+  for field in fields:
+    # データのないバケットはチャート上で欠損として扱うためNoneとする
+    series[field] = [
+        round(total / count, 2) if count else None
+        for total, count in zip(sums[field], counts[field])
+    ]
+
+  series['timestamps'] = [(start + timedelta(seconds=width * i)).isoformat() for i in range(points)]
+
+  return series
@@ -0,0 +1,221 @@
+"""
+ダッシュボードプッシュ配信モジュール
+Server-Sent Events (SSE) によるダッシュボード更新の差分配信機能
+"""
+
+import json
+import queue
+import threading
+import time
+import logging
+from collections import deque
+from datetime import datetime
+from typing import Dict, Any, Optional, Iterator, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class DashboardEventBroker:
+  """ダッシュボード更新イベントの配信管理クラス"""
+
+  def __init__(self, history_size: int = 256, heartbeat_interval: float = 15.0,
+               subscriber_queue_size: int = 100):
+    """
+    初期化
+
+    Args:
+        history_size: 再接続時の再送用に保持するイベント数
+        heartbeat_interval: ハートビート送信間隔（秒）
+        subscriber_queue_size: 購読者ごとの未送信イベント上限
+    """
+    self.heartbeat_interval = heartbeat_interval
+    self.subscriber_queue_size = subscriber_queue_size
+
+    self._lock = threading.Lock()
+    self._history: deque = deque(maxlen=history_size)
+    self._subscribers: List[queue.Queue] = []
+    self._next_id = 1
+    # ブローカー起動ごとに異なるIDとし、再起動前のトークンを判別する
+    self._epoch = format(int(time.time()), 'x')
+
+  def publish(self, event_type: str, data: Dict[str, Any]) -> str:
+    """
+    イベントを全購読者に配信
+
+    シリアライズは1回だけ行い、同じメッセージを全購読者に配る。
+
+    Args:
+        event_type: イベント種別（例: room, entrance）
+        data: 差分データ
+
+    Returns:
+        str: 発行したイベントID（再接続トークン）
+    """
+    with self._lock:
+      event_id = f"{self._epoch}-{self._next_id}"
+      self._next_id += 1
+
+      message = self._format_event(event_type, data, event_id)
+      self._history.append((event_id, message))
+
+      subscribers = list(self._subscribers)
+
+    for subscriber in subscribers:
+      try:
+        subscriber.put_nowait(message)
+      except queue.Full:
+        # 受信が追いつかない購読者は切断し、再接続時の再送に任せる
+        logger.warning("購読者のキューが満杯のため切断します")
+        self._unsubscribe(subscriber)
+        self._disconnect(subscriber)
+
+    return event_id
+
+  def stream(self, last_event_id: Optional[str] = None) -> Iterator[str]:
+    """
+    SSE形式のメッセージを順次返すジェネレータ
+
+    Args:
+        last_event_id: クライアントが最後に受信したイベントID
+
+    Returns:
+        Iterator[str]: SSEメッセージ
+    """
+    subscriber, backlog = self._subscribe(last_event_id)
+    try:
+      yield f"retry: {int(self.heartbeat_interval * 1000)}\n\n"
+
+      for message in backlog:
+        yield message
+
+      while True:
+        try:
+          message = subscriber.get(timeout=self.heartbeat_interval)
+        except queue.Empty:
+          yield f": heartbeat {datetime.utcnow().isoformat()}\n\n"
+          continue
+
+        if message is None:
+          break
+        yield message
+
+    finally:
+      self._unsubscribe(subscriber)
+
+  def subscriber_count(self) -> int:
+    """
+    接続中の購読者数を取得
+
+    Returns:
+        int: 購読者数
+    """
+    with self._lock:
+      return len(self._subscribers)
+
+  def close(self):
+    """全購読者の接続を終了"""
+    with self._lock:
+      subscribers = list(self._subscribers)
+      self._subscribers.clear()
+
+    for subscriber in subscribers:
+      self._disconnect(subscriber)
+
+  def _subscribe(self, last_event_id: Optional[str]) -> Tuple[queue.Queue, List[str]]:
+    """購読者を登録し、再送が必要なイベントを返す"""
+    subscriber = queue.Queue(maxsize=self.subscriber_queue_size)
+
+    with self._lock:
+      self._subscribers.append(subscriber)
+
+      if not last_event_id:
+        return subscriber, []
+
+      event_ids = [event_id for event_id, _ in self._history]
+      if last_event_id in event_ids:
+        index = event_ids.index(last_event_id)
+        return subscriber, [message for _, message in list(self._history)[index + 1:]]
+
+    # 保持範囲外のトークンはフルリロードを要求する
+    reset = self._format_event("reset", {"reason": "resume token expired"}, None)
+    return subscriber, [reset]
+
+  def _unsubscribe(self, subscriber: queue.Queue):
+    """購読者を登録解除"""
+    with self._lock:
+      if subscriber in self._subscribers:
+        self._subscribers.remove(subscriber)
+
+  @staticmethod
+  def _disconnect(subscriber: queue.Queue):
+    """未送信イベントを破棄して購読者に終了を通知"""
+    with subscriber.mutex:
+      subscriber.queue.clear()
+    subscriber.put_nowait(None)
+
+  @staticmethod
+  def _format_event(event_type: str, data: Dict[str, Any], event_id: Optional[str]) -> str:
+    """SSE形式のメッセージを構築"""
+    lines = []
+    if event_id:
+      lines.append(f"id: {event_id}")
+    lines.append(f"event: {event_type}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+
+# デバイスIDの接頭辞（例: kaiteki-001）から判別するデバイスタイプ
+KNOWN_DEVICE_TYPES = ("kaiteki", "aitrios")
+
+
+def infer_device_type(device_id: Optional[str], device_type: Optional[str] = None) -> Optional[str]:
+  """
+  センサーデータのデバイスタイプを判別
+
+  指定があればそのまま使用し、なければデバイスIDの接頭辞（"-"・"_"の前）から判別する。
+
+  Args:
+      device_id: デバイスID
+      device_type: リクエストで指定されたデバイスタイプ
+
+  Returns:
+      Optional[str]: デバイスタイプ（判別できない場合None）
+  """
+  if device_type:
+    return device_type
+
+  prefix = (device_id or "").lower().replace("_", "-").split("-", 1)[0]
+  return prefix if prefix in KNOWN_DEVICE_TYPES else None
+
+
+def build_sensor_delta(document: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+  """
+  センサードキュメントからダッシュボード差分を構築
+
+  Args:
+      document: 正規化済みセンサードキュメント
+
+  Returns:
+      Tuple[str, Dict[str, Any]]: イベント種別と差分データ
+  """
+  data = document.get('data', {})
+  timestamp = document.get('timestamp', datetime.utcnow().isoformat())
+
+  if document.get('deviceType') == 'kaiteki':
+    delta = {
+        "temperature": data.get('temperature'),
+        "humidity": data.get('humidity'),
+        "co2": data.get('co2'),
+        "pressure": data.get('pressure'),
+        "illuminance": data.get('illuminance'),
+        "isOccupied": data.get('occupancy'),
+        "human": data.get('human'),
+        "lastUpdate": timestamp
+    }
+    return "room", {key: value for key, value in delta.items() if value is not None}
+
+  delta = {
+      "currentVisitors": data.get('personCount'),
+      "lastUpdate": timestamp
+  }
+  return "entrance", {key: value for key, value in delta.items() if value is not None}
@@ -0,0 +1,239 @@
+"""
+IoT Hubフリート操作モジュール
+ツインクエリで対象にしたデバイス群へのツイン更新・ダイレクトメソッド呼び出しを
+同時実行数を制限して並行に実行し、進捗と結果を集計する機能
+"""
+
+import threading
+import time
+import uuid
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Any, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 保持する完了済みの操作の数
+MAX_RETAINED_OPERATIONS = 100
+
+
+class DeviceOperationError(Exception):
+  """デバイスが失敗を応答した操作（ダイレクトメソッドの応答ステータスが400以上など）"""
+
+  def __init__(self, message: str, status_code: Optional[int] = None, detail: Optional[Dict[str, Any]] = None):
+    """
+    初期化
+
+    Args:
+        message: エラーメッセージ
+        status_code: デバイスの応答ステータス
+        detail: 結果に含める情報
+    """
+    super().__init__(message)
+    self.status_code = status_code
+    self.detail = detail or {}
+
+
+def is_timeout(error: Exception) -> bool:
+  """
+  デバイスの応答タイムアウトかどうかを判定
+
+  azure-coreの例外に限らず、msrestの例外（HttpOperationError等）も
+  ステータスコードまたはメッセージで判定する。
+
+  Args:
+      error: デバイス操作の例外
+
+  Returns:
+      bool: ゲートウェイタイムアウト（504）またはタイムアウトのエラーの場合True
+  """
+  status_code = getattr(error, "status_code", None)
+  response = getattr(error, "response", None)
+  if status_code is None and response is not None:
+    status_code = getattr(response, "status_code", None)
+  message = str(error).lower()
+  return status_code == 504 or "timeout" in message or "timed out" in message
+
+
+class FleetOperation:
+  """デバイス群への1回の操作の進捗と結果を保持するクラス"""
+
+  def __init__(self, kind: str, condition: str, device_ids: List[str],
+               action: Callable[[str], Optional[Dict[str, Any]]], concurrency: int = 16,
+               deadline: Optional[float] = None):
+    """
+    初期化
+
+    Args:
+        kind: 操作の種類（twin・method など）
+        condition: 対象デバイスのクエリ条件
+        device_ids: 対象デバイスID
+        action: 1デバイス分の操作（戻り値は結果に含める情報）
+        concurrency: 同時に操作するデバイス数
+        deadline: 操作全体の制限秒数（超過後に開始前のデバイスはskippedにする）
+    """
+    self.operation_id = uuid.uuid4().hex
+    self.kind = kind
+    self.condition = condition
+    self.device_ids = device_ids
+    self.action = action
+    self.concurrency = max(1, concurrency)
+    self.deadline = deadline
+
+    self._lock = threading.Lock()
+    self._cancelled = threading.Event()
+    self._results: Dict[str, Dict[str, Any]] = {}
+    self._counts = {"succeeded": 0, "failed": 0, "timedOut": 0, "skipped": 0}
+    self._state = "pending"
+    self._created_at = datetime.utcnow().isoformat()
+    self._started: Optional[float] = None
+    self._finished: Optional[float] = None
+
+  def start(self):
+    """バックグラウンドで操作を開始"""
+    thread = threading.Thread(target=self.run, name=f"fleet-{self.operation_id[:8]}", daemon=True)
+    thread.start()
+
+  def run(self):
+    """全デバイスの操作を実行（完了まで待機）"""
+    with self._lock:
+      self._state = "running"
+      self._started = time.monotonic()
+
+    logger.info(f"フリート操作開始: {self.kind} ({len(self.device_ids)}台, 条件: {self.condition})")
+
+    with ThreadPoolExecutor(max_workers=min(self.concurrency, max(1, len(self.device_ids)))) as executor:
+      for device_id in self.device_ids:
+        executor.submit(self._run_device, device_id)
+
+    with self._lock:
+      self._state = "cancelled" if self._cancelled.is_set() else "completed"
+      self._finished = time.monotonic()
+
+    logger.info(
+        f"フリート操作完了: {self.kind} ({self._counts['succeeded']}台成功, {self._counts['failed']}台失敗, "
+        f"{self._counts['timedOut']}台タイムアウト, {self._counts['skipped']}台スキップ)"
+    )
+
+  def cancel(self):
+    """開始前のデバイスの操作を中止"""
+    self._cancelled.set()
+
+  def status(self, include_results: bool = True) -> Dict[str, Any]:
+    """
+    進捗と結果を取得
+
+    Args:
+        include_results: デバイスごとの結果を含めるかどうか
+
+    Returns:
+        Dict[str, Any]: 状態・件数・経過秒数・タイムアウトしたデバイス・デバイスごとの結果
+    """
+    with self._lock:
+      completed = sum(self._counts.values())
+      end = self._finished if self._finished is not None else time.monotonic()
+      status = {
+          "operationId": self.operation_id,
+          "kind": self.kind,
+          "condition": self.condition,
+          "state": self._state,
+          "createdAt": self._created_at,
+          "total": len(self.device_ids),
+          "completed": completed,
+          "progress": completed / len(self.device_ids) if self.device_ids else 1.0,
+          **self._counts,
+          "elapsedSeconds": round(end - self._started, 1) if self._started is not None else 0.0,
+          "timedOutDevices": sorted(
+              device_id for device_id, result in self._results.items() if result["result"] == "timedOut"
+          )
+      }
+      if include_results:
+        status["results"] = [self._results[device_id] for device_id in sorted(self._results)]
+      return status
+
+  @property
+  def finished(self) -> bool:
+    """操作が終了したかどうか"""
+    with self._lock:
+      return self._state in ("completed", "cancelled")
+
+  def _run_device(self, device_id: str):
+    """1デバイス分の操作を実行し、結果を記録"""
+    if self._cancelled.is_set() or (self.deadline is not None
+                                    and time.monotonic() - self._started >= self.deadline):
+      self._record(device_id, {"result": "skipped"})
+      return
+
+    try:
+      detail = self.action(device_id) or {}
+      self._record(device_id, {"result": "succeeded", **detail})
+    except Exception as e:
+      # SDKの例外の種類（azure-core・msrest）によらず、タイムアウトかどうかで分類する
+      detail = getattr(e, "detail", {})
+      if is_timeout(e):
+        self._record(device_id, {"result": "timedOut", **detail, "error": str(e)})
+      else:
+        logger.error(f"フリート操作エラー ({device_id}): {e}")
+        self._record(device_id, {"result": "failed", **detail, "error": str(e)})
+
+  def _record(self, device_id: str, result: Dict[str, Any]):
+    """結果を記録"""
+    with self._lock:
+      self._results[device_id] = {"deviceId": device_id, **result}
+      self._counts[result["result"]] += 1
+
+
+class FleetOperationRegistry:
+  """実行中・完了済みのフリート操作を保持するクラス"""
+
+  def __init__(self, max_retained: int = MAX_RETAINED_OPERATIONS):
+    """
+    初期化
+
+    Args:
+        max_retained: 保持する操作の数の上限（超えた場合は古い完了済みの操作から削除）
+    """
+    self.max_retained = max_retained
+    self._lock = threading.Lock()
+    self._operations: "OrderedDict[str, FleetOperation]" = OrderedDict()
+
+  def add(self, operation: FleetOperation):
+    """
+    操作を登録
+
+    Args:
+        operation: フリート操作
+    """
+    with self._lock:
+      self._operations[operation.operation_id] = operation
+      for operation_id in list(self._operations):
+        if len(self._operations) <= self.max_retained:
+          break
+        if self._operations[operation_id].finished:
+          del self._operations[operation_id]
+
+  def get(self, operation_id: str) -> Optional[FleetOperation]:
+    """
+    操作を取得
+
+    Args:
+        operation_id: 操作ID
+
+    Returns:
+        Optional[FleetOperation]: フリート操作（存在しない場合None）
+    """
+    with self._lock:
+      return self._operations.get(operation_id)
+
+  def summaries(self) -> List[Dict[str, Any]]:
+    """
+    操作の一覧を取得（デバイスごとの結果は含めない）
+
+    Returns:
+        List[Dict[str, Any]]: 新しい順の進捗のリスト
+    """
+    with self._lock:
+      operations = list(self._operations.values())
+    return [operation.status(include_results=False) for operation in reversed(operations)]
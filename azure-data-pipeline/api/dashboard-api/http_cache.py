@@ -0,0 +1,334 @@
+"""
+HTTPレスポンスキャッシュモジュール
+ETag / 条件付きGETおよび圧縮によるダッシュボードAPIレスポンスの再利用機能
+"""
+
+import gzip
+import hashlib
+import threading
+import time
+import logging
+from collections import OrderedDict
+from datetime import datetime, timezone
+from functools import wraps
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from flask import Response, request
+
+try:
+  import brotli
+except ImportError:
+  # brotli未インストール時はgzipのみ対応
+  brotli = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'text/html',
+    'text/css',
+    'text/plain',
+    'application/javascript'
+}
+
+
+def supported_encodings() -> list:
+  """
+  対応している圧縮形式を優先順に取得
+
+  Returns:
+      list: Content-Encoding名のリスト
+  """
+  return ['br', 'gzip'] if brotli else ['gzip']
+
+
+def select_encoding(req=None) -> Optional[str]:
+  """
+  リクエストのAccept-Encodingから圧縮形式を選択
+
+  Args:
+      req: リクエスト（省略時はFlaskのrequest）
+
+  Returns:
+      Optional[str]: 圧縮形式（非対応の場合None）
+  """
+  req = request if req is None else req
+  return req.accept_encodings.best_match(supported_encodings())
+
+
+def compress_body(body: bytes, encoding: str) -> bytes:
+  """
+  レスポンス本文を圧縮
+
+  Args:
+      body: 本文
+      encoding: 圧縮形式（br / gzip）
+
+  Returns:
+      bytes: 圧縮済み本文
+  """
+  if encoding == 'br':
+    return brotli.compress(body, quality=5)
+  return gzip.compress(body, compresslevel=6)
+
+
+def compress_response(response: Response, min_size: int = 1024) -> Response:
+  """
+  レスポンスをAccept-Encodingに応じて圧縮（after_request用）
+
+  ストリーミングレスポンスや圧縮済み・閾値未満のレスポンスはそのまま返す。
+
+  Args:
+      response: レスポンス
+      min_size: 圧縮する最小バイト数
+
+  Returns:
+      Response: レスポンス
+  """
+  if not _is_compressible(response):
+    return response
+
+  response.vary.add('Accept-Encoding')
+
+  body = response.get_data()
+  encoding = select_encoding()
+  if not encoding or len(body) < min_size:
+    return response
+
+  response.set_data(compress_body(body, encoding))
+  response.headers['Content-Encoding'] = encoding
+  return response
+
+
+async def compress_response_async(response, req, min_size: int = 1024):
+  """
+  Quartのレスポンスを圧縮（after_request用、compress_responseの非同期版）
+
+  Args:
+      response: Quartのレスポンス
+      req: Quartのリクエスト
+      min_size: 圧縮する最小バイト数
+
+  Returns:
+      レスポンス
+  """
+  if not _is_compressible(response):
+    return response
+
+  response.vary.add('Accept-Encoding')
+
+  body = await response.get_data()
+  encoding = select_encoding(req)
+  if not encoding or len(body) < min_size:
+    return response
+
+  response.set_data(compress_body(body, encoding))
+  response.headers['Content-Encoding'] = encoding
+  return response
+
+
+def _is_compressible(response) -> bool:
+  """圧縮対象のレスポンスかどうか（ストリーミング・圧縮済み・非テキストは対象外）"""
+  return not (response.status_code != 200 or getattr(response, 'is_streamed', False)
+              or getattr(response, 'direct_passthrough', False)
+              or 'Content-Encoding' in response.headers
+              or response.mimetype not in COMPRESSIBLE_MIMETYPES)
+
+
+class ConditionalResponseCache:
+  """条件付きGET対応のレスポンスキャッシュ管理クラス"""
+
+  def __init__(self, max_entries: int = 256, max_age: int = 300, min_compress_size: int = 1024,
+               enabled: bool = True):
+    """
+    初期化
+
+    Args:
+        max_entries: 保持するレスポンスの最大数
+        max_age: バージョンが変わらなくても再計算するまでの秒数
+                 （過去24時間などの移動窓を定期的に更新するため）
+        min_compress_size: 圧縮する最小バイト数
+        enabled: Falseの場合はキャッシュ・条件付きGETを行わずビューを毎回実行する
+    """
+    self.max_entries = max_entries
+    self.max_age = max_age
+    self.min_compress_size = min_compress_size
+    self.enabled = enabled
+
+    self._lock = threading.Lock()
+    self._entries: OrderedDict = OrderedDict()
+
+  def conditional(self, version_func: Callable[[], Optional[float]]):
+    """
+    条件付きGETに対応させるデコレータ
+
+    version_funcは対象データの更新時刻（エポック秒、Cosmos DBの_ts等）を
+    安価に返す関数とする。バージョンが一致する間はビューを実行せず、
+    If-None-Matchが一致すれば304、そうでなければキャッシュ済みの本文を返す。
+    圧縮済みの本文も圧縮形式ごとにエントリに保持し、リクエストごとに再圧縮しない。
+
+    Args:
+        version_func: データバージョンを返す関数
+
+    Returns:
+        Callable: デコレータ
+    """
+    def decorator(view):
+      @wraps(view)
+      def wrapper(*args, **kwargs):
+        if not self.enabled:
+          return view(*args, **kwargs)
+
+        try:
+          version = version_func()
+        except Exception as e:
+          # バージョン取得に失敗した場合はキャッシュを使わずに処理する
+          logger.warning(f"バージョン取得エラー: {e}")
+          return view(*args, **kwargs)
+
+        key, etag, encoding, cached = self._lookup(request, version, Response)
+        if cached is not None:
+          return cached
+
+        response = view(*args, **kwargs)
+        if isinstance(response, tuple):
+          # エラー時の (body, status) はキャッシュしない
+          return response
+
+        entry = self._store(key, etag, version, response.get_data(), response.mimetype)
+        return self._build_response(entry, encoding, Response)
+
+      return wrapper
+    return decorator
+
+  def conditional_async(self, version_func: Callable[[], Awaitable[Optional[float]]]):
+    """
+    Quartの非同期ビューを条件付きGETに対応させるデコレータ（conditionalの非同期版）
+
+    Args:
+        version_func: データバージョンを返すコルーチン関数
+
+    Returns:
+        Callable: デコレータ
+    """
+    from quart import Response as AsyncResponse, request as async_request
+
+    def decorator(view):
+      @wraps(view)
+      async def wrapper(*args, **kwargs):
+        if not self.enabled:
+          return await view(*args, **kwargs)
+
+        try:
+          version = await version_func()
+        except Exception as e:
+          logger.warning(f"バージョン取得エラー: {e}")
+          return await view(*args, **kwargs)
+
+        key, etag, encoding, cached = self._lookup(async_request, version, AsyncResponse)
+        if cached is not None:
+          return cached
+
+        response = await view(*args, **kwargs)
+        if isinstance(response, tuple):
+          return response
+
+        entry = self._store(key, etag, version, await response.get_data(), response.mimetype)
+        return self._build_response(entry, encoding, AsyncResponse)
+
+      return wrapper
+    return decorator
+
+  def clear(self):
+    """キャッシュを全削除"""
+    with self._lock:
+      self._entries.clear()
+
+  def _lookup(self, req, version: Optional[float], response_class) -> Tuple[str, str, Optional[str], Any]:
+    """
+    リクエストのETag・キャッシュを確認
+
+    Returns:
+        Tuple: キー・ETag・圧縮形式と、304またはキャッシュ済みのレスポンス（ビューの実行が必要な場合None）
+    """
+    key = req.full_path
+    etag = self._make_etag(key, version)
+    encoding = select_encoding(req)
+
+    # 圧縮形式ごとにETagを分けているため、いずれかが一致すれば未変更とする
+    for candidate in (etag, f"{etag}-{encoding}"):
+      if req.if_none_match.contains(candidate):
+        return key, etag, encoding, self._not_modified(candidate, version, response_class)
+
+    entry = self._get(key)
+    if entry and entry["etag"] == etag:
+      return key, etag, encoding, self._build_response(entry, encoding, response_class)
+
+    return key, etag, encoding, None
+
+  def _store(self, key: str, etag: str, version: Optional[float], body: bytes, mimetype: str) -> Dict[str, Any]:
+    """ビューの結果をエントリとして保存"""
+    entry = {
+        "etag": etag,
+        "version": version,
+        "body": body,
+        "mimetype": mimetype,
+        "encoded": {}
+    }
+    self._put(key, entry)
+    return entry
+
+  def _make_etag(self, key: str, version: Optional[float]) -> str:
+    """キー・バージョン・更新周期からETagを生成"""
+    window = int(time.time() // self.max_age) if self.max_age > 0 else 0
+    digest = hashlib.sha1(f"{key}|{version}|{window}".encode('utf-8')).hexdigest()
+    return digest[:20]
+
+  def _get(self, key: str) -> Optional[Dict[str, Any]]:
+    """エントリを取得し、最近使用したものとして記録"""
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is not None:
+        self._entries.move_to_end(key)
+      return entry
+
+  def _put(self, key: str, entry: Dict[str, Any]):
+    """エントリを保存し、上限を超えた古いものを破棄"""
+    with self._lock:
+      self._entries[key] = entry
+      self._entries.move_to_end(key)
+      while len(self._entries) > self.max_entries:
+        self._entries.popitem(last=False)
+
+  def _build_response(self, entry: Dict[str, Any], encoding: Optional[str], response_class=Response):
+    """キャッシュエントリからレスポンスを構築（必要に応じて圧縮）"""
+    if not encoding or len(entry["body"]) < self.min_compress_size:
+      response = response_class(entry["body"], mimetype=entry["mimetype"])
+      self._set_validators(response, entry["etag"], entry["version"])
+      return response
+
+    encoded = entry["encoded"].get(encoding)
+    if encoded is None:
+      encoded = compress_body(entry["body"], encoding)
+      entry["encoded"][encoding] = encoded
+
+    response = response_class(encoded, mimetype=entry["mimetype"])
+    response.headers["Content-Encoding"] = encoding
+    self._set_validators(response, f"{entry['etag']}-{encoding}", entry["version"])
+    return response
+
+  def _not_modified(self, etag: str, version: Optional[float], response_class=Response):
+    """304レスポンスを構築"""
+    response = response_class(status=304)
+    self._set_validators(response, etag, version)
+    return response
+
+  @staticmethod
+  def _set_validators(response, etag: str, version: Optional[float]):
+    """ETag・Last-Modified・Cache-Controlヘッダーを設定"""
+    response.set_etag(etag)
+    response.vary.add('Accept-Encoding')
+    if version:
+      response.last_modified = datetime.fromtimestamp(version, tz=timezone.utc)
+    # ブラウザに毎回再検証させる
+    response.headers["Cache-Control"] = "no-cache"
@@ -7,11 +7,15 @@ import os
 import json
 import logging
 from datetime import datetime
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Iterator
 from azure.iot.hub import IoTHubRegistryManager
-from azure.iot.hub.models import CloudToDeviceMethod, Twin
+from azure.iot.hub.models import CloudToDeviceMethod, QuerySpecification, Twin, TwinProperties
 from azure.core.exceptions import AzureError
 
+from device_bulk import IMPORT_MODES, build_entry, bulk_device_id, run_bulk_operation, validate_devices
+from device_registry import DeviceRegistryCache
+from fleet_operations import DeviceOperationError, FleetOperation, FleetOperationRegistry
+
 logger = logging.getLogger(__name__)
 
 
@@ -30,6 +34,23 @@ class IoTHubManager:
 
     self.registry_manager = IoTHubRegistryManager(self.connection_string)
 
+    # デバイスツインのクエリ設定
+    self.query_page_size = int(os.getenv('IOT_HUB_QUERY_PAGE_SIZE', 100))
+
+    # デバイスレジストリのキャッシュ設定
+    self.registry_cache = DeviceRegistryCache(
+        self.query_twins,
+        max_staleness=float(os.getenv('IOT_HUB_REGISTRY_MAX_STALENESS', 60)),
+        full_reload_interval=float(os.getenv('IOT_HUB_REGISTRY_FULL_RELOAD_INTERVAL', 3600))
+    )
+
+    # 一括操作の同時実行数
+    self.bulk_concurrency = int(os.getenv('IOT_HUB_BULK_CONCURRENCY', 4))
+
+    # フリート操作の同時実行数
+    self.fleet_concurrency = int(os.getenv('IOT_HUB_FLEET_CONCURRENCY', 16))
+    self.fleet_operations = FleetOperationRegistry()
+
   def create_device(self, device_id: str, device_type: str = "sensor") -> bool:
     """
     デバイスを作成
@@ -43,16 +64,18 @@ class IoTHubManager:
     """
     try:
       # デバイスツインの初期設定
-      twin = Twin()
-      twin.tags = {
-          "deviceType": device_type,
-          "createdAt": datetime.utcnow().isoformat(),
-          "status": "active"
-      }
-      twin.properties.desired = {
-          "telemetryInterval": 30,
-          "reportingEnabled": True
-      }
+      # Twin()のpropertiesはNoneのため、desiredプロパティはTwinPropertiesで指定する
+      twin = Twin(
+          tags={
+              "deviceType": device_type,
+              "createdAt": datetime.utcnow().isoformat(),
+              "status": "active"
+          },
+          properties=TwinProperties(desired={
+              "telemetryInterval": 30,
+              "reportingEnabled": True
+          })
+      )
 
       # デバイスを作成
       self.registry_manager.create_device_with_sas(
@@ -64,6 +87,7 @@ class IoTHubManager:
           twin=twin
       )
 
+      self.registry_cache.invalidate(device_id)
       logger.info(f"デバイスを作成しました: {device_id}")
       return True
 
@@ -83,6 +107,7 @@ class IoTHubManager:
     """
     try:
       self.registry_manager.delete_device(device_id)
+      self.registry_cache.remove(device_id)
       logger.info(f"デバイスを削除しました: {device_id}")
       return True
 
@@ -90,6 +115,75 @@ class IoTHubManager:
       logger.error(f"IoT Hubデバイス削除エラー: {e}")
       return False
 
+  def bulk_devices(self, operation: str, devices: List[Any], dry_run: bool = False) -> Dict[str, Any]:
+    """
+    デバイスを一括で作成・更新・削除
+
+    レジストリの一括操作（1回最大100デバイス）に分割し、IOT_HUB_BULK_CONCURRENCY 件ずつ並行に実行する。
+    updateはツインのタグ・desiredプロパティを更新する。
+
+    Args:
+        operation: create・update・delete
+        devices: create は {"deviceId", "deviceType"}、update は {"deviceId", "tags", "properties"}、
+                 delete はデバイスIDのリスト
+        dry_run: Trueの場合、レジストリキャッシュで検証した結果のみを返し変更しない
+
+    Returns:
+        Dict[str, Any]: 件数の集計（入力の件数 = succeeded + failed + invalid + planned）と入力ごとの結果
+
+    Raises:
+        ValueError: 不明な操作の場合
+    """
+    if operation not in IMPORT_MODES:
+      raise ValueError(f"不明な一括操作です: {operation}")
+
+    existing = {device["deviceId"] for device in self.registry_cache.devices()} if dry_run else None
+    errors = validate_devices(operation, devices, existing)
+
+    results = []
+    targets = []
+    for index, device in enumerate(devices):
+      if index in errors:
+        device_id = bulk_device_id(device)
+        results.append({
+            "deviceId": str(device_id) if device_id is not None else f"#{index}",
+            "result": "invalid",
+            "error": errors[index]
+        })
+      else:
+        targets.append(device)
+
+    if dry_run:
+      results.extend({"deviceId": bulk_device_id(device), "result": "planned"} for device in targets)
+    else:
+      entries = [build_entry(operation, device) for device in targets]
+      outcomes = run_bulk_operation(self.registry_manager, entries, self.bulk_concurrency)
+      for device_id, error in outcomes.items():
+        if error is None:
+          if operation == "delete":
+            self.registry_cache.remove(device_id)
+          else:
+            self.registry_cache.invalidate(device_id)
+          results.append({"deviceId": device_id, "result": "succeeded"})
+        else:
+          results.append({"deviceId": device_id, "result": "failed", "error": error})
+
+    summary = {
+        "operation": operation,
+        "dryRun": dry_run,
+        "total": len(devices),
+        "succeeded": len([r for r in results if r["result"] == "succeeded"]),
+        "failed": len([r for r in results if r["result"] == "failed"]),
+        "invalid": len(errors),
+        "planned": len([r for r in results if r["result"] == "planned"]),
+        "results": results
+    }
+    logger.info(
+        f"デバイス一括操作 {operation}{' (dry-run)' if dry_run else ''}: "
+        f"{summary['succeeded']}件成功, {summary['failed']}件失敗, {summary['invalid']}件不正"
+    )
+    return summary
+
   def get_device_twin(self, device_id: str) -> Optional[Dict[str, Any]]:
     """
     デバイスツインを取得
@@ -132,10 +226,10 @@ class IoTHubManager:
         bool: 成功時True
     """
     try:
-      twin = Twin()
-      twin.properties.desired = properties
+      twin = Twin(properties=TwinProperties(desired=properties))
 
       self.registry_manager.update_twin(device_id, twin, twin.etag)
+      self.registry_cache.invalidate(device_id)
       logger.info(f"デバイスツインを更新しました: {device_id}")
       return True
 
@@ -172,7 +266,7 @@ class IoTHubManager:
 
   def get_device_list(self, max_count: int = 100) -> List[Dict[str, Any]]:
     """
-    デバイスリストを取得
+    デバイスリストを取得（レジストリキャッシュから）
 
     Args:
         max_count: 最大取得件数
@@ -181,16 +275,14 @@ class IoTHubManager:
         List[Dict[str, Any]]: デバイスリスト
     """
     try:
-      devices = self.registry_manager.get_devices(max_count)
-
       device_list = []
-      for device in devices:
+      for device in self.registry_cache.devices()[:max_count]:
         device_info = {
-            "deviceId": device.device_id,
-            "status": device.status,
-            "authenticationType": device.authentication_type,
-            "lastActivityTime": device.last_activity_time.isoformat() if device.last_activity_time else None,
-            "cloudToDeviceMessageCount": device.cloud_to_device_message_count
+            "deviceId": device["deviceId"],
+            "status": device["status"],
+            "authenticationType": device["authenticationType"],
+            "lastActivityTime": device["lastActivityTime"],
+            "cloudToDeviceMessageCount": device["cloudToDeviceMessageCount"]
         }
         device_list.append(device_info)
 
@@ -200,30 +292,58 @@ class IoTHubManager:
       logger.error(f"IoT Hubデバイスリスト取得エラー: {e}")
       return []
 
+  def query_twins(self, query: str) -> Iterator[Twin]:
+    """
+    IoT Hubクエリ言語でデバイスツインを検索
+
+    継続トークンで全ページを順に取得する（1ページは IOT_HUB_QUERY_PAGE_SIZE 件）。
+
+    Args:
+        query: クエリ（例: SELECT deviceId, status, tags FROM devices）
+
+    Yields:
+        Twin: デバイスツイン（SELECTで指定した項目のみ）
+    """
+    continuation_token = None
+    while True:
+      result = self.registry_manager.query_iot_hub(
+          QuerySpecification(query=query),
+          continuation_token,
+          self.query_page_size
+      )
+      for twin in result.items or []:
+        yield twin
+
+      continuation_token = result.continuation_token
+      if not continuation_token:
+        break
+
   def get_device_statistics(self) -> Dict[str, Any]:
     """
     デバイス統計情報を取得
 
+    デバイスごとにツインを取得せず、レジストリキャッシュの状態とタグを集計する。
+
     Returns:
         Dict[str, Any]: 統計情報
     """
     try:
-      devices = self.get_device_list()
-
-      total_devices = len(devices)
-      enabled_devices = len([d for d in devices if d["status"] == "enabled"])
-      disabled_devices = len([d for d in devices if d["status"] == "disabled"])
+      total_devices = 0
+      enabled_devices = 0
+      disabled_devices = 0
 
       # デバイスタイプ別の統計
       device_types = {}
-      for device in devices:
-        try:
-          twin = self.get_device_twin(device["deviceId"])
-          if twin and "tags" in twin and "deviceType" in twin["tags"]:
-            device_type = twin["tags"]["deviceType"]
-            device_types[device_type] = device_types.get(device_type, 0) + 1
-        except Exception:
-          continue
+      for device in self.registry_cache.devices():
+        total_devices += 1
+        if device["status"] == "enabled":
+          enabled_devices += 1
+        elif device["status"] == "disabled":
+          disabled_devices += 1
+
+        device_type = device["tags"].get("deviceType")
+        if device_type:
+          device_types[device_type] = device_types.get(device_type, 0) + 1
 
       stats = {
           "totalDevices": total_devices,
@@ -275,6 +395,7 @@ class IoTHubManager:
     """
     try:
       self.registry_manager.update_device(device_id, status="enabled")
+      self.registry_cache.invalidate(device_id)
       logger.info(f"デバイスを有効化しました: {device_id}")
       return True
 
@@ -294,9 +415,154 @@ class IoTHubManager:
     """
     try:
       self.registry_manager.update_device(device_id, status="disabled")
+      self.registry_cache.invalidate(device_id)
       logger.info(f"デバイスを無効化しました: {device_id}")
       return True
 
     except AzureError as e:
       logger.error(f"IoT Hubデバイス無効化エラー: {e}")
       return False
+
+  def fleet_device_ids(self, condition: str) -> List[str]:
+    """
+    ツインクエリの条件に一致するデバイスIDを取得
+
+    Args:
+        condition: WHERE句の条件（例: tags.deviceType = 'kaiteki'）
+
+    Returns:
+        List[str]: デバイスIDのリスト
+    """
+    return sorted(twin.device_id for twin in self.query_twins(f"SELECT deviceId FROM devices WHERE {condition}"))
+
+  def start_fleet_operation(self, kind: str, condition: str, action, deadline: Optional[float] = None,
+                            concurrency: Optional[int] = None) -> Dict[str, Any]:
+    """
+    条件に一致するデバイス群への操作をバックグラウンドで開始
+
+    Args:
+        kind: 操作の種類
+        condition: 対象デバイスのツインクエリ条件
+        action: 1デバイス分の操作（デバイスIDを受け取る）
+        deadline: 操作全体の制限秒数
+        concurrency: 同時に操作するデバイス数（省略時は IOT_HUB_FLEET_CONCURRENCY）
+
+    Returns:
+        Dict[str, Any]: 開始時の進捗（operationIdで進捗を取得する）
+
+    Raises:
+        ValueError: 条件が空の場合
+    """
+    if not condition or not condition.strip():
+      raise ValueError("対象デバイスの条件は必須です")
+
+    device_ids = self.fleet_device_ids(condition)
+    operation = FleetOperation(kind, condition, device_ids, action,
+                               concurrency=concurrency or self.fleet_concurrency, deadline=deadline)
+    self.fleet_operations.add(operation)
+    operation.start()
+    return operation.status(include_results=False)
+
+  def fleet_update_twin(self, condition: str, properties: Dict[str, Any],
+                        deadline: Optional[float] = None) -> Dict[str, Any]:
+    """
+    条件に一致するデバイスのdesiredプロパティを並行に更新
+
+    Args:
+        condition: 対象デバイスのツインクエリ条件（例: tags.deviceType = 'kaiteki'）
+        properties: 更新するプロパティ
+        deadline: 操作全体の制限秒数
+
+    Returns:
+        Dict[str, Any]: 開始時の進捗
+    """
+    def update(device_id: str) -> Dict[str, Any]:
+      twin = Twin(properties=TwinProperties(desired=properties))
+      updated = self.registry_manager.update_twin(device_id, twin)
+      self.registry_cache.invalidate(device_id)
+      return {"version": getattr(updated, "version", None)}
+
+    return self.start_fleet_operation("twin", condition, update, deadline)
+
+  def fleet_configure_telemetry(self, condition: str, interval: int = 30,
+                                deadline: Optional[float] = None) -> Dict[str, Any]:
+    """
+    条件に一致するデバイスのテレメトリ設定を並行に更新
+
+    Args:
+        condition: 対象デバイスのツインクエリ条件
+        interval: テレメトリ間隔（秒）
+        deadline: 操作全体の制限秒数
+
+    Returns:
+        Dict[str, Any]: 開始時の進捗
+    """
+    properties = {
+        "telemetryInterval": interval,
+        "reportingEnabled": True,
+        "lastConfigured": datetime.utcnow().isoformat()
+    }
+    return self.fleet_update_twin(condition, properties, deadline)
+
+  def fleet_invoke_method(self, condition: str, method_name: str, payload: Any = None,
+                          response_timeout: int = 30, connect_timeout: int = 10,
+                          deadline: Optional[float] = None) -> Dict[str, Any]:
+    """
+    条件に一致するデバイスのダイレクトメソッドを並行に呼び出す（応答ステータスが400以上の場合は失敗とする）
+
+    Args:
+        condition: 対象デバイスのツインクエリ条件
+        method_name: メソッド名
+        payload: メソッドのペイロード
+        response_timeout: デバイスの応答を待つ秒数
+        connect_timeout: オフラインのデバイスの接続を待つ秒数
+        deadline: 操作全体の制限秒数
+
+    Returns:
+        Dict[str, Any]: 開始時の進捗
+    """
+    method = CloudToDeviceMethod(
+        method_name=method_name,
+        payload=payload,
+        response_timeout_in_seconds=response_timeout,
+        connect_timeout_in_seconds=connect_timeout
+    )
+
+    def invoke(device_id: str) -> Dict[str, Any]:
+      response = self.registry_manager.invoke_device_method(device_id, method)
+      detail = {"status": response.status, "payload": response.payload}
+      if response.status is not None and response.status >= 400:
+        # デバイスが失敗を応答した場合は失敗として記録する
+        raise DeviceOperationError(f"メソッドが失敗を応答しました: {response.status}", response.status, detail)
+      return detail
+
+    return self.start_fleet_operation("method", condition, invoke, deadline)
+
+  def get_fleet_operation(self, operation_id: str) -> Optional[Dict[str, Any]]:
+    """
+    フリート操作の進捗と結果を取得
+
+    Args:
+        operation_id: 操作ID
+
+    Returns:
+        Optional[Dict[str, Any]]: 進捗とデバイスごとの結果（存在しない場合None）
+    """
+    operation = self.fleet_operations.get(operation_id)
+    return operation.status() if operation else None
+
+  def cancel_fleet_operation(self, operation_id: str) -> bool:
+    """
+    フリート操作の開始前のデバイスを中止
+
+    Args:
+        operation_id: 操作ID
+
+    Returns:
+        bool: 操作が存在した場合True
+    """
+    operation = self.fleet_operations.get(operation_id)
+    if operation is None:
+      return False
+    operation.cancel()
+    return True
@@ -0,0 +1,476 @@
+"""
+ローカル検索モジュール
+SQLite（FTS5の全文検索とB-treeインデックス）でAI Searchの検索・フィルター・ソート・ファセットの一部を再現し、
+オフラインでの負荷試験やエッジ環境での検索に使用する機能
+"""
+
+import json
+import re
+import sqlite3
+import threading
+import logging
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from azure.search.documents.indexes.models import SearchFieldDataType
+
+from downsampling import parse_timestamp
+from search_schema import SCHEMA_FIELDS
+
+logger = logging.getLogger(__name__)
+
+# AI Searchのフィールド型とSQLiteの型（DATETIMEは固定長のISO形式の文字列で保存する）
+SQLITE_TYPES = {
+    SearchFieldDataType.String: "TEXT",
+    SearchFieldDataType.DateTimeOffset: "DATETIME",
+    SearchFieldDataType.Double: "REAL",
+    SearchFieldDataType.Int32: "INTEGER",
+    SearchFieldDataType.Int64: "INTEGER"
+}
+
+# 全文検索の対象フィールド
+SEARCHABLE_FIELDS = ("content", "deviceId", "deviceType")
+
+# B-treeインデックスを作成するフィールド（フィルター・ソートに使用）
+INDEXED_FIELDS = ("deviceId", "deviceType", "timestamp", "temperature", "personCount")
+
+_TOKEN_PATTERN = re.compile(
+    r"\s*(?:(?P<lparen>\()|(?P<rparen>\))|(?P<string>'(?:[^']|'')*')"
+    r"|(?P<datetime>\d{4}-\d{2}-\d{2}T[0-9:.]+(?:Z|[+-]\d{2}:\d{2})?)"
+    r"|(?P<number>-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)|(?P<word>[A-Za-z_][A-Za-z0-9_]*))"
+)
+
+_COMPARISONS = {"eq": "=", "ne": "!=", "gt": ">", "ge": ">=", "lt": "<", "le": "<="}
+
+
+def _datetime_value(value: Any) -> Optional[str]:
+  """時刻を比較・ソートできる固定長のISO形式（UTC）に変換"""
+  parsed = value if isinstance(value, datetime) else parse_timestamp(str(value))
+  if parsed is None:
+    raise ValueError(f"不正な時刻です: {value}")
+  if parsed.tzinfo is not None:
+    parsed = parse_timestamp(parsed.isoformat())
+  return parsed.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+def field_types(version: int) -> Dict[str, str]:
+  """
+  スキーマバージョンのインデックス定義からフィールドとSQLiteの型を取得
+
+  Args:
+      version: スキーマバージョン
+
+  Returns:
+      Dict[str, str]: フィールド名とSQLiteの型
+
+  Raises:
+      ValueError: 不明なスキーマバージョン、またはSQLiteで扱えない型のフィールドがある場合
+  """
+  if version not in SCHEMA_FIELDS:
+    raise ValueError(f"不明なスキーマバージョンです: {version}")
+  types = {}
+  for field in SCHEMA_FIELDS[version]():
+    if field.type not in SQLITE_TYPES:
+      raise ValueError(f"ローカル検索で扱えないフィールド型です: {field.name} ({field.type})")
+    types[field.name] = SQLITE_TYPES[field.type]
+  return types
+
+
+def _column(field_name: str, types: Dict[str, str]) -> str:
+  """フィールド名を列名に変換（インデックスにないフィールドはエラー）"""
+  if field_name not in types:
+    raise ValueError(f"不明なフィールドです: {field_name}")
+  return f'"{field_name}"'
+
+
+class _FilterParser:
+  """ODataフィルター式（比較・and・or・not・括弧）をSQLのWHERE句に変換"""
+
+  def __init__(self, expression: str, types: Dict[str, str]):
+    self.types = types
+    self.tokens = self._tokenize(expression)
+    self.position = 0
+    self.params: List[Any] = []
+
+  @staticmethod
+  def _tokenize(expression: str) -> List[Tuple[str, str]]:
+    tokens = []
+    index = 0
+    expression = expression.rstrip()
+    while index < len(expression):
+      match = _TOKEN_PATTERN.match(expression, index)
+      if not match or match.end() == index:
+        raise ValueError(f"フィルター式を解析できません: {expression[index:]}")
+      tokens.append((match.lastgroup, match.group(match.lastgroup)))
+      index = match.end()
+    return tokens
+
+  def parse(self) -> str:
+    sql = self._or()
+    if self.position != len(self.tokens):
+      raise ValueError(f"フィルター式を解析できません: {self.tokens[self.position][1]}")
+    return sql
+
+  def _peek_word(self) -> Optional[str]:
+    if self.position < len(self.tokens) and self.tokens[self.position][0] == "word":
+      return self.tokens[self.position][1].lower()
+    return None
+
+  def _next(self) -> Tuple[str, str]:
+    if self.position >= len(self.tokens):
+      raise ValueError("フィルター式が途中で終わっています")
+    token = self.tokens[self.position]
+    self.position += 1
+    return token
+
+  def _or(self) -> str:
+    parts = [self._and()]
+    while self._peek_word() == "or":
+      self.position += 1
+      parts.append(self._and())
+    return parts[0] if len(parts) == 1 else "(" + " OR ".join(parts) + ")"
+
+  def _and(self) -> str:
+    parts = [self._not()]
+    while self._peek_word() == "and":
+      self.position += 1
+      parts.append(self._not())
+    return parts[0] if len(parts) == 1 else "(" + " AND ".join(parts) + ")"
+
+  def _not(self) -> str:
+    if self._peek_word() == "not":
+      self.position += 1
+      return f"NOT {self._not()}"
+    kind, value = self._next()
+    if kind == "lparen":
+      sql = self._or()
+      if self._next()[0] != "rparen":
+        raise ValueError("フィルター式の括弧が閉じていません")
+      return f"({sql})"
+    if kind != "word":
+      raise ValueError(f"フィルター式を解析できません: {value}")
+    return self._comparison(value)
+
+  def _comparison(self, field_name: str) -> str:
+    column = _column(field_name, self.types)
+    kind, operator = self._next()
+    if kind != "word" or operator.lower() not in _COMPARISONS:
+      raise ValueError(f"不明な演算子です: {operator}")
+    operator = operator.lower()
+
+    value = self._literal()
+    if value is None:
+      if operator not in ("eq", "ne"):
+        raise ValueError("nullと比較できるのはeqとneのみです")
+      return f"{column} IS {'NOT ' if operator == 'ne' else ''}NULL"
+
+    self.params.append(value)
+    if operator == "ne":
+      # ODataではnullは任意の値と等しくないため、neはnullのドキュメントも含む
+      return f"({column} IS NULL OR {column} != ?)"
+    return f"{column} {_COMPARISONS[operator]} ?"
+
+  def _literal(self) -> Any:
+    kind, value = self._next()
+    if kind == "string":
+      return value[1:-1].replace("''", "'")
+    if kind == "datetime":
+      return _datetime_value(value)
+    if kind == "number":
+      return float(value) if any(c in value for c in ".eE") else int(value)
+    if kind == "word" and value.lower() in ("true", "false"):
+      return 1 if value.lower() == "true" else 0
+    if kind == "word" and value.lower() == "null":
+      return None
+    raise ValueError(f"不正な値です: {value}")
+
+
+class LocalSearchResults(list):
+  """検索結果（SearchClient.searchの戻り値と同じく件数とファセットを取得できる）"""
+
+  def __init__(self, results: List[Dict[str, Any]], count: Optional[int], facets: Optional[Dict[str, Any]]):
+    super().__init__(results)
+    self._count = count
+    self._facets = facets
+
+  def get_count(self) -> Optional[int]:
+    """全件数（include_total_count指定時のみ）"""
+    return self._count
+
+  def get_facets(self) -> Optional[Dict[str, Any]]:
+    """フィールドごとのファセット結果"""
+    return self._facets
+
+
+class LocalIndexingResult:
+  """ドキュメントごとの登録結果（IndexingResultと同じ属性）"""
+
+  def __init__(self, key: str, succeeded: bool, status_code: int, error_message: Optional[str] = None):
+    self.key = key
+    self.succeeded = succeeded
+    self.status_code = status_code
+    self.error_message = error_message
+
+
+class LocalSearchClient:
+  """SQLiteによるSearchClient互換のローカル検索クラス"""
+
+  def __init__(self, path: str = "search-index.db", schema_version: int = 1):
+    """
+    初期化
+
+    Args:
+        path: データベースファイルのパス（":memory:" の場合メモリ上に作成）
+        schema_version: インデックスのスキーマバージョン（フィールドと型をインデックス定義から取得する）
+    """
+    self.path = path
+    self.schema_version = schema_version
+    self.field_types = field_types(schema_version)
+    self._lock = threading.Lock()
+    self._connection = sqlite3.connect(path, check_same_thread=False)
+    self._connection.row_factory = sqlite3.Row
+    self._trigram = self._create_schema()
+    logger.info(f"ローカル検索インデックスを開きました: {path}")
+
+  def search(self, search_text: Optional[str] = None, filter: Optional[str] = None,
+             order_by: Optional[List[str]] = None, select: Optional[List[str]] = None,
+             top: Optional[int] = None, skip: Optional[int] = None, facets: Optional[List[str]] = None,
+             include_total_count: bool = False, **kwargs) -> LocalSearchResults:
+    """
+    ドキュメントを検索
+
+    Args:
+        search_text: 検索テキスト（空または"*"の場合は全件、複数語はいずれかを含むドキュメント）
+        filter: ODataフィルター式（比較・and・or・not・括弧）
+        order_by: ソート条件（"フィールド asc|desc"）
+        select: 取得するフィールド
+        top: 取得件数
+        skip: スキップ件数
+        facets: ファセット指定（"フィールド,count:N"・"sort:value"・"interval:X"）
+        include_total_count: 全件数を取得する
+
+    Returns:
+        LocalSearchResults: 検索結果
+    """
+    where, params = self._where(search_text, filter)
+
+    order = []
+    for term in order_by or []:
+      parts = term.split()
+      direction = "DESC" if len(parts) > 1 and parts[1].lower() == "desc" else "ASC"
+      order.append(f"{_column(parts[0], self.field_types)} {direction}")
+
+    sql = f"SELECT * FROM documents{where}"
+    if order:
+      # 同じ値の順序をページ間で一定にする
+      sql += " ORDER BY " + ", ".join(order + ['"id"'])
+    sql += " LIMIT ? OFFSET ?"
+
+    with self._lock:
+      rows = self._connection.execute(sql, params + [top if top is not None else -1, skip or 0]).fetchall()
+      count = None
+      if include_total_count:
+        count = self._connection.execute(f"SELECT COUNT(*) FROM documents{where}", params).fetchone()[0]
+      facet_results = {spec.split(',')[0]: self._facet(spec, where, params) for spec in facets or []}
+
+    results = [self._document(row, select) for row in rows]
+    return LocalSearchResults(results, count, facet_results if facets else None)
+
+  def merge_or_upload_documents(self, documents: List[Dict[str, Any]]) -> List[LocalIndexingResult]:
+    """
+    ドキュメントを登録（既存のドキュメントは指定したフィールドのみ更新）
+
+    Args:
+        documents: 登録するドキュメント（idフィールド必須）
+
+    Returns:
+        List[LocalIndexingResult]: ドキュメントごとの登録結果
+    """
+    results = []
+    with self._lock:
+      for document in documents:
+        key = document.get("id")
+        try:
+          if not key:
+            raise ValueError("idが指定されていません")
+          created = self._upsert(document)
+          results.append(LocalIndexingResult(key, True, 201 if created else 200))
+        except (sqlite3.Error, ValueError) as e:
+          results.append(LocalIndexingResult(key, False, 400, str(e)))
+      self._connection.commit()
+    return results
+
+  def upload_documents(self, documents: List[Dict[str, Any]]) -> List[LocalIndexingResult]:
+    """ドキュメントを登録（merge_or_upload_documentsと同じ）"""
+    return self.merge_or_upload_documents(documents)
+
+  def delete_documents(self, documents: List[Dict[str, Any]]) -> List[LocalIndexingResult]:
+    """
+    ドキュメントを削除
+
+    Args:
+        documents: 削除するドキュメント（idフィールドのみ参照）
+
+    Returns:
+        List[LocalIndexingResult]: ドキュメントごとの削除結果
+    """
+    with self._lock:
+      for document in documents:
+        self._connection.execute("DELETE FROM documents WHERE id = ?", (document["id"],))
+      self._connection.commit()
+    return [LocalIndexingResult(document["id"], True, 200) for document in documents]
+
+  def get_document_count(self) -> int:
+    """
+    ドキュメント数を取得
+
+    Returns:
+        int: ドキュメント数
+    """
+    with self._lock:
+      return self._connection.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+  def close(self):
+    """データベースを閉じる"""
+    with self._lock:
+      self._connection.close()
+
+  def _create_schema(self) -> bool:
+    """テーブル・インデックス・全文検索テーブルを作成し、trigramトークナイザーを使用する場合Trueを返す"""
+    columns = ", ".join(
+        f'"{name}" {"TEXT PRIMARY KEY" if name == "id" else ("TEXT" if kind == "DATETIME" else kind)}'
+        for name, kind in self.field_types.items()
+    )
+    searchable = ", ".join(f'"{name}"' for name in SEARCHABLE_FIELDS)
+    new_values = ", ".join(f'new."{name}"' for name in SEARCHABLE_FIELDS)
+    old_values = ", ".join(f'old."{name}"' for name in SEARCHABLE_FIELDS)
+
+    with self._lock:
+      connection = self._connection
+      connection.execute(f"CREATE TABLE IF NOT EXISTS documents ({columns}, extra TEXT)")
+      # 以前のスキーマバージョンで作成したデータベースには追加されたフィールドの列を追加する
+      existing = {row["name"] for row in connection.execute("PRAGMA table_info(documents)")}
+      for name, kind in self.field_types.items():
+        if name not in existing:
+          connection.execute(f'ALTER TABLE documents ADD COLUMN "{name}" {"TEXT" if kind == "DATETIME" else kind}')
+      for name in INDEXED_FIELDS:
+        connection.execute(f'CREATE INDEX IF NOT EXISTS idx_documents_{name} ON documents ("{name}")')
+
+      # 日本語は単語に分割できないため、使用できればtrigramトークナイザーで部分一致を検索する
+      try:
+        connection.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5({searchable}, "
+            f"content='documents', content_rowid='rowid', tokenize='trigram')"
+        )
+      except sqlite3.OperationalError:
+        connection.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5({searchable}, "
+            f"content='documents', content_rowid='rowid')"
+        )
+      tokenizer = connection.execute(
+          "SELECT sql FROM sqlite_master WHERE name = 'documents_fts'"
+      ).fetchone()[0]
+
+      # 全文検索テーブルをドキュメントの更新に追従させる
+      connection.executescript(f"""
+          CREATE TRIGGER IF NOT EXISTS documents_ai AFTER INSERT ON documents BEGIN
+            INSERT INTO documents_fts(rowid, {searchable}) VALUES (new.rowid, {new_values});
+          END;
+          CREATE TRIGGER IF NOT EXISTS documents_ad AFTER DELETE ON documents BEGIN
+            INSERT INTO documents_fts(documents_fts, rowid, {searchable}) VALUES ('delete', old.rowid, {old_values});
+          END;
+          CREATE TRIGGER IF NOT EXISTS documents_au AFTER UPDATE ON documents BEGIN
+            INSERT INTO documents_fts(documents_fts, rowid, {searchable}) VALUES ('delete', old.rowid, {old_values});
+            INSERT INTO documents_fts(rowid, {searchable}) VALUES (new.rowid, {new_values});
+          END;
+      """)
+      connection.commit()
+
+    return "trigram" in tokenizer
+
+  def _where(self, search_text: Optional[str], filter_expression: Optional[str]) -> Tuple[str, List[Any]]:
+    """検索テキストとフィルター式からWHERE句を作成"""
+    conditions = []
+    params: List[Any] = []
+
+    terms = [term.strip('"+-|') for term in (search_text or "").split()]
+    terms = [term for term in terms if term and term != "*"]
+    if terms:
+      matches = []
+      for term in terms:
+        if self._trigram and len(term) < 3:
+          # trigramで検索できない短い語は部分一致で検索する
+          matches.append("(" + " OR ".join(f'"{name}" LIKE ?' for name in SEARCHABLE_FIELDS) + ")")
+          params.extend([f"%{term}%"] * len(SEARCHABLE_FIELDS))
+        else:
+          matches.append("rowid IN (SELECT rowid FROM documents_fts WHERE documents_fts MATCH ?)")
+          params.append('"' + term.replace('"', '""') + '"')
+      # 既定の検索モード（any）と同じく、いずれかの語を含むドキュメントを返す
+      conditions.append("(" + " OR ".join(matches) + ")")
+
+    if filter_expression and filter_expression.strip():
+      parser = _FilterParser(filter_expression, self.field_types)
+      conditions.append(parser.parse())
+      params.extend(parser.params)
+
+    return (" WHERE " + " AND ".join(conditions) if conditions else ""), params
+
+  def _facet(self, spec: str, where: str, params: List[Any]) -> List[Dict[str, Any]]:
+    """1フィールドのファセット（値ごと、またはinterval指定時は区間ごとの件数）を集計"""
+    parts = spec.split(',')
+    column = _column(parts[0], self.field_types)
+    options = dict(part.split(':', 1) for part in parts[1:] if ':' in part)
+    condition = f"{where} AND {column} IS NOT NULL" if where else f" WHERE {column} IS NOT NULL"
+
+    if "interval" in options:
+      interval = float(options["interval"])
+      bucket = f"(CAST({column} / ? AS INTEGER) - ({column} < 0 AND {column} / ? != CAST({column} / ? AS INTEGER))) * ?"
+      rows = self._connection.execute(
+          f"SELECT {bucket} AS value, COUNT(*) AS count FROM documents{condition} GROUP BY value ORDER BY value",
+          [interval, interval, interval, interval] + params
+      ).fetchall()
+    else:
+      order = "value" if options.get("sort") == "value" else "count DESC, value"
+      rows = self._connection.execute(
+          f"SELECT {column} AS value, COUNT(*) AS count FROM documents{condition} "
+          f"GROUP BY {column} ORDER BY {order} LIMIT ?",
+          params + [int(options.get("count", 10))]
+      ).fetchall()
+
+    return [{"value": row["value"], "count": row["count"]} for row in rows]
+
+  def _upsert(self, document: Dict[str, Any]) -> bool:
+    """1ドキュメントを登録・更新し、新規作成の場合Trueを返す"""
+    values = {}
+    extra = {}
+    for name, value in document.items():
+      if name not in self.field_types:
+        extra[name] = value
+      elif self.field_types[name] == "DATETIME" and value is not None:
+        values[name] = _datetime_value(value)
+      else:
+        values[name] = value
+
+    existing = self._connection.execute("SELECT extra FROM documents WHERE id = ?", (values["id"],)).fetchone()
+    if existing and existing["extra"]:
+      extra = {**json.loads(existing["extra"]), **extra}
+    values["extra"] = json.dumps(extra, ensure_ascii=False) if extra else None
+
+    names = list(values)
+    columns = ", ".join(f'"{name}"' for name in names)
+    updates = ", ".join(f'"{name}" = excluded."{name}"' for name in names if name != "id")
+    self._connection.execute(
+        f"INSERT INTO documents ({columns}) VALUES ({', '.join('?' for _ in names)}) "
+        f"ON CONFLICT(id) DO UPDATE SET {updates}",
+        [values[name] for name in names]
+    )
+    return existing is None
+
+  def _document(self, row: sqlite3.Row, select: Optional[List[str]]) -> Dict[str, Any]:
+    """行をドキュメントに変換（selectで指定したフィールドのみ）"""
+    document = {name: row[name] for name in self.field_types}
+    if row["extra"]:
+      document.update(json.loads(row["extra"]))
+    if select:
+      return {name: document.get(name) for name in select}
+    return document
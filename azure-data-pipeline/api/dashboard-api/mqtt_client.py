@@ -20,7 +20,10 @@ logger = logging.getLogger(__name__)
 class KaitekiMQTTClient:
   """快適君 MQTT クライアントクラス"""
 
-  def __init__(self):
+  def __init__(self, on_data_saved=None):
+    # 保存完了時のコールバック（ダッシュボードへのプッシュ配信等）
+    self.on_data_saved = on_data_saved
+
     # MQTT設定
     self.mqtt_broker = os.environ.get('MQTT_BROKER', 'localhost')
     self.mqtt_port = int(os.environ.get('MQTT_PORT', 1883))
@@ -141,6 +144,9 @@ class KaitekiMQTTClient:
       self.container.create_item(body=data)
       logger.info(f"データ保存成功: {data['id']}")
 
+      if self.on_data_saved:
+        self.on_data_saved(data)
+
     except CosmosHttpResponseError as e:
       logger.error(f"Cosmos DB保存エラー: {e}")
     except Exception as e:
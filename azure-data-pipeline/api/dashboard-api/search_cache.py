@@ -0,0 +1,158 @@
+"""
+AI Search結果キャッシュモジュール
+同じ条件の検索・ファセットの結果を有効期限付きでメモリ上に保持する機能
+"""
+
+import re
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Dict, Any, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# キャッシュにない場合の戻り値（結果がNoneや空リストの場合と区別する）
+MISSING = object()
+
+
+def _normalize_text(value: Optional[str]) -> str:
+  """連続する空白をまとめ、前後の空白を除く"""
+  return re.sub(r"\s+", " ", value or "").strip()
+
+
+def search_cache_key(kind: str, search_text: Optional[str] = None, filters: Optional[str] = None,
+                     order_by: Optional[Iterable[str]] = None, top: Optional[int] = None,
+                     select: Optional[Iterable[str]] = None, **options: Any) -> Tuple:
+  """
+  検索条件を正規化したキャッシュキーを取得
+
+  空白の違い・空の検索テキストと"*"・ソート方向の大文字小文字・取得フィールドの順序が
+  異なるだけの検索は同じキーになる。
+
+  Args:
+      kind: 検索の種類（search・page・facets など）
+      search_text: 検索テキスト
+      filters: フィルター条件
+      order_by: ソート条件
+      top: 取得件数
+      select: 取得するフィールド
+      options: その他の条件（継続トークン・ファセット件数など）
+
+  Returns:
+      Tuple: キャッシュキー
+  """
+  text = _normalize_text(search_text) or "*"
+  order = tuple(
+      " ".join([parts[0]] + [part.lower() for part in parts[1:]])
+      for parts in (_normalize_text(term).split(" ") for term in order_by or [])
+  )
+  fields = tuple(sorted(select)) if select else None
+  return (kind, text, _normalize_text(filters), order, top, fields, tuple(sorted(options.items())))
+
+
+class SearchResultCache:
+  """検索結果のTTL付きLRUキャッシュクラス"""
+
+  def __init__(self, max_entries: int = 1024, ttl: float = 30.0):
+    """
+    初期化
+
+    Args:
+        max_entries: 保持する検索結果の件数の上限
+        ttl: 検索結果を保持する秒数（0の場合キャッシュしない）
+    """
+    self.max_entries = max_entries
+    self.ttl = ttl
+
+    self._lock = threading.Lock()
+    self._entries: "OrderedDict[Tuple, Tuple[Any, float]]" = OrderedDict()
+    self._hits = 0
+    self._misses = 0
+    self._invalidations = 0
+
+  @property
+  def enabled(self) -> bool:
+    """キャッシュが有効かどうか"""
+    return self.max_entries > 0 and self.ttl > 0
+
+  @property
+  def generation(self) -> int:
+    """
+    無効化の世代（invalidateのたびに増える）
+
+    検索の実行前に取得してputに渡すと、検索中に無効化された場合は古い結果を保持しない。
+    """
+    with self._lock:
+      return self._invalidations
+
+  def get(self, key: Tuple) -> Any:
+    """
+    キャッシュから検索結果を取得
+
+    Args:
+        key: search_cache_keyで作成したキー
+
+    Returns:
+        Any: 検索結果（キャッシュにないか期限切れの場合MISSING）
+    """
+    if not self.enabled:
+      return MISSING
+
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is None or entry[1] <= time.monotonic():
+        if entry is not None:
+          del self._entries[key]
+        self._misses += 1
+        return MISSING
+      self._entries.move_to_end(key)
+      self._hits += 1
+      return entry[0]
+
+  def put(self, key: Tuple, value: Any, generation: Optional[int] = None):
+    """
+    検索結果をキャッシュに追加
+
+    Args:
+        key: search_cache_keyで作成したキー
+        value: 検索結果
+        generation: 検索の実行前に取得した世代（以降に無効化されていれば追加しない）
+    """
+    if not self.enabled:
+      return
+
+    with self._lock:
+      if generation is not None and generation != self._invalidations:
+        return
+      self._entries.pop(key, None)
+      self._entries[key] = (value, time.monotonic() + self.ttl)
+      while len(self._entries) > self.max_entries:
+        self._entries.popitem(last=False)
+
+  def invalidate(self):
+    """キャッシュを全て無効化（インデックスの更新後に呼び出す）"""
+    with self._lock:
+      if self._entries:
+        logger.info(f"検索キャッシュを無効化しました: {len(self._entries)}件")
+      self._entries.clear()
+      self._invalidations += 1
+
+  def stats(self) -> Dict[str, Any]:
+    """
+    キャッシュの統計情報を取得
+
+    Returns:
+        Dict[str, Any]: 件数・ヒット率・無効化回数
+    """
+    with self._lock:
+      requests = self._hits + self._misses
+      return {
+          "entries": len(self._entries),
+          "maxEntries": self.max_entries,
+          "ttl": self.ttl,
+          "hits": self._hits,
+          "misses": self._misses,
+          "hitRate": self._hits / requests if requests else 0.0,
+          "invalidations": self._invalidations
+      }
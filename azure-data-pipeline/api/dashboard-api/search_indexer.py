@@ -0,0 +1,233 @@
+"""
+AI Searchバッチインデックスモジュール
+アップロードするドキュメントをバッファし、最大1000件ずつmerge_or_uploadでまとめて登録する機能
+"""
+
+import json
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple, Callable
+
+from azure.core.exceptions import AzureError
+
+logger = logging.getLogger(__name__)
+
+# 1回のインデックス要求で送信できるドキュメント数の上限
+MAX_BATCH_DOCUMENTS = 1000
+
+# 再試行で成功する可能性のあるドキュメント単位のステータス（競合・同時更新・過負荷）
+RETRYABLE_STATUS_CODES = (409, 422, 503)
+
+# 終了時の再送の待機秒数の初期値（再送のたびに2倍にする）
+RETRY_BACKOFF_SECONDS = 0.5
+
+
+class SearchBatchIndexer:
+  """AI Searchバッチインデックス管理クラス"""
+
+  def __init__(self, search_client, max_documents: int = MAX_BATCH_DOCUMENTS, max_bytes: int = 8 * 1024 * 1024,
+               flush_interval: float = 5.0, max_retries: int = 3,
+               on_flush: Optional[Callable[[Dict[str, int]], None]] = None):
+    """
+    初期化
+
+    Args:
+        search_client: 登録先のSearchClient
+        max_documents: 1回の要求で送信するドキュメント数の上限（最大1000）
+        max_bytes: 1回の要求で送信するサイズの上限（バイト）
+        flush_interval: バッファを保持する最大秒数
+        max_retries: 1ドキュメントあたりの再送回数
+        on_flush: 1件以上登録できた送信の後に結果を受け取るコールバック
+    """
+    self.search_client = search_client
+    self.max_documents = max(1, min(max_documents, MAX_BATCH_DOCUMENTS))
+    self.max_bytes = max_bytes
+    self.flush_interval = flush_interval
+    self.max_retries = max_retries
+    self.on_flush = on_flush
+
+    self._lock = threading.Lock()
+    # 同じキーのドキュメントは1件にまとめる（後から追加したフィールドを優先）
+    self._buffer: "OrderedDict[str, Tuple[Dict[str, Any], int]]" = OrderedDict()
+    self._attempts: Dict[str, int] = {}
+    self._bytes = 0
+    self._created = None
+    self._flush_lock = threading.Lock()
+    self._stop_event = threading.Event()
+
+    self._flush_thread = threading.Thread(target=self._flush_loop, daemon=True)
+    self._flush_thread.start()
+
+  def append(self, document: Dict[str, Any]):
+    """
+    ドキュメントをバッファに追加
+
+    件数またはサイズの上限に達した場合は即座に送信する。
+
+    Args:
+        document: 登録するドキュメント（idフィールド必須）
+    """
+    with self._lock:
+      key = document["id"]
+      previous = self._buffer.pop(key, None)
+      if previous:
+        self._bytes -= previous[1]
+        document = {**previous[0], **document}
+      size = len(json.dumps(document, ensure_ascii=False).encode('utf-8'))
+      self._buffer[key] = (document, size)
+      self._bytes += size
+      if self._created is None:
+        self._created = time.monotonic()
+      full = len(self._buffer) >= self.max_documents or self._bytes >= self.max_bytes
+
+    if full:
+      self.flush()
+
+  def flush(self) -> Dict[str, int]:
+    """
+    バッファのドキュメントを送信
+
+    Returns:
+        Dict[str, int]: 成功件数・失敗件数・再送待ちの件数
+    """
+    result = {"succeeded": 0, "failed": 0, "requeued": 0}
+    retry: List[Tuple[Dict[str, Any], int]] = []
+
+    # 定期送信と上限到達時の送信が重ならないようにする
+    with self._flush_lock:
+      while True:
+        batch = self._take_batch()
+        if not batch:
+          break
+        for key, value in self._send(batch, retry).items():
+          result[key] += value
+
+      # 再送するドキュメントは次回の送信に回す
+      self._requeue(retry)
+
+    if result["succeeded"] and self.on_flush:
+      self.on_flush(result)
+
+    return result
+
+  def pending_count(self) -> int:
+    """
+    未送信の件数を取得
+
+    Returns:
+        int: バッファ内のドキュメント数
+    """
+    with self._lock:
+      return len(self._buffer)
+
+  def close(self):
+    """
+    定期送信を停止し、残りのバッファを送信する
+
+    再送待ちのドキュメントは指数バックオフで待機しながら、再送回数の上限まで送信する。
+    """
+    self._stop_event.set()
+    self._flush_thread.join(timeout=self.flush_interval)
+
+    for attempt in range(self.max_retries + 1):
+      if not self.flush()["requeued"]:
+        return
+      if attempt < self.max_retries:
+        wait = RETRY_BACKOFF_SECONDS * (2 ** attempt)
+        logger.warning(f"AI Searchバッチ登録の再送待ちがあります（{wait:.1f}秒後に再送）")
+        time.sleep(wait)
+
+    logger.error(f"AI Searchに登録できなかったドキュメントを破棄します: {self.pending_count()}件")
+
+  def _flush_loop(self):
+    """保持時間を超えたバッファを定期的に送信する"""
+    check_interval = max(0.5, self.flush_interval / 4)
+    while not self._stop_event.wait(check_interval):
+      with self._lock:
+        expired = self._created is not None and time.monotonic() - self._created >= self.flush_interval
+      if expired:
+        self.flush()
+
+  def _take_batch(self) -> List[Tuple[Dict[str, Any], int]]:
+    """件数・サイズの上限までのドキュメントをバッファから取り出す"""
+    with self._lock:
+      batch = []
+      size = 0
+      while self._buffer and len(batch) < self.max_documents:
+        key, (document, document_size) = next(iter(self._buffer.items()))
+        if batch and size + document_size > self.max_bytes:
+          break
+        del self._buffer[key]
+        batch.append((document, document_size))
+        size += document_size
+
+      self._bytes -= size
+      if not self._buffer:
+        self._created = None
+      return batch
+
+  def _send(self, batch: List[Tuple[Dict[str, Any], int]], retry: List[Tuple[Dict[str, Any], int]]) -> Dict[str, int]:
+    """1回の要求でmerge_or_uploadし、ドキュメントごとの結果を処理する（再送対象はretryに追加）"""
+    result = {"succeeded": 0, "failed": 0, "requeued": 0}
+    documents = {document["id"]: (document, size) for document, size in batch}
+
+    try:
+      responses = self.search_client.merge_or_upload_documents([document for document, _ in batch])
+    except AzureError as e:
+      logger.error(f"AI Searchバッチ登録エラー: {e}")
+      for key, entry in documents.items():
+        if self._can_retry(key):
+          retry.append(entry)
+          result["requeued"] += 1
+        else:
+          result["failed"] += 1
+      return result
+
+    for response in responses:
+      entry = documents.get(response.key)
+      if entry is None:
+        continue
+      if response.succeeded:
+        result["succeeded"] += 1
+        with self._lock:
+          self._attempts.pop(response.key, None)
+      elif response.status_code in RETRYABLE_STATUS_CODES and self._can_retry(response.key):
+        retry.append(entry)
+        result["requeued"] += 1
+      else:
+        result["failed"] += 1
+        logger.error(f"AI Searchドキュメント登録エラー: {response.key} ({response.status_code}: {response.error_message})")
+
+    logger.info(f"AI Searchにバッチ登録しました: {result['succeeded']}件成功, {result['failed']}件失敗, {result['requeued']}件再送待ち")
+    return result
+
+  def _can_retry(self, key: str) -> bool:
+    """再送回数を数え、上限を超えた場合False"""
+    with self._lock:
+      attempts = self._attempts.get(key, 0) + 1
+      if attempts > self.max_retries:
+        self._attempts.pop(key, None)
+        return False
+      self._attempts[key] = attempts
+      return True
+
+  def _requeue(self, entries: List[Tuple[Dict[str, Any], int]]):
+    """送信に失敗したドキュメントをバッファの先頭に戻す"""
+    if not entries:
+      return
+
+    with self._lock:
+      for document, size in reversed(entries):
+        key = document["id"]
+        # 送信中に同じキーが追加されていれば、新しい内容を優先する
+        current = self._buffer.pop(key, None)
+        if current:
+          self._bytes -= current[1]
+          document = {**document, **current[0]}
+        self._buffer[key] = (document, size)
+        self._buffer.move_to_end(key, last=False)
+        self._bytes += size
+      if self._created is None:
+        self._created = time.monotonic()
@@ -0,0 +1,123 @@
+"""
+AI Searchページングモジュール
+ソートキーの値による位置指定（シーク）またはスキップ件数を継続トークンとして表現する機能
+"""
+
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from downsampling import parse_timestamp
+
+# 1ページあたりの件数の上限（1回の検索要求で返される件数の上限）
+MAX_SEARCH_PAGE_SIZE = 1000
+
+# スキップ件数の上限（これを超える位置はシークでのみ取得できる）
+MAX_SEARCH_SKIP = 100000
+
+# 値によるシークでページングできるソート可能なフィールド
+SEEKABLE_FIELDS = ("timestamp", "uploaded_at", "temperature", "humidity", "co2", "personCount")
+
+# DateTimeOffset型のフィールド（引用符なしのリテラルで比較する）
+DATETIME_FIELDS = ("timestamp", "uploaded_at")
+
+# 同じ値のドキュメントの順序を一意にするソートキー（ソート可能なキーフィールド）
+TIEBREAKER_FIELD = "id"
+
+
+def odata_literal(field_name: str, value: Any) -> str:
+  """
+  フィルター式のリテラルに変換
+
+  Args:
+      field_name: 比較するフィールド名
+      value: 値
+
+  Returns:
+      str: ODataのリテラル
+
+  Raises:
+      ValueError: DateTimeOffset型のフィールドに時刻として解析できない値を指定した場合
+  """
+  if isinstance(value, bool):
+    return "true" if value else "false"
+  if isinstance(value, (int, float)):
+    return repr(value)
+  if isinstance(value, datetime):
+    return value.isoformat()
+  if field_name in DATETIME_FIELDS:
+    # 継続トークン由来の値を引用符なしで埋め込むため、時刻として解析して再生成する
+    parsed = parse_timestamp(value) if isinstance(value, str) else None
+    if parsed is None:
+      raise ValueError(f"不正な時刻です: {value}")
+    return parsed.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+  return "'" + str(value).replace("'", "''") + "'"
+
+
+def seek_field(order_by: Optional[List[str]]) -> Optional[Tuple[str, bool]]:
+  """
+  値によるシークに使用するソートキーを取得
+
+  Args:
+      order_by: ソート条件
+
+  Returns:
+      Optional[Tuple[str, bool]]: (フィールド名, 降順の場合True)（シークできない場合None）
+  """
+  if not order_by or len(order_by) != 1:
+    return None
+
+  parts = order_by[0].split()
+  if not parts or parts[0] not in SEEKABLE_FIELDS:
+    return None
+  descending = len(parts) > 1 and parts[1].lower() == "desc"
+  return parts[0], descending
+
+
+def encode_search_token(position: Dict[str, Any]) -> str:
+  """
+  検索の読み取り位置を継続トークンに変換
+
+  Args:
+      position: シークの場合 {"v": 最後の値, "k": 最後のドキュメントID}、スキップの場合 {"o": 件数}
+
+  Returns:
+      str: URLセーフな継続トークン
+  """
+  payload = json.dumps(position, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+  return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+
+def decode_search_token(token: Optional[str]) -> Optional[Dict[str, Any]]:
+  """
+  継続トークンを検索の読み取り位置に変換
+
+  Args:
+      token: 継続トークン
+
+  Returns:
+      Optional[Dict[str, Any]]: 読み取り位置（トークン未指定時None）
+
+  Raises:
+      ValueError: 不正なトークンの場合
+  """
+  if not token:
+    return None
+
+  try:
+    padded = token + '=' * (-len(token) % 4)
+    position = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+  except (binascii.Error, UnicodeError, ValueError):
+    raise ValueError("不正な継続トークンです")
+
+  if not isinstance(position, dict):
+    raise ValueError("不正な継続トークンです")
+  if "o" in position:
+    if not isinstance(position["o"], int) or position["o"] < 0:
+      raise ValueError("不正な継続トークンです")
+  elif ("v" not in position or not isinstance(position.get("k"), str)
+        or not (position["v"] is None or isinstance(position["v"], (str, int, float)))):
+    raise ValueError("不正な継続トークンです")
+  return position
@@ -0,0 +1,455 @@
+"""
+AI Searchインデックススキーマモジュール
+スキーマのバージョンごとのインデックス定義・ドキュメント変換と、
+旧インデックスから新インデックスへの並行再インデックス機能
+"""
+
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Callable
+
+from azure.core.exceptions import AzureError
+from azure.search.documents.indexes.models import (
+    SearchIndex,
+    SimpleField,
+    SearchableField,
+    SearchFieldDataType
+)
+
+from downsampling import parse_timestamp
+from search_pagination import MAX_SEARCH_SKIP
+
+logger = logging.getLogger(__name__)
+
+# 最新のスキーマバージョン
+LATEST_SCHEMA_VERSION = 2
+
+# 追い付きの開始を再インデックスの開始より前にする時間（他のワーカーのバッチ登録の遅れを含める）
+CATCH_UP_MARGIN = timedelta(minutes=5)
+
+# 完了時にコピー先の件数を確認する回数
+COUNT_CHECK_ATTEMPTS = 5
+
+
+def versioned_index_name(base_name: str, version: int) -> str:
+  """
+  スキーマバージョンごとのインデックス名を取得
+
+  Args:
+      base_name: インデックス名（SEARCH_INDEX_NAME）
+      version: スキーマバージョン
+
+  Returns:
+      str: バージョン1は base_name、以降は {base_name}-v{version}
+  """
+  return base_name if version <= 1 else f"{base_name}-v{version}"
+
+
+def _fields_v1() -> List[Any]:
+  """バージョン1: デバイスID・タイプも全文検索対象、contentを取得可能"""
+  return [
+      SimpleField(name="id", type=SearchFieldDataType.String, key=True),
+      SearchableField(name="deviceId", type=SearchFieldDataType.String, filterable=True, sortable=True, facetable=True),
+      SearchableField(name="deviceType", type=SearchFieldDataType.String, filterable=True, sortable=True, facetable=True),
+      SimpleField(name="timestamp", type=SearchFieldDataType.DateTimeOffset, filterable=True, sortable=True),
+      SimpleField(name="temperature", type=SearchFieldDataType.Double, filterable=True, sortable=True, facetable=True),
+      SimpleField(name="humidity", type=SearchFieldDataType.Double, filterable=True, sortable=True, facetable=True),
+      SimpleField(name="co2", type=SearchFieldDataType.Double, filterable=True, sortable=True, facetable=True),
+      SimpleField(name="personCount", type=SearchFieldDataType.Int32, filterable=True, sortable=True, facetable=True),
+      SearchableField(name="content", type=SearchFieldDataType.String, analyzer="ja.microsoft"),
+      SimpleField(name="uploaded_at", type=SearchFieldDataType.DateTimeOffset, filterable=True, sortable=True)
+  ]
+
+
+def _fields_v2() -> List[Any]:
+  """
+  バージョン2: 完全一致フィルター・範囲検索向けの軽量スキーマ
+
+  デバイスID・タイプはフィルター専用のキーワード、contentは全文検索のみで取得不可、
+  日・時間単位の集計用フィールドを追加する。IDはシークの同順位の並びを一意にするためソート可能にする。
+  """
+  return [
+      SimpleField(name="id", type=SearchFieldDataType.String, key=True, sortable=True),
+      SimpleField(name="deviceId", type=SearchFieldDataType.String, filterable=True, sortable=True, facetable=True),
+      SimpleField(name="deviceType", type=SearchFieldDataType.String, filterable=True, facetable=True),
+      SimpleField(name="timestamp", type=SearchFieldDataType.DateTimeOffset, filterable=True, sortable=True),
+      SimpleField(name="day", type=SearchFieldDataType.String, filterable=True, facetable=True),
+      SimpleField(name="hour", type=SearchFieldDataType.String, filterable=True, facetable=True),
+      SimpleField(name="temperature", type=SearchFieldDataType.Double, filterable=True, sortable=True, facetable=True),
+      SimpleField(name="humidity", type=SearchFieldDataType.Double, filterable=True, sortable=True, facetable=True),
+      SimpleField(name="co2", type=SearchFieldDataType.Double, filterable=True, sortable=True, facetable=True),
+      SimpleField(name="personCount", type=SearchFieldDataType.Int32, filterable=True, sortable=True, facetable=True),
+      SearchableField(name="content", type=SearchFieldDataType.String, analyzer="ja.microsoft", hidden=True),
+      SimpleField(name="uploaded_at", type=SearchFieldDataType.DateTimeOffset, filterable=True, sortable=True)
+  ]
+
+
+SCHEMA_FIELDS: Dict[int, Callable[[], List[Any]]] = {
+    1: _fields_v1,
+    2: _fields_v2
+}
+
+
+def build_index(name: str, version: int) -> SearchIndex:
+  """
+  スキーマバージョンのインデックス定義を作成
+
+  Args:
+      name: インデックス名
+      version: スキーマバージョン
+
+  Returns:
+      SearchIndex: インデックス定義
+
+  Raises:
+      ValueError: 不明なバージョンの場合
+  """
+  if version not in SCHEMA_FIELDS:
+    raise ValueError(f"不明なスキーマバージョンです: {version}")
+  return SearchIndex(name=name, fields=SCHEMA_FIELDS[version]())
+
+
+def _as_datetime(value: Any) -> Optional[datetime]:
+  """検索結果のtimestamp（文字列またはdatetime）をUTCのnaive datetimeに変換"""
+  if isinstance(value, datetime):
+    return parse_timestamp(value.isoformat())
+  return parse_timestamp(value)
+
+
+def _range_filter(low: Optional[datetime], high: Optional[datetime]) -> str:
+  """timestampの区間 [low, high) のフィルター条件（Noneの側は制限しない）"""
+  conditions = []
+  if low is not None:
+    conditions.append(f"timestamp ge {low.strftime('%Y-%m-%dT%H:%M:%S.%fZ')}")
+  if high is not None:
+    conditions.append(f"timestamp lt {high.strftime('%Y-%m-%dT%H:%M:%S.%fZ')}")
+  return " and ".join(conditions) or "timestamp ne null"
+
+
+def to_document(document: Dict[str, Any], version: int) -> Dict[str, Any]:
+  """
+  ドキュメントをスキーマバージョンの形式に変換
+
+  Args:
+      document: バージョン1の形式のドキュメント
+      version: 変換先のスキーマバージョン
+
+  Returns:
+      Dict[str, Any]: 変換後のドキュメント（検索結果のメタデータは除く）
+  """
+  converted = {key: value for key, value in document.items() if not key.startswith("@search.")}
+  if version < 2:
+    return converted
+
+  parsed = _as_datetime(document.get("timestamp"))
+  if parsed:
+    converted["day"] = parsed.strftime('%Y-%m-%d')
+    converted["hour"] = parsed.strftime('%Y-%m-%dT%H')
+  return converted
+
+
+class SearchReindexJob:
+  """インデックス間でドキュメントを並行にコピーし、進捗と結果を保持するクラス"""
+
+  def __init__(self, source, target_client, version: int, concurrency: int = 4, batch_size: int = 1000,
+               max_retries: int = 3, progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+               since: Optional[datetime] = None):
+    """
+    初期化
+
+    Args:
+        source: コピー元のAISearchManager（iter_documentsで読み取る）
+        target_client: コピー先のSearchClient
+        version: コピー先のスキーマバージョン
+        concurrency: 同時に処理する時間区間の数
+        batch_size: 1回の登録要求のドキュメント数（最大1000）
+        max_retries: 登録要求の再試行回数
+        progress: 時間区間ごとの進捗を受け取るコールバック
+        since: 指定時は全件のコピーを行わず、uploaded_atがこの時刻以降のドキュメントのみコピーする
+    """
+    self.source = source
+    self.target_client = target_client
+    self.version = version
+    self.concurrency = max(1, concurrency)
+    self.batch_size = max(1, min(batch_size, 1000))
+    self.max_retries = max_retries
+    self.progress = progress
+    self.since = since
+
+    self._lock = threading.Lock()
+    self._state = "pending"
+    self._status: Dict[str, Any] = {
+        "completedRanges": 0,
+        "totalRanges": 0,
+        "copied": 0,
+        "failed": 0,
+        "sourceCount": None,
+        "targetCount": None,
+        "catchUpFrom": None
+    }
+    self._error: Optional[str] = None
+    self._created_at = datetime.utcnow().isoformat()
+    self._started: Optional[float] = None
+    self._finished: Optional[float] = None
+
+  def start(self, on_finish: Optional[Callable[[], None]] = None):
+    """
+    バックグラウンドで再インデックスを開始
+
+    Args:
+        on_finish: 終了後（失敗時を含む）に呼び出す関数
+    """
+    def target():
+      try:
+        self.run()
+      except Exception:
+        # 状態とエラーはrunで記録済み
+        pass
+      finally:
+        if on_finish:
+          on_finish()
+
+    threading.Thread(target=target, name="search-reindex", daemon=True).start()
+
+  def run(self) -> Dict[str, Any]:
+    """
+    再インデックスを実行（完了まで待機）
+
+    コピー元の最初と最後のtimestampの間を同時実行数の区間に分割し、
+    各区間をtimestamp順に読み取りながらバッチ単位で登録する。続けて、開始後に
+    コピー元に追加されたドキュメントをuploaded_atで取得して登録する（追い付き）。
+    最後にコピー先の件数が開始時のコピー元の件数以上であることを確認する。
+
+    Returns:
+        Dict[str, Any]: 登録件数・失敗件数・区間数・件数・所要秒数
+
+    Raises:
+        AzureError: 読み取りに失敗した場合
+        ValueError: スキップ件数の上限を超える区間を分割できない場合
+        RuntimeError: 登録に失敗したドキュメントがある場合、またはコピー先の件数が不足する場合
+    """
+    with self._lock:
+      self._state = "running"
+      self._started = time.monotonic()
+    started_at = datetime.utcnow()
+
+    try:
+      if self.since is None:
+        source_count = self._count(self.source.search_client)
+        with self._lock:
+          self._status["sourceCount"] = source_count
+
+        logger.info(f"再インデックス開始: スキーマバージョン{self.version}")
+        self._copy_ranges(self._time_ranges())
+
+        # バッチ登録のバッファに残っていたドキュメントも含めるため、開始時刻より前から追い付く
+        catch_up_from = started_at - CATCH_UP_MARGIN
+      else:
+        source_count = None
+        catch_up_from = self.since
+
+      with self._lock:
+        self._status["catchUpFrom"] = catch_up_from.isoformat()
+      logger.info(f"再インデックスの追い付き開始: {catch_up_from.isoformat()}以降の登録分")
+      self._copy_ranges(self._time_ranges(f"uploaded_at ge {catch_up_from.strftime('%Y-%m-%dT%H:%M:%S.%fZ')}"))
+
+      result = self.result()
+      if result["failed"]:
+        raise RuntimeError(f"{result['failed']}件のドキュメントを登録できませんでした")
+      if source_count is not None:
+        target_count = self._wait_for_count(source_count)
+        with self._lock:
+          self._status["targetCount"] = target_count
+        if target_count < source_count:
+          raise RuntimeError(f"コピー先の件数がコピー元より少ないです ({target_count}/{source_count}件)")
+
+    except Exception as e:
+      logger.error(f"再インデックスエラー: {e}")
+      with self._lock:
+        self._state = "failed"
+        self._error = str(e)
+        self._finished = time.monotonic()
+      raise
+
+    with self._lock:
+      self._state = "completed"
+      self._finished = time.monotonic()
+
+    result = self.result()
+    logger.info(f"再インデックス完了: {result['copied']}件登録 ({result['seconds']}秒)")
+    return result
+
+  def result(self) -> Dict[str, Any]:
+    """
+    現在までの登録件数・失敗件数・区間数・所要秒数を取得
+
+    Returns:
+        Dict[str, Any]: 集計結果
+    """
+    with self._lock:
+      end = self._finished if self._finished is not None else time.monotonic()
+      return {
+          "copied": self._status["copied"],
+          "failed": self._status["failed"],
+          "ranges": self._status["totalRanges"],
+          "seconds": round(end - self._started, 1) if self._started is not None else 0.0
+      }
+
+  def status(self) -> Dict[str, Any]:
+    """
+    進捗を取得
+
+    Returns:
+        Dict[str, Any]: 状態・区間の進捗・登録件数・コピー元とコピー先の件数・追い付きの開始時刻・エラー
+    """
+    with self._lock:
+      end = self._finished if self._finished is not None else time.monotonic()
+      status = {
+          "state": self._state,
+          "targetVersion": self.version,
+          "createdAt": self._created_at,
+          **self._status,
+          "elapsedSeconds": round(end - self._started, 1) if self._started is not None else 0.0
+      }
+      if self._error:
+        status["error"] = self._error
+      return status
+
+  @property
+  def finished(self) -> bool:
+    """再インデックスが終了したかどうか"""
+    with self._lock:
+      return self._state in ("completed", "failed")
+
+  def _add_range(self, copied: int, failed: int):
+    """1区間の結果を集計して進捗を報告"""
+    with self._lock:
+      self._status["completedRanges"] += 1
+      self._status["copied"] += copied
+      self._status["failed"] += failed
+      progress = {
+          "completed": self._status["completedRanges"],
+          "total": self._status["totalRanges"],
+          "copied": self._status["copied"],
+          "failed": self._status["failed"]
+      }
+    self._report(progress)
+
+  def _copy_ranges(self, ranges: List[Optional[str]]):
+    """区間を並行にコピー（読み取りに失敗した区間があれば送出する）"""
+    with self._lock:
+      self._status["totalRanges"] += len(ranges)
+
+    with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+      futures = [executor.submit(self._copy_range, filter_string) for filter_string in ranges]
+      for future in futures:
+        self._add_range(*future.result())
+
+  def _time_ranges(self, base_filter: Optional[str] = None) -> List[Optional[str]]:
+    """
+    コピー元のtimestampの範囲を同時実行数の区間のフィルター条件に分割
+
+    コピー元がシークできない場合は、各区間がスキップ件数の上限以下になるまで分割する。
+
+    Args:
+        base_filter: すべての区間に加える条件
+    """
+    def combine(filter_string: str) -> str:
+      return f"({base_filter}) and {filter_string}" if base_filter else filter_string
+
+    # nullのtimestampは昇順で先頭に並ぶため除いて最初と最後を求める
+    first = self.source.search_documents(filters=combine("timestamp ne null"), order_by=["timestamp asc"],
+                                         select=["timestamp"], top=1)
+    last = self.source.search_documents(filters=combine("timestamp ne null"), order_by=["timestamp desc"],
+                                        select=["timestamp"], top=1)
+    start = _as_datetime(first[0].get("timestamp")) if first else None
+    end = _as_datetime(last[0].get("timestamp")) if last else None
+
+    if start is None or end is None:
+      return [base_filter]
+
+    # 区間は [low, high)（Noneは範囲外の側を含める）
+    step = (end - start) / self.concurrency
+    bounds: List[Optional[datetime]] = [None] + [start + step * i for i in range(1, self.concurrency)] + [None]
+    pending = list(zip(bounds, bounds[1:]))
+
+    if start == end:
+      pending = [(None, None)]
+
+    ranges: List[Optional[str]] = []
+    while pending:
+      low, high = pending.pop(0)
+      filter_string = combine(_range_filter(low, high))
+      if getattr(self.source, "sortable_key", True) or self._count(self.source.search_client, filter_string) <= MAX_SEARCH_SKIP:
+        ranges.append(filter_string)
+        continue
+
+      middle = (low or start) + ((high or end) - (low or start)) / 2
+      if middle <= (low or start) or (high is not None and middle >= high):
+        raise ValueError(f"{MAX_SEARCH_SKIP}件を超える区間を分割できません: {filter_string}")
+      pending[:0] = [(low, middle), (middle, high)]
+
+    # timestampのないドキュメント
+    ranges.append(combine("timestamp eq null"))
+    return ranges
+
+  def _copy_range(self, filter_string: Optional[str]) -> tuple:
+    """1区間をtimestamp順に読み取り、バッチ単位で登録する（読み取りの失敗は送出する）"""
+    copied = failed = 0
+    batch = []
+
+    for document in self.source.iter_documents(filters=filter_string, order_by=["timestamp asc"],
+                                               page_size=self.batch_size):
+      batch.append(to_document(document, self.version))
+      if len(batch) >= self.batch_size:
+        succeeded, errors = self._upload_batch(batch)
+        copied += succeeded
+        failed += errors
+        batch = []
+
+    if batch:
+      succeeded, errors = self._upload_batch(batch)
+      copied += succeeded
+      failed += errors
+
+    return copied, failed
+
+  def _wait_for_count(self, expected: int) -> int:
+    """コピー先の件数を取得（登録の反映を待つため、不足する場合は数回再確認する）"""
+    count = 0
+    for attempt in range(COUNT_CHECK_ATTEMPTS):
+      count = self._count(self.target_client)
+      if count >= expected or attempt == COUNT_CHECK_ATTEMPTS - 1:
+        break
+      time.sleep(2.0)
+    return count
+
+  @staticmethod
+  def _count(search_client, filter_string: Optional[str] = None) -> int:
+    """インデックスの件数を取得"""
+    return search_client.search(search_text="*", filter=filter_string, top=0, include_total_count=True).get_count() or 0
+
+  def _upload_batch(self, batch: List[Dict[str, Any]]) -> tuple:
+    """1回の要求で登録し、成功件数と失敗件数を返す（要求の失敗は指数バックオフで再試行）"""
+    for attempt in range(self.max_retries + 1):
+      try:
+        responses = self.target_client.merge_or_upload_documents(batch)
+        succeeded = sum(1 for response in responses if response.succeeded)
+        return succeeded, len(batch) - succeeded
+      except AzureError as e:
+        if attempt >= self.max_retries:
+          logger.error(f"再インデックスの登録エラー: {e}")
+          return 0, len(batch)
+        wait = 0.5 * (2 ** attempt)
+        logger.warning(f"再インデックスの登録に失敗しました（{wait:.1f}秒後に再試行）: {e}")
+        time.sleep(wait)
+    return 0, len(batch)
+
+  def _report(self, progress: Dict[str, Any]):
+    """進捗を報告"""
+    logger.info(f"再インデックス中: {progress['completed']}/{progress['total']}区間 (累計{progress['copied']}件)")
+    if self.progress:
+      self.progress(progress)
@@ -0,0 +1,94 @@
+"""
+フリート操作のテスト
+IoT Hubに接続せず、偽のレジストリマネージャーでデバイス群へのツイン更新を確認する
+"""
+
+import threading
+import unittest
+from unittest import mock
+
+from fleet_operations import FleetOperation, FleetOperationRegistry
+from iot_hub_manager import IoTHubManager
+
+
+class FakeTwin:
+  """更新後のデバイスツイン"""
+
+  def __init__(self, version: int):
+    self.version = version
+
+
+class FakeRegistryManager:
+  """update_twinの呼び出しを記録するレジストリマネージャー"""
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self.desired = {}
+
+  def update_twin(self, device_id, twin, etag=None):
+    with self._lock:
+      self.desired[device_id] = twin.properties.desired
+      return FakeTwin(len(self.desired))
+
+
+class FakeRegistryCache:
+  """invalidateの呼び出しを記録するレジストリキャッシュ"""
+
+  def __init__(self):
+    self.invalidated = set()
+
+  def invalidate(self, device_id):
+    self.invalidated.add(device_id)
+
+
+class FleetUpdateTwinTest(unittest.TestCase):
+  """fleet_update_twin・update_device_twinのテスト"""
+
+  DEVICE_IDS = ["kaiteki-001", "kaiteki-002", "kaiteki-003"]
+
+  def setUp(self):
+    # 接続文字列が不要になるよう、初期化を経由せずに必要な属性だけを設定する
+    self.manager = IoTHubManager.__new__(IoTHubManager)
+    self.manager.registry_manager = FakeRegistryManager()
+    self.manager.registry_cache = FakeRegistryCache()
+    self.manager.fleet_concurrency = 2
+    self.manager.fleet_operations = FleetOperationRegistry()
+    self.manager.fleet_device_ids = lambda condition: list(self.DEVICE_IDS)
+
+  def run_fleet(self, start):
+    # バックグラウンドのスレッドではなく、FleetOperation.runで完了まで実行する
+    with mock.patch.object(FleetOperation, "start", FleetOperation.run):
+      status = start()
+    return self.manager.get_fleet_operation(status["operationId"])
+
+  def test_fleet_update_twin_succeeds(self):
+    properties = {"telemetryInterval": 60}
+    status = self.run_fleet(
+        lambda: self.manager.fleet_update_twin("tags.deviceType = 'kaiteki'", properties)
+    )
+
+    self.assertEqual(status["state"], "completed")
+    self.assertEqual(status["succeeded"], len(self.DEVICE_IDS))
+    self.assertEqual(status["failed"], 0)
+    self.assertEqual([result["result"] for result in status["results"]], ["succeeded"] * len(self.DEVICE_IDS))
+    self.assertEqual(self.manager.registry_manager.desired, {device_id: properties for device_id in self.DEVICE_IDS})
+    self.assertEqual(self.manager.registry_cache.invalidated, set(self.DEVICE_IDS))
+
+  def test_fleet_configure_telemetry_succeeds(self):
+    status = self.run_fleet(
+        lambda: self.manager.fleet_configure_telemetry("tags.deviceType = 'kaiteki'", interval=10)
+    )
+
+    self.assertEqual(status["succeeded"], len(self.DEVICE_IDS))
+    for desired in self.manager.registry_manager.desired.values():
+      self.assertEqual(desired["telemetryInterval"], 10)
+
+  def test_update_device_twin(self):
+    properties = {"reportingEnabled": False}
+
+    self.assertTrue(self.manager.update_device_twin("kaiteki-001", properties))
+    self.assertEqual(self.manager.registry_manager.desired, {"kaiteki-001": properties})
+
+
+if __name__ == "__main__":
+  unittest.main()
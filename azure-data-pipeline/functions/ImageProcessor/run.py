@@ -4,9 +4,17 @@ import json
 from datetime import datetime
 import uuid
 import base64
-from azure.storage.blob import BlobServiceClient
+import time
+from concurrent.futures import ThreadPoolExecutor
+from azure.core.exceptions import AzureError
+from azure.storage.blob import BlobServiceClient, BlobBlock, ContentSettings
 import os
 
+# 画像アップロードのブロックサイズ・同時ステージ数・ブロックごとの再試行回数
+UPLOAD_BLOCK_SIZE = int(os.environ.get("BLOB_UPLOAD_BLOCK_SIZE", 4 * 1024 * 1024))
+UPLOAD_CONCURRENCY = int(os.environ.get("BLOB_UPLOAD_CONCURRENCY", 8))
+UPLOAD_MAX_RETRIES = int(os.environ.get("BLOB_UPLOAD_MAX_RETRIES", 3))
+
 
 def main(req: func.HttpRequest, outputDocument: func.Out[func.Document]) -> func.HttpResponse:
   logging.info('Image processing function processed a request.')
@@ -92,7 +100,7 @@ def process_image(data: dict) -> str:
           blob=filename
       )
 
-      blob_client.upload_blob(image_bytes, overwrite=True)
+      upload_in_blocks(blob_client, image_bytes, ContentSettings(content_type="image/jpeg"))
 
       # URLを返す
       return f"https://{blob_service_client.account_name}.blob.core.windows.net/{container_name}/{filename}"
@@ -104,3 +112,33 @@ def process_image(data: dict) -> str:
   except Exception as e:
     logging.error(f"Error saving image to blob storage: {str(e)}")
     return "error-saving-image"
+
+
+def upload_in_blocks(blob_client, data: bytes, content_settings: ContentSettings = None):
+  """画像をブロックに分割して並行にステージし、最後にブロックリストをコミット"""
+
+  if len(data) <= UPLOAD_BLOCK_SIZE:
+    blob_client.upload_blob(data, overwrite=True, content_settings=content_settings)
+    return
+
+  def stage(index: int) -> str:
+    # Blob内の全ブロックIDは同じ長さである必要がある
+    block_id = base64.b64encode(f"block-{index:08d}".encode("ascii")).decode("ascii")
+    chunk = data[index * UPLOAD_BLOCK_SIZE:(index + 1) * UPLOAD_BLOCK_SIZE]
+    for attempt in range(UPLOAD_MAX_RETRIES + 1):
+      try:
+        blob_client.stage_block(block_id, chunk)
+        return block_id
+      except AzureError as e:
+        # 失敗したブロックのみ再試行する
+        if attempt >= UPLOAD_MAX_RETRIES:
+          raise
+        logging.warning(f"Retrying block {index} upload: {str(e)}")
+        time.sleep(0.5 * (2 ** attempt))
+
+  block_count = (len(data) + UPLOAD_BLOCK_SIZE - 1) // UPLOAD_BLOCK_SIZE
+  with ThreadPoolExecutor(max_workers=max(1, UPLOAD_CONCURRENCY)) as executor:
+    block_ids = list(executor.map(stage, range(block_count)))
+
+  blob_client.commit_block_list([BlobBlock(block_id=block_id) for block_id in block_ids],
+                                content_settings=content_settings)
@@ -4,14 +4,47 @@ Microsoft AI Labo スマート空間最適化ダッシュボード
 Azure App Service 用 Flask アプリケーション
 """
 
-from flask import Flask, send_from_directory, jsonify
+from flask import Flask, send_from_directory, jsonify, request
+import gzip
 import json
 import random
 import os
 from datetime import datetime, timedelta
 
+try:
+  import brotli
+except ImportError:
+  # brotli未インストール時はgzipのみ対応
+  brotli = None
+
 app = Flask(__name__)
 
+# レスポンス圧縮の最小サイズ（バイト）
+MIN_COMPRESS_SIZE = int(os.environ.get('MIN_COMPRESS_SIZE', 1024))
+
+
+@app.after_request
+def compress_json_response(response):
+  """Accept-Encodingに応じてJSONレスポンスを圧縮"""
+  if (response.status_code != 200 or response.direct_passthrough
+          or 'Content-Encoding' in response.headers
+          or response.mimetype != 'application/json'):
+    return response
+
+  response.vary.add('Accept-Encoding')
+
+  body = response.get_data()
+  encoding = request.accept_encodings.best_match(['br', 'gzip'] if brotli else ['gzip'])
+  if not encoding or len(body) < MIN_COMPRESS_SIZE:
+    return response
+
+  if encoding == 'br':
+    response.set_data(brotli.compress(body, quality=5))
+  else:
+    response.set_data(gzip.compress(body, compresslevel=6))
+  response.headers['Content-Encoding'] = encoding
+  return response
+
 # 静的ファイルの配信
 
 
@@ -3,8 +3,12 @@ class DataService {
     constructor() {
         this.baseUrl = 'https://smart-space-api.azurewebsites.net'; // リアルタイムAPIエンドポイント
         this.updateInterval = 30000; // 30秒間隔
+        this.streamUpdateInterval = 300000; // プッシュ配信の接続中の全データ更新間隔（5分）
+        this.lastFetchTime = 0;
         this.reconnectAttempts = 0;
         this.maxReconnectAttempts = 3;
+        this.eventSource = null;
+        this.streamConnected = false;
 
         this.dataCache = {
             entrance: {
@@ -38,14 +42,59 @@ class DataService {
     startPolling() {
         console.log('データポーリングを開始します');
         this.fetchAllData(); // 初回取得
+        this.connectStream();
 
         setInterval(() => {
-            this.fetchAllData();
+            // プッシュ配信の差分は現在値のみのため、接続中も履歴・集計データは低頻度で再取得
+            const interval = this.streamConnected ? this.streamUpdateInterval : this.updateInterval;
+            if (Date.now() - this.lastFetchTime >= interval - 1000) {
+                this.fetchAllData();
+            }
         }, this.updateInterval);
     }
 
+    // プッシュ配信（Server-Sent Events）への接続
+    connectStream() {
+        if (typeof EventSource === 'undefined') {
+            return;
+        }
+
+        // 再接続時はブラウザがLast-Event-IDを自動送信し、未受信分が再送される
+        this.eventSource = new EventSource(`${this.baseUrl}/api/stream`);
+
+        this.eventSource.onopen = () => {
+            this.streamConnected = true;
+            this.reconnectAttempts = 0;
+        };
+
+        this.eventSource.onerror = () => {
+            this.streamConnected = false;
+            this.reconnectAttempts++;
+        };
+
+        this.eventSource.addEventListener('entrance', (event) => {
+            this.applyDelta('entrance', JSON.parse(event.data));
+        });
+
+        this.eventSource.addEventListener('room', (event) => {
+            this.applyDelta('room', JSON.parse(event.data));
+        });
+
+        // 再送範囲外の場合は全データを再取得
+        this.eventSource.addEventListener('reset', () => {
+            this.fetchAllData();
+        });
+    }
+
+    // 差分データの反映と通知
+    applyDelta(dataType, delta) {
+        this.updateDataCache({ [dataType]: delta });
+        this.notifyDataUpdate({ [dataType]: { ...this.dataCache[dataType] } });
+    }
+
     // 全データの取得
     async fetchAllData() {
+        this.lastFetchTime = Date.now();
         try {
             const [entranceData, roomData] = await Promise.all([
                 this.fetchEntranceData(),